@@ -0,0 +1,75 @@
+# Benchmark: CSV loading with the old iterrows() loop vs the typed, vectorized loader.
+#
+# Usage (from the repository root):
+#     python benchmarks/bench_csv_loader.py
+#     python benchmarks/bench_csv_loader.py --sizes 10000 100000
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.data_store import load_data_from_csv
+from src.schema import SCHEMAS
+
+
+# The loader as it was before it was vectorized, kept here for comparison
+def legacy_load_data_from_csv(file_path):
+    df = pd.read_csv(file_path)
+    result_dict = {}
+    for _, row in df.iterrows():
+        key = row['username']
+        row_dict = row.to_dict()
+        if 'doc' in row_dict:
+            row_dict['doc'] = row_dict['doc'].encode() if isinstance(row_dict['doc'], str) else b''
+        result_dict[key] = row_dict
+    return result_dict
+
+
+# Write a shipments file with n rows spread over a few thousand customers
+def write_shipments(file_path, n):
+    goods = ["Wheat", "Corn", "Soybean"]
+    cities = ["Quebec, QC", "Windsor, ON", "Montreal, QC", "Toronto, ON", "Ottawa, ON", "Hamilton, ON"]
+    df = pd.DataFrame({
+        "waybill_ref": [f"WB{i:010d}" for i in range(n)],
+        "username": [f"Customer{i % 5000}" for i in range(n)],
+        "goods_type": [goods[i % 3] for i in range(n)],
+        "qty": [100 + i % 900 for i in range(n)],
+        "origin": [cities[i % 6] for i in range(n)],
+        "destination": [cities[(i + 1) % 6] for i in range(n)],
+        "dispatch_date": "2025-07-14",
+        "option": "Train A (Covered Hopper x25, departs 09:00)",
+        "charge": [round((100 + i % 900) * 99.0, 2) for i in range(n)],
+        "status": "In Transit",
+        "booked_on": "2025-07-14 15:46:08.618321",
+    })
+    df.to_csv(file_path, index=False)
+
+
+def timed(fn, *args, **kwargs):
+    start = time.perf_counter()
+    fn(*args, **kwargs)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10_000, 100_000, 1_000_000])
+    args = parser.parse_args()
+
+    print(f"{'rows':>10} {'iterrows (s)':>14} {'vectorized (s)':>15} {'speedup':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            file_path = os.path.join(tmp, f"shipments_{n}.csv")
+            write_shipments(file_path, n)
+            before = timed(legacy_load_data_from_csv, file_path)
+            after = timed(load_data_from_csv, file_path, schema=SCHEMAS["shipments"])
+            print(f"{n:>10} {before:>14.3f} {after:>15.3f} {before / after:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main()
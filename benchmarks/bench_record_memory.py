@@ -0,0 +1,104 @@
+# Benchmark: resident memory of N in-memory waybills held as plain dicts vs
+# the slotted record types in src/records.py. Each variant runs in a fresh
+# subprocess so the numbers do not share an allocator.
+#
+# Usage (from the repository root):
+#     python benchmarks/bench_record_memory.py
+#     python benchmarks/bench_record_memory.py --rows 100000
+import argparse
+import datetime
+import os
+import subprocess
+import sys
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+
+# Current resident set size in bytes
+def rss_bytes():
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    with open("/proc/self/statm") as file:
+        return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+# Waybills shaped like the app's: a details copy of the booking and three
+# tracking events. Strings are built per row, as they are when read from a file.
+def make_waybills(n, as_records):
+    from src.records import WaybillRecord
+
+    goods = ["Wheat", "Corn", "Soybean"]
+    cities = ["Quebec, QC", "Windsor, ON", "Montreal, QC", "Toronto, ON", "Ottawa, ON", "Hamilton, ON"]
+    start = datetime.datetime(2025, 7, 14, 9, 0)
+    waybills = {}
+    for i in range(n):
+        ref = f"WB{i:010d}"
+        booked = start + datetime.timedelta(seconds=i)
+        details = {
+            "waybill_ref": ref,
+            "username": f"Customer{i % 5000}",
+            "goods_type": "".join(goods[i % 3]),
+            "qty": 100 + i % 900,
+            "origin": "".join(cities[i % 6]),
+            "destination": "".join(cities[(i + 1) % 6]),
+            "dispatch_date": "2025-07-14 ".strip(),
+            "option": "Train A (Covered Hopper x25, departs 09:00) ".strip(),
+            "charge": round((100 + i % 900) * 99.0, 2),
+            "status": "In Transit ".strip(),
+            "booked_on": str(booked),
+        }
+        row = {
+            "waybill_ref": ref,
+            "username": details["username"],
+            "details": details,
+            "tracking": [
+                {"status": "Booking Confirmed ".strip(), "time": booked},
+                {"status": "In Transit ".strip(), "time": booked + datetime.timedelta(hours=4)},
+                {"status": "Arriving ".strip(), "time": booked + datetime.timedelta(hours=20)},
+            ],
+            "status": "In Transit ".strip(),
+            "eta": booked + datetime.timedelta(hours=20),
+        }
+        waybills[ref] = WaybillRecord.coerce(row) if as_records else row
+    return waybills
+
+
+def measure(n, variant):
+    before = rss_bytes()
+    start = time.perf_counter()
+    waybills = make_waybills(n, variant == "records")
+    elapsed = time.perf_counter() - start
+    print(rss_bytes() - before, elapsed, len(waybills))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RSS of dict rows vs slotted record rows")
+    parser.add_argument("--rows", type=int, default=1_000_000)
+    parser.add_argument("--variant", choices=["dicts", "records"], help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.variant:
+        measure(args.rows, args.variant)
+        return
+
+    results = {}
+    for variant in ("dicts", "records"):
+        output = subprocess.run(
+            [sys.executable, os.path.abspath(__file__), "--rows", str(args.rows), "--variant", variant],
+            check=True, capture_output=True, text=True,
+        ).stdout.split()
+        results[variant] = (int(output[0]), float(output[1]))
+
+    print(f"{'rows':>10} {'variant':>8} {'RSS MiB':>9} {'bytes/row':>10} {'build s':>8}")
+    for variant, (rss, elapsed) in results.items():
+        print(f"{args.rows:>10} {variant:>8} {rss / 2**20:>9.1f} {rss / args.rows:>10.0f} {elapsed:>8.2f}")
+    print(f"records use {results['records'][0] / results['dicts'][0]:.0%} of the dict memory")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,45 @@
+# Benchmark: waybill reference throughput with several worker processes, each
+# with its own RefGenerator, checking that no two refs collide and that every
+# worker's refs come out in order.
+#
+# Usage (from the repository root):
+#     python benchmarks/bench_waybill_refs.py
+#     python benchmarks/bench_waybill_refs.py --workers 8 --refs 500000
+import argparse
+import multiprocessing
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.refs import RefGenerator
+
+
+def generate(count):
+    generator = RefGenerator()
+    start = time.perf_counter()
+    refs = [generator.new() for _ in range(count)]
+    return refs, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Waybill refs per second across worker processes")
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4, 8])
+    parser.add_argument("--refs", type=int, default=250_000, help="refs per worker")
+    args = parser.parse_args()
+
+    print(f"{'workers':>8} {'refs':>10} {'refs/s':>12} {'per worker/s':>13} {'unique':>7} {'ordered':>8}")
+    for workers in args.workers:
+        with multiprocessing.Pool(workers) as pool:
+            results = pool.map(generate, [args.refs] * workers)
+        total = workers * args.refs
+        # Workers run in parallel: the slowest one bounds the wall time
+        elapsed = max(seconds for _, seconds in results)
+        unique = len({ref for refs, _ in results for ref in refs}) == total
+        ordered = all(refs == sorted(refs) for refs, _ in results)
+        print(f"{workers:>8} {total:>10} {total / elapsed:>12,.0f} {args.refs / elapsed:>13,.0f} {str(unique):>7} {str(ordered):>8}")
+
+
+if __name__ == "__main__":
+    main()
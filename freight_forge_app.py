@@ -1,12 +1,27 @@
 import streamlit as st
-import random
-import string
 import datetime
-import pandas as pd
+import mimetypes
 import os
-import csv
-import ast  # For safely evaluating the string representation of a dictionary
-import json
+from collections.abc import Mapping
+
+import pandas as pd
+
+from src.blobs import BlobStore, MissingBlobError, move_inline_documents
+from src.backends import PERSIST_CSV, CsvBackend, SqliteBackend
+from src.columnar import CATEGORY, NUMBER, TIMESTAMP, ColumnarTable
+from src.credentials import DEFAULT_ITERATIONS, Authenticator, hash_password, hash_plain_passwords
+from src.data_store import DataStore, StaleRecordError
+from src.eta import EtaEngine
+from src.indexes import SortedGroupIndex
+from src.inventory import CapacityError, CapacityInventory, load_trains
+from src.rates import NoRateError, NoRouteError, UnknownStationError, load_rate_engine, quote_batch
+from src.otp import AsyncSender, FileDelivery, OtpDeliveryError, OtpRateLimitError, OtpService
+from src.records import record_version
+from src.refs import RefGenerator
+from src.serialization import decode_waybill_row
+from src.sessions import MemorySessionStore
+from src.tracking import EventLog, TrackingTimeline, UnknownWaybillError, parse_refs, track_many
+from src.waybill_index import CsvOffsetIndex
 
 # File paths for CSV storage
 USERS_CSV = "data\\users.csv"
@@ -14,58 +29,160 @@ PENDING_USERS_CSV = "data\\pending_users.csv"
 SHIPMENTS_CSV = "data\\shipments.csv"
 WAYBILLS_CSV = "data\\waybills.csv"
 
-# Function to load data from CSV or initialize if not exists
-def load_data_from_csv(file_path, default_dict=None):
-    if default_dict is None:
-        default_dict = {}
-
-    if os.path.exists(file_path):
-        try:
-            df = pd.read_csv(file_path)
-            # Convert DataFrame to dictionary
-            result_dict = {}
-            for _, row in df.iterrows():
-                key = row['username']  # Assuming 'username' is the key
-                # Convert row to dict and remove the key column
-                row_dict = row.to_dict()
-                # Handle document bytes (stored as string in CSV)
-                if 'doc' in row_dict:
-                    row_dict['doc'] = row_dict['doc'].encode() if isinstance(row_dict['doc'], str) else b''
-                result_dict[key] = row_dict
-            return result_dict
-        except Exception as e:
-            st.error(f"Error loading {file_path}: {e}")
-            return default_dict
+SQLITE_DB = os.path.join("data", "freightforge.db")
+
+CSV_FILES = {
+    "users": USERS_CSV,
+    "pending_users": PENDING_USERS_CSV,
+    "shipments": SHIPMENTS_CSV,
+    "waybills": WAYBILLS_CSV,
+}
+
+# Uploaded registration documents, stored once per content (SHA-256); user
+# rows only hold the digest
+DOCUMENTS_DIR = os.path.join("data", "documents")
+
+# Append-only log of tracking events (status changes after booking)
+TRACKING_EVENTS_LOG = os.path.join("data", "tracking_events.jsonl")
+
+# Storage backend: "csv" files (default) or an embedded "sqlite" database
+STORAGE_BACKEND = os.getenv("FREIGHTFORGE_BACKEND", "csv")
+# CSV persistence mode: "csv" rewrites a file on every change, "journal" appends
+# changes to a per-file journal that is compacted into the CSV in the background
+PERSISTENCE = os.getenv("FREIGHTFORGE_PERSISTENCE", PERSIST_CSV)
+
+# PBKDF2 cost of stored password hashes
+PASSWORD_ITERATIONS = int(os.getenv("FREIGHTFORGE_PASSWORD_ITERATIONS", DEFAULT_ITERATIONS))
+
+# Logged-in sessions expire after SESSION_TTL idle seconds
+SESSION_TTL = 8 * 3600
+
+# One-time passwords for registration: valid for 5 minutes, 5 guesses each, at
+# most 3 per contact in a burst then one a minute. No mail or SMS gateway is
+# wired up; codes are written to this file (and shown on the page, as a demo)
+OTP_OUTBOX = os.path.join("data", "otp_outbox.log")
+
+# Rail network and freight rates used for quotes
+STATIONS_CSV = os.path.join("data", "stations.csv")
+RAIL_SEGMENTS_CSV = os.path.join("data", "rail_segments.csv")
+RATES_CSV = os.path.join("data", "rates.csv")
+
+# Daily train services offered at booking (wagon class, wagon count, tons per wagon)
+TRAINS_CSV = os.path.join("data", "trains.csv")
+
+# Columns of the columnar shipment table used for filters and aggregates
+SHIPMENT_TABLE_COLUMNS = {
+    "username": CATEGORY,
+    "status": CATEGORY,
+    "goods_type": CATEGORY,
+    "origin": CATEGORY,
+    "destination": CATEGORY,
+    "qty": NUMBER,
+    "charge": NUMBER,
+    "booked_on": TIMESTAMP,
+    "option": CATEGORY,
+    "dispatch_date": CATEGORY,
+}
+
+# Shared data store: loaded once per process and reused by every session/rerun
+@st.cache_resource
+def get_data_store():
+    if STORAGE_BACKEND == "sqlite":
+        # Tables start out as a copy of the CSV files
+        backend = SqliteBackend(SQLITE_DB, csv_paths=CSV_FILES)
     else:
-        return default_dict
-
-# Function to save data to CSV
-def save_data_to_csv(data_dict, file_path):
+        backend = CsvBackend(CSV_FILES, persistence=PERSISTENCE)
+    store = DataStore(backend)
+    # Each user's shipments, newest booking first, for the "Your Recent Shipments" panel
+    store.add_index("shipments", "by_user", SortedGroupIndex("username", "booked_on"))
+    # Column-wise copies for the vectorized filters and aggregates
+    store.add_index("shipments", "table", ColumnarTable(SHIPMENT_TABLE_COLUMNS))
+    # Current status, ETA and status counts projected from the tracking events
+    store.add_index("waybills", "tracking", TrackingTimeline(EventLog(TRACKING_EVENTS_LOG)))
+    # Wagons and tons left per train and day, kept in step with the shipments
+    store.add_index("shipments", "capacity", CapacityInventory(load_trains(TRAINS_CSV)))
+    # Documents that older versions kept inside the user rows move to the document
+    # store, and the plain passwords they stored are replaced by hashes
+    user_datasets = [name for name in ["users", "pending_users"] if store.readable(name)]
     try:
-        # Convert dictionary to DataFrame
-        if data_dict:
-            # Create list of dictionaries for DataFrame
-            rows = []
-            for key, value in data_dict.items():
-                row = value.copy()
-                # Handle document bytes (convert to string for CSV)
-                if 'doc' in row:
-                    row['doc'] = str(row['doc'])
-                rows.append(row)
-
-            df = pd.DataFrame(rows)
-            df.to_csv(file_path, index=False)
-    except Exception as e:
-        st.error(f"Error saving to {file_path}: {e}")
-
-# Load data from CSV files
-USERS = load_data_from_csv(USERS_CSV)
-PENDING_USERS = load_data_from_csv(PENDING_USERS_CSV)
-SHIPMENTS = load_data_from_csv(SHIPMENTS_CSV, {})
-WAYBILLS = load_data_from_csv(WAYBILLS_CSV, {})
-
-# Initialize default admin if not exists
-if 'admin' not in USERS:
+        move_inline_documents(store, get_document_store(), user_datasets)
+        hash_plain_passwords(store, user_datasets, PASSWORD_ITERATIONS)
+    except StaleRecordError:
+        # Another worker is moving them at the same time
+        store.refresh()
+    return store
+
+# Password logins and verified sessions, shared by all sessions of this
+# process. The session token only lives in st.session_state, which belongs
+# to one process, so a session store shared between workers would never be
+# reached; sessions are kept in memory.
+@st.cache_resource
+def get_authenticator(_store):
+    sessions = MemorySessionStore(ttl=SESSION_TTL)
+    return Authenticator(_store, "users", iterations=PASSWORD_ITERATIONS, sessions=sessions)
+
+# OTP service with background delivery, shared by all sessions
+@st.cache_resource
+def get_otp_service():
+    return OtpService(AsyncSender(FileDelivery(OTP_OUTBOX)), ttl=300, max_attempts=5, burst=3, refill_seconds=60)
+
+# Registration document store, shared by all sessions
+@st.cache_resource
+def get_document_store():
+    return BlobStore(DOCUMENTS_DIR)
+
+# Rate engine (station graph + rate tables), shared by all sessions
+@st.cache_resource
+def get_rate_engine():
+    return load_rate_engine(STATIONS_CSV, RAIL_SEGMENTS_CSV, RATES_CSV)
+
+# ETA estimates from rail distance, train departures and the transit times of
+# delivered waybills (learned from the tracking timeline as deliveries arrive)
+@st.cache_resource
+def get_eta_engine(_timeline, _waybills):
+    engine = EtaEngine(get_rate_engine().network, load_trains(TRAINS_CSV))
+    engine.follow(_timeline, _waybills)
+    return engine
+
+# Time-ordered, collision-free waybill references (one generator per process)
+@st.cache_resource
+def get_ref_generator():
+    return RefGenerator()
+
+# Waybill reference -> row offset index over WAYBILLS_CSV, shared by all sessions
+@st.cache_resource
+def get_waybill_index():
+    return CsvOffsetIndex(WAYBILLS_CSV, key_column="waybill_ref")
+
+# Load data (only re-read what changed in the backing storage)
+DATA_STORE = get_data_store()
+DOCUMENTS = get_document_store()
+AUTH = get_authenticator(DATA_STORE)
+OTP_SERVICE = get_otp_service()
+DATA_STORE.refresh()
+USERS = DATA_STORE.get("users")
+PENDING_USERS = DATA_STORE.get("pending_users")
+SHIPMENTS = DATA_STORE.get("shipments")
+WAYBILLS = DATA_STORE.get("waybills")
+SHIPMENTS_BY_USER = DATA_STORE.index("shipments", "by_user")
+SHIPMENTS_TABLE = DATA_STORE.index("shipments", "table")
+TRACKING = DATA_STORE.index("waybills", "tracking")
+TRACKING.refresh()
+INVENTORY = DATA_STORE.index("shipments", "capacity")
+ETA_ENGINE = get_eta_engine(TRACKING, WAYBILLS)
+
+# Predict the ETAs of all open shipments again (in one pass) once new
+# deliveries have changed the transit time statistics
+if ETA_ENGINE.stale:
+    open_shipments = SHIPMENTS_TABLE.frame().set_index("key")
+    open_shipments = open_shipments[~open_shipments.index.isin(TRACKING.refs("Delivered"))]
+    TRACKING.predict(ETA_ENGINE.predict(open_shipments).dropna())
+
+# Rows per page in the "Your Recent Shipments" panel
+SHIPMENTS_PAGE_SIZE = 10
+
+# Initialize default admin if not exists (never into a file that failed to load)
+if DATA_STORE.readable("users") and 'admin' not in USERS:
     USERS['admin'] = {
         "username": "admin",
         "business_name": "FreightForge Administration",
@@ -76,14 +193,14 @@ if 'admin' not in USERS:
         "approved": "yes",
         "business_type": "Administration",
         "address": "FreightForge HQ",
-        "password": "admin",
-        "doc": b"admin_document"
+        "password": hash_password("admin", PASSWORD_ITERATIONS),
+        "doc_sha256": DOCUMENTS.put(b"admin_document")
     }
     # Save updated users to CSV
-    save_data_to_csv(USERS, USERS_CSV)
+    DATA_STORE.save("users")
 
 # Initialize default customers if not in pending users
-if 'Customer1' not in PENDING_USERS and 'Customer1' not in USERS:
+if DATA_STORE.readable("pending_users") and 'Customer1' not in PENDING_USERS and 'Customer1' not in USERS:
     PENDING_USERS['Customer1'] = {
         "username": "Customer1",
         "business_name": "Grain Traders Inc.",
@@ -94,13 +211,13 @@ if 'Customer1' not in PENDING_USERS and 'Customer1' not in USERS:
         "approved": "no",
         "business_type": "Agriculture",
         "address": "123 Farm Road, Rural County",
-        "password": "Customer1",
-        "doc": b"customer1_document"
+        "password": hash_password("Customer1", PASSWORD_ITERATIONS),
+        "doc_sha256": DOCUMENTS.put(b"customer1_document")
     }
     # Save updated pending users to CSV
-    save_data_to_csv(PENDING_USERS, PENDING_USERS_CSV)
+    DATA_STORE.save("pending_users")
 
-if 'Customer2' not in PENDING_USERS and 'Customer2' not in USERS:
+if DATA_STORE.readable("pending_users") and 'Customer2' not in PENDING_USERS and 'Customer2' not in USERS:
     PENDING_USERS['Customer2'] = {
         "username": "Customer2",
         "business_name": "Logistics Masters Ltd.",
@@ -111,19 +228,19 @@ if 'Customer2' not in PENDING_USERS and 'Customer2' not in USERS:
         "approved": "no",
         "business_type": "Logistics",
         "address": "456 Transport Avenue, Shipping City",
-        "password": "Customer2",
-        "doc": b"customer2_document"
+        "password": hash_password("Customer2", PASSWORD_ITERATIONS),
+        "doc_sha256": DOCUMENTS.put(b"customer2_document")
     }
     # Save updated pending users to CSV
-    save_data_to_csv(PENDING_USERS, PENDING_USERS_CSV)
+    DATA_STORE.save("pending_users")
 
 # Function to create a default waybill
 def create_default_waybill(username, goods_type, qty, origin, destination, option, charge, days_ago=2):
     booking_date = datetime.datetime.now() - datetime.timedelta(days=days_ago)
     eta = booking_date + datetime.timedelta(hours=20)
 
-    # Create a unique reference
-    ref = ''.join(random.choices(string.ascii_uppercase + string.digits, k=10))
+    # Create a unique reference, dated like the booking
+    ref = get_ref_generator().new(at=booking_date)
 
     # Create booking details
     booking_details = {
@@ -156,7 +273,7 @@ def create_default_waybill(username, goods_type, qty, origin, destination, optio
     return ref, booking_details, waybill
 
 # Add default shipments and waybills if they don't exist yet
-if len(SHIPMENTS) == 0 and len(WAYBILLS) == 0:
+if DATA_STORE.readable("shipments") and DATA_STORE.readable("waybills") and len(SHIPMENTS) == 0 and len(WAYBILLS) == 0:
     # For Customer1 - Create two shipments
     # Shipment 1 - In Transit
     ref1, booking1, waybill1 = create_default_waybill(
@@ -208,53 +325,122 @@ if len(SHIPMENTS) == 0 and len(WAYBILLS) == 0:
     WAYBILLS[ref3] = waybill3
 
     # Save to CSV files
-    save_data_to_csv(SHIPMENTS, SHIPMENTS_CSV)
-    save_data_to_csv(WAYBILLS, WAYBILLS_CSV)
+    DATA_STORE.save("shipments")
+    DATA_STORE.save("waybills")
 
     # Print the waybill references for demo purposes
     print(f"Created default waybills with references: {ref1}, {ref2}, {ref3}")
 
     
 # Helper functions
+# Function to send a one-time password to a contact; it is delivered in the
+# background. Returns whether a code was issued.
 def send_otp(email_or_phone):
-    otp = ''.join(random.choices(string.digits, k=6))
-    st.session_state['otp'] = otp
-    st.session_state['otp_verified'] = False
+    try:
+        otp = OTP_SERVICE.issue(email_or_phone)
+    except (OtpRateLimitError, OtpDeliveryError) as e:
+        st.error(f"Could not send an OTP: {e}")
+        return False
     st.session_state['otp_contact'] = email_or_phone
     st.info(f"(Demo) OTP for {email_or_phone} is {otp}")
-
-def generate_waybill(booking_info):
-    ref = ''.join(random.choices(string.ascii_uppercase + string.digits, k=10))
-    WAYBILLS[ref] = {
+    return True
+
+def new_waybill_ref():
+    return get_ref_generator().new()
+
+def generate_waybill(booking_info, ref=None):
+    ref = ref or new_waybill_ref()
+    now = datetime.datetime.now()
+    # Planned departure of the chosen train and arrival over the lane
+    departure, eta = ETA_ENGINE.estimate(booking_info)
+    departure = departure or now
+    eta = eta or departure + datetime.timedelta(hours=20)
+    DATA_STORE.put("waybills", ref, {
+        "username": booking_info["username"],
         "waybill_ref": ref,
         "details": booking_info,
         "tracking": [
-            {"status":"Booking Confirmed", "time":datetime.datetime.now()},
-            {"status":"In Transit", "time":datetime.datetime.now() + datetime.timedelta(hours=4)},
-            {"status":"Arriving", "time":datetime.datetime.now() + datetime.timedelta(hours=16)},
+            {"status":"Booking Confirmed", "time":now},
+            {"status":"In Transit", "time":departure},
+            {"status":"Arriving", "time":eta},
         ],
         "status": "Booked",
-        "eta": datetime.datetime.now() + datetime.timedelta(hours=20)
-    }
+        "eta": eta
+    })
     return ref
 
+# Function to check a login: the user row and a session token, or None.
+# The password hash is checked here once; later reruns of the session use the
+# token (see the session check below)
 def check_user(username, password):
-    # Debug info
-    st.write(f"Checking user: {username}")
-    st.write(f"Available users: {list(USERS.keys())}")
-
-    u = USERS.get(username)
-    if u and u['password'] == password and u.get('approved') == "yes":
-        return u
-    return None
+    return AUTH.login(username, password)
+
+# Registration details shown in the admin approval table
+APPROVAL_COLUMNS = ["business_name", "contact_person", "email", "business_type"]
+# Rows per page in the admin approval table
+APPROVALS_PAGE_SIZE = 50
+
+# Function to check a pending registration against the admin's filter text
+def registration_matches(uname, reg, search):
+    search = (search or "").strip().lower()
+    if not search:
+        return True
+    return any(search in str(value).lower() for value in [uname, *(reg.get(column) for column in APPROVAL_COLUMNS)])
+
+# Function to build the changes that approve (move to USERS) or reject (drop)
+# pending registrations; each is checked against the version it was read at
+def registration_changes(usernames, approve):
+    changes = []
+    for uname in usernames:
+        reg = PENDING_USERS.get(uname)
+        if reg is None:
+            continue
+        if approve:
+            approved = reg.copy()
+            approved["approved"] = "yes"
+            changes.append(("users", uname, approved, 0))
+        changes.append(("pending_users", uname, None, record_version(reg)))
+    return changes
+
+# Function to show a registration document to the admin; it is read from the
+# document store only when asked for
+def show_document(uname, digest):
+    try:
+        content_type = DOCUMENTS.content_type(digest)
+    except MissingBlobError:
+        st.warning("No document was found for this registration.")
+        return
+    st.caption(f"{content_type}, {DOCUMENTS.size(digest):,} bytes, SHA-256 {digest[:12]}…")
+    if content_type.startswith("image/"):
+        try:
+            st.image(DOCUMENTS.path(digest))
+        except Exception:
+            st.warning("The image could not be displayed; download it instead.")
+    with DOCUMENTS.open(digest) as file:
+        st.download_button(
+            "Download Document",
+            data=file,
+            file_name=f"{uname}_document{mimetypes.guess_extension(content_type) or ''}",
+            mime=content_type,
+        )
 
 def is_admin():
     # For this demo, first user is admin.
-    return st.session_state.get('user') and st.session_state['user']['username'] == 'admin'
+    return CURRENT_USER is not None and CURRENT_USER['username'] == 'admin'
 
 
 # Page selector
 st.set_page_config(page_title="FreightForge - Railway Freight Portal", layout="wide")
+
+# The logged-in user, resolved from the session token on every rerun: one
+# session lookup and one row lookup, no password hashing. Only the token is
+# kept in the Streamlit session (never in the URL, where it would end up in
+# browser history, logs and Referer headers). A session whose account was
+# revoked or whose password changed ends.
+CURRENT_USER = AUTH.user(st.session_state.get('session_token'))
+if CURRENT_USER is None and 'session_token' in st.session_state:
+    del st.session_state['session_token']
+
 menu = st.sidebar.radio(
     "Menu", 
     (
@@ -264,6 +450,11 @@ menu = st.sidebar.radio(
         "Track Shipment (Waybill)"
     )
 )
+if CURRENT_USER is not None:
+    st.sidebar.caption(f"Logged in as {CURRENT_USER['username']}")
+    if st.sidebar.button("Log Out"):
+        AUTH.logout(st.session_state.pop('session_token'))
+        st.rerun()
 
 # 1. Welcome
 if menu == "Welcome":
@@ -307,9 +498,10 @@ if menu == "Register & Login":
                     st.warning("Please fill all fields and upload a document.")
                 elif username in USERS or username in PENDING_USERS:
                     st.error("Username already exists!")
-                else:
-                    send_otp(email)
-                    # Save pending registration in session
+                elif send_otp(email):
+                    # Save pending registration in session; the document is
+                    # only stored once the OTP is verified
+                    st.session_state['pending_doc'] = doc.getvalue()
                     st.session_state['pending_reg'] = {
                         "username":username,
                         "business_name":business_name,
@@ -319,36 +511,42 @@ if menu == "Register & Login":
                         "pan_gst":pan_gst,
                         "business_type":business_type,
                         "address":address,
-                        "password":password,
-                        "doc":doc.getvalue()
+                        "password":hash_password(password, PASSWORD_ITERATIONS)
                     }
 
-        if st.session_state.get('otp'):
+        if st.session_state.get('otp_contact') and st.session_state.get('pending_reg'):
             st.text_input("Enter OTP sent to your email", key="user_otp")
             if st.button("Verify OTP"):
-                if st.session_state['user_otp'] == st.session_state['otp']:
-                    st.success("OTP Verified. Registration submitted for admin approval.")
-                    PENDING_USERS[st.session_state['pending_reg']['username']] = st.session_state['pending_reg']
-                    # Save to CSV
-                    save_data_to_csv(PENDING_USERS, PENDING_USERS_CSV)
-                    del st.session_state['pending_reg']
-                    del st.session_state['otp']
+                if OTP_SERVICE.verify(st.session_state['otp_contact'], st.session_state['user_otp']):
+                    pending_reg = dict(st.session_state.pop('pending_reg'))
+                    pending_doc = st.session_state.pop('pending_doc')
+                    del st.session_state['otp_contact']
+                    # The username may have been taken since the OTP was sent
+                    if pending_reg['username'] in USERS or pending_reg['username'] in PENDING_USERS:
+                        st.error("Username already exists! Please register again with another username.")
+                    else:
+                        # Store the document and save the pending registration,
+                        # unless someone else registered the username meanwhile
+                        pending_reg["doc_sha256"] = DOCUMENTS.put(pending_doc)
+                        try:
+                            DATA_STORE.put("pending_users", pending_reg['username'], pending_reg, expected_version=0)
+                        except StaleRecordError:
+                            st.error("Username already exists! Please register again with another username.")
+                        else:
+                            st.success("OTP Verified. Registration submitted for admin approval.")
                 else:
-                    st.error("Invalid OTP. Try again.")
+                    st.error("Invalid or expired OTP. Try again, or send a new one.")
 
     with tab2:
         st.subheader("Login")
         username = st.text_input("Username")
         password = st.text_input("Password", type="password")
         if st.button("Login"):
-            # Debug info
-            st.write(f"Available users: {list(USERS.keys())}")
-            st.write(f"Trying to log in with username: {username}")
-
-            u = check_user(username, password)
-            if u:
-                st.session_state['user'] = u
-                st.success(f"Welcome {u['contact_person']} as {u['business_name']}")
+            login = check_user(username, password)
+            if login:
+                CURRENT_USER, token = login
+                st.session_state['session_token'] = token
+                st.success(f"Welcome {CURRENT_USER['contact_person']} as {CURRENT_USER['business_name']}")
             else:
                 st.error("Invalid credentials or account not yet approved.")
 
@@ -357,45 +555,147 @@ if menu == "Register & Login":
         if not is_admin():
             st.info("Login as admin to access approvals. (First registered user is admin.)")
         else:
+            if st.session_state.get('approvals_done'):
+                st.success(st.session_state.pop('approvals_done'))
             if not PENDING_USERS:
                 st.info("No pending registrations.")
             else:
-                # Create a list of pending users to avoid modification during iteration
-                pending_usernames = list(PENDING_USERS.keys())
-
-                for uname in pending_usernames:
-                    reg = PENDING_USERS[uname]
-                    st.write(f"**{uname}** | {reg['business_name']} | {reg['email']} | Approval Status: {reg['approved']}")
-                    col1, col2 = st.columns(2)
-
-                    with col1:
-                        if st.button(f"Approve {uname}", key=f"approve_{uname}"):
-                            # Set approved status to "yes"
-                            reg["approved"] = "yes"
-                            # Add to USERS dictionary
-                            USERS[uname] = reg
-                            # Remove from PENDING_USERS
-                            del PENDING_USERS[uname]
-                            # Save changes to CSV files
-                            save_data_to_csv(USERS, USERS_CSV)
-                            save_data_to_csv(PENDING_USERS, PENDING_USERS_CSV)
-                            st.success(f"User {uname} approved and can now log in.")
-                            # Force a rerun to update the UI
-                            st.rerun()
-
-                    with col2:
-                        if st.button(f"Reject {uname}", key=f"reject_{uname}"):
-                            # Remove from PENDING_USERS
-                            del PENDING_USERS[uname]
-                            # Save changes to CSV
-                            save_data_to_csv(PENDING_USERS, PENDING_USERS_CSV)
-                            st.warning(f"User {uname} rejected.")
-                            # Force a rerun to update the UI
-                            st.rerun()                        
-                        
+                # Filterable, paginated table; the selected registrations are
+                # approved or rejected together in one write
+                search = st.text_input("Filter Registrations", placeholder="Username, business, contact, email or business type")
+                matching = [uname for uname, reg in PENDING_USERS.items() if registration_matches(uname, reg, search)]
+                pages = max(1, (len(matching) + APPROVALS_PAGE_SIZE - 1) // APPROVALS_PAGE_SIZE)
+                page = 1
+                if pages > 1:
+                    page = st.number_input("Page", min_value=1, max_value=pages, value=1, key="approvals_page")
+                page_usernames = matching[(page - 1) * APPROVALS_PAGE_SIZE:page * APPROVALS_PAGE_SIZE]
+                select_all = st.checkbox(f"Select all {len(matching)} matching registration(s)")
+                table = pd.DataFrame(
+                    [
+                        {"select": select_all, "username": uname, **{column: PENDING_USERS[uname].get(column) for column in APPROVAL_COLUMNS}}
+                        for uname in page_usernames
+                    ],
+                    columns=["select", "username", *APPROVAL_COLUMNS],
+                )
+                edited = st.data_editor(
+                    table,
+                    hide_index=True,
+                    disabled=["username", *APPROVAL_COLUMNS],
+                    column_config={"select": st.column_config.CheckboxColumn("Select")},
+                    key=f"approvals_{page}_{search}_{select_all}",
+                )
+                selected = matching if select_all else edited.loc[edited["select"], "username"].tolist()
+                st.caption(f"{len(matching)} matching, {len(selected)} selected · page {page} of {pages}")
+                viewed = st.selectbox("View Document", page_usernames, index=None, placeholder="Choose a registration")
+                if viewed in PENDING_USERS:
+                    show_document(viewed, PENDING_USERS[viewed].get("doc_sha256"))
+
+                col1, col2 = st.columns(2)
+                with col1:
+                    approve = st.button(f"Approve Selected ({len(selected)})", disabled=not selected)
+                with col2:
+                    reject = st.button(f"Reject Selected ({len(selected)})", disabled=not selected)
+                if approve or reject:
+                    try:
+                        DATA_STORE.write_many(registration_changes(selected, approve))
+                    except StaleRecordError:
+                        st.warning("Some of the selected registrations were handled by someone else in the meantime, "
+                                   "so nothing was changed. Review the list and try again.")
+                    else:
+                        st.session_state['approvals_done'] = (
+                            f"{len(selected)} user(s) approved and can now log in." if approve
+                            else f"{len(selected)} registration(s) rejected."
+                        )
+                        # Force a rerun to update the UI
+                        st.rerun()
+
+            # Shipment analytics, computed column-wise over every shipment
+            st.subheader("Shipment Analytics")
+            status_counts = TRACKING.counts()
+            status_cols = st.columns(3)
+            for col, status in zip(status_cols, ["Booked", "In Transit", "Delivered"]):
+                with col:
+                    st.metric(status, int(status_counts.get(status, 0)))
+
+            shipments_frame = SHIPMENTS_TABLE.frame()
+            routes = {"origin": "Any", "destination": "Any"}
+            col1, col2 = st.columns(2)
+            with col1:
+                routes["origin"] = st.selectbox("Origin", ["Any", *sorted(shipments_frame["origin"].dropna().unique())])
+            with col2:
+                routes["destination"] = st.selectbox("Destination", ["Any", *sorted(shipments_frame["destination"].dropna().unique())])
+            route_filter = {column: value for column, value in routes.items() if value != "Any"}
+            in_transit = TRACKING.refs("In Transit")
+            route_shipments = SHIPMENTS_TABLE.select(**route_filter)
+            route_in_transit = route_shipments[route_shipments["key"].isin(in_transit)]
+            st.write(
+                f"{len(route_shipments)} shipment(s) on this route, "
+                f"{len(route_in_transit)} in transit ({route_in_transit['qty'].sum():,.0f} MT)"
+            )
+
+            tons_per_day = SHIPMENTS_TABLE.totals("qty", ["goods_type"], per_day="booked_on", **route_filter)
+            if len(tons_per_day):
+                st.write("Tons booked per goods type per day")
+                st.bar_chart(tons_per_day.unstack(0).fillna(0))
+
+# Function to find the position of a default station in the picker (first one if missing)
+def station_index(station_names, name):
+    return station_names.index(name) if name in station_names else 0
+
+# Function to turn the text typed for a station into a station ID: an exact
+# (normalized) name or ID, else the only station matching it as a prefix.
+# Shows suggestions and returns None when it is ambiguous or unknown.
+def resolve_station(text, label):
+    catalogue = get_rate_engine().network.catalogue
+    try:
+        return catalogue.resolve(text)
+    except UnknownStationError:
+        matches = catalogue.suggest(text, limit=5)
+    if len(matches) == 1:
+        st.info(f"{label}: using {catalogue.name(matches[0])}")
+        return matches[0]
+    if matches:
+        st.error(f"{label} '{text}' matches several stations: {', '.join(catalogue.name(m) for m in matches)}")
+    else:
+        st.error(f"Unknown {label.lower()} station: {text}")
+    return None
+
+# Function to quote every train with room for the shipment on the dispatch
+# date: shortest rail distance times the rate for the goods type in the
+# train's wagon class. Shows an error and returns None when the route cannot
+# be priced or no train has room.
+def quote_train_options(origin, destination, goods_type, qty, dispatch_date):
+    rate_engine = get_rate_engine()
+    origin = resolve_station(origin, "Origin")
+    destination = resolve_station(destination, "Destination")
+    if origin is None or destination is None:
+        return None
+    # Trains that have already left (when dispatching today) cannot be booked
+    now = datetime.datetime.now()
+    departing = [train for train in INVENTORY.trains.values() if train.departure_on(dispatch_date) > now]
+    if not departing:
+        st.error(f"Every train on {dispatch_date} has already departed. Try another date.")
+        return None
+    trains = [
+        train for train in departing
+        if INVENTORY.remaining(train.train_id, dispatch_date)[0] >= train.wagons_for(qty)
+        and INVENTORY.remaining(train.train_id, dispatch_date)[1] >= qty
+    ]
+    if not trains:
+        st.error(f"No train has room for {qty} MT on {dispatch_date}. Try another date.")
+        return None
+    try:
+        return {
+            train.label: rate_engine.quote(origin, destination, goods_type, qty, train.wagon_class)
+            for train in trains
+        }
+    except (UnknownStationError, NoRouteError, NoRateError) as e:
+        st.error(f"Cannot quote this shipment: {e}")
+        return None
+
 # 3. Freight Inquiry & Booking
 if menu == "Freight Inquiry & Booking":
-    user = st.session_state.get('user')
+    user = CURRENT_USER
     if not user:
         st.warning("Please log in first.")
     else:
@@ -403,12 +703,25 @@ if menu == "Freight Inquiry & Booking":
 
         # Show user's existing shipments
         st.subheader("Your Recent Shipments")
-        user_shipments = {ref: ship for ref, ship in SHIPMENTS.items() if ship['username'] == user['username']}
+        total_shipments = SHIPMENTS_BY_USER.count(user['username'])
+        if total_shipments:
+            # Per-status summary of the user's waybills
+            user_statuses = TRACKING.counts(user['username'])
+            booked_tons = SHIPMENTS_TABLE.select(username=user['username'])["qty"].sum()
+            st.caption(
+                " · ".join(f"{status}: {int(count)}" for status, count in user_statuses.items() if count)
+                + f" · {booked_tons:,.0f} MT booked in total"
+            )
 
-        if user_shipments:
-            for ref, shipment in user_shipments.items():
-                waybill = WAYBILLS.get(ref)
-                status = waybill['status'] if waybill else shipment['status']
+        if total_shipments:
+            pages = (total_shipments + SHIPMENTS_PAGE_SIZE - 1) // SHIPMENTS_PAGE_SIZE
+            page = 1
+            if pages > 1:
+                page = st.number_input("Page", min_value=1, max_value=pages, value=1, key="shipments_page")
+            # Only the refs on this page, newest booking first
+            for ref in SHIPMENTS_BY_USER.page(user['username'], page - 1, SHIPMENTS_PAGE_SIZE):
+                shipment = SHIPMENTS[ref]
+                status = TRACKING.status(ref, shipment['status'])
                 col1, col2, col3, col4 = st.columns(4)
                 with col1:
                     st.write(f"**{shipment['goods_type']}** ({shipment['qty']} MT)")
@@ -418,6 +731,7 @@ if menu == "Freight Inquiry & Booking":
                     st.write(f"Status: {status}")
                 with col4:
                     st.write(f"Waybill: `{ref}`")
+            st.caption(f"Page {page} of {pages} ({total_shipments} shipments)")
         else:
             st.info("You have no existing shipments. Book your first shipment below!")
 
@@ -427,43 +741,108 @@ if menu == "Freight Inquiry & Booking":
             st.write("### Freight Details")
             goods_type = st.selectbox("Goods Type", ["Wheat","Corn","Soybean"])
             qty = st.number_input("Quantity (metric tons)", min_value=1, max_value=1000, value=500)
-            origin = st.text_input("Origin", value="Quebec, QC")
-            destination = st.text_input("Destination", value="Windsor, ON")
+            # Station pickers filter the catalogue as you type; names that are
+            # not in the list are resolved by prefix when quoting
+            station_names = sorted(get_rate_engine().network.stations.values())
+            origin = st.selectbox("Origin", station_names, index=station_index(station_names, "Quebec, QC"), accept_new_options=True)
+            destination = st.selectbox("Destination", station_names, index=station_index(station_names, "Windsor, ON"), accept_new_options=True)
             dispatch_date = st.date_input("Preferred Dispatch Date", min_value=datetime.date.today())
             submitted = st.form_submit_button("Check Rates & Wagon Options")
 
+        # The quotes and the inquiry they answer are kept in the session:
+        # "Book & Pay Now" runs in a later rerun, when the form is no longer
+        # submitted
         if submitted:
-            # Dummy rate calc
-            dist_km = 900  # Approx Qc to Windsor
-            rate_per_ton_km = 0.11  # Dummy value
-            total_charge = qty * dist_km * rate_per_ton_km
-            st.success(f"Estimated Freight Charge: **${total_charge:,.2f}**")
+            quotes = quote_train_options(origin, destination, goods_type, qty, dispatch_date)
+            st.session_state['freight_quote'] = (
+                {"quotes": quotes, "goods_type": goods_type, "qty": qty, "dispatch_date": dispatch_date} if quotes else None
+            )
+            st.session_state.pop('freight_option', None)
+            st.session_state.pop('freight_confirmed', None)
+        inquiry = st.session_state.get('freight_quote')
+        if inquiry:
+            quotes = inquiry['quotes']
+            goods_type, qty, dispatch_date = inquiry['goods_type'], inquiry['qty'], inquiry['dispatch_date']
+            dist_km = next(iter(quotes.values())).dist_km
+            st.success(f"Estimated Freight Charge: **${min(q.charge for q in quotes.values()):,.2f}** ({dist_km:,.0f} km by rail)")
             st.write("### Available Wagons/Trains for Grain")
-            option = st.radio("Select Option", [
-                "Train A (Covered Hopper x25, departs 09:00)",
-                "Train B (Boxcar x22, departs 14:00)",
-                "Train C (Bulk Grain Car x30, departs 19:00)"
-            ])
+            # The labels (and the key) stay the same across reruns, so other
+            # bookings changing the free capacity never reset the choice
+            confirmed = st.session_state.get('freight_confirmed')
+            option = st.radio(
+                "Select Option",
+                list(quotes),
+                format_func=lambda o: f"{o}: ${quotes[o].charge:,.2f} (${quotes[o].rate_per_ton_km:.3f}/ton-km)",
+                key="freight_option",
+            )
+            st.caption("Free capacity on " + str(dispatch_date) + ": " + ", ".join(
+                f"{o.split(' (')[0]} {INVENTORY.remaining(INVENTORY.train_for_option(o), dispatch_date)[1]:,.0f} MT"
+                for o in quotes
+            ))
+            total_charge = quotes[option].charge
+            # What the user saw selected when pressing the button
+            st.session_state['freight_confirmed'] = (option, total_charge)
+            station_names_by_id = get_rate_engine().network.stations
             if st.button("Book & Pay Now", key="booknow"):
-                # Booking
-                booking_details = {
-                    "user": user['username'],
-                    "goods_type":goods_type,
-                    "qty":qty,
-                    "origin":origin,
-                    "destination":destination,
-                    "dispatch_date":str(dispatch_date),
-                    "option":option,
-                    "charge":total_charge,
-                    "status":"Booked",
-                    "booked_on":str(datetime.datetime.now())
-                }
-                # Generate waybill
-                waybill_ref = generate_waybill(booking_details)
-                SHIPMENTS[waybill_ref] = booking_details
-                st.session_state['just_booked'] = waybill_ref
-                st.success(f"Booking Confirmed! Waybill reference: `{waybill_ref}`")
-                st.balloons()
+                train = INVENTORY.trains[INVENTORY.train_for_option(option)]
+                if (option, total_charge) != confirmed:
+                    st.warning("The selected option changed. Check it and press \"Book & Pay Now\" again.")
+                elif train.departure_on(dispatch_date) <= datetime.datetime.now():
+                    st.error(f"{train.name} has already departed. Check rates again for another train or date.")
+                else:
+                    # Booking
+                    booking_details = {
+                        "username": user['username'],
+                        "goods_type":goods_type,
+                        "qty":qty,
+                        "origin":station_names_by_id[quotes[option].origin_id],
+                        "destination":station_names_by_id[quotes[option].destination_id],
+                        "dispatch_date":str(dispatch_date),
+                        "option":option,
+                        "charge":total_charge,
+                        "status":"Booked",
+                        "booked_on":str(datetime.datetime.now())
+                    }
+                    # Take the wagons on the chosen train first, so two sessions
+                    # cannot both book the last ones
+                    waybill_ref = new_waybill_ref()
+                    try:
+                        INVENTORY.reserve(INVENTORY.train_for_option(option), dispatch_date, qty, key=waybill_ref)
+                    except CapacityError as e:
+                        st.error(f"Could not book: {e}")
+                    else:
+                        try:
+                            # Generate waybill
+                            generate_waybill(booking_details, waybill_ref)
+                            DATA_STORE.put("shipments", waybill_ref, booking_details)
+                        except Exception as e:
+                            # The booking did not happen: give the wagons back and
+                            # drop a waybill that was already written
+                            INVENTORY.release(waybill_ref)
+                            if waybill_ref in WAYBILLS:
+                                DATA_STORE.delete("waybills", waybill_ref)
+                            st.error(f"Could not book: {e}")
+                        else:
+                            st.session_state['just_booked'] = waybill_ref
+                            del st.session_state['freight_quote']
+                            st.success(f"Booking Confirmed! Waybill reference: `{waybill_ref}`")
+                            st.balloons()
+
+        # Quotes for many origin/destination/quantity combinations in one pass
+        with st.expander("Batch Quotes (CSV upload)"):
+            st.write("Upload a CSV with `origin`, `destination`, `goods_type` and `qty` columns, and optionally `wagon_class`.")
+            inquiries_file = st.file_uploader("Inquiries CSV", type="csv", key="batch_quotes")
+            if inquiries_file is not None:
+                try:
+                    batch_quotes = quote_batch(get_rate_engine(), inquiries_file)
+                except ValueError as e:
+                    st.error(f"Cannot read inquiries: {e}")
+                else:
+                    failed = int(batch_quotes["error"].notna().sum())
+                    st.dataframe(batch_quotes)
+                    st.caption(f"{len(batch_quotes) - failed} quoted, {failed} could not be priced. "
+                               f"Total: ${batch_quotes['charge'].sum():,.2f}")
+                    st.download_button("Download Quotes", batch_quotes.to_csv(index=False), "quotes.csv", "text/csv")
 
         # Show latest waybill if just booked
         if st.session_state.get('just_booked'):
@@ -490,93 +869,59 @@ if menu == "Freight Inquiry & Booking":
 # Function to find shipment by waybill reference
 def find_shipment(waybill_ref):
     try:
-        with open(WAYBILLS_CSV, 'r') as file:
-            reader = csv.DictReader(file)
-            for row in reader:
-                if row['waybill_ref'] == waybill_ref:
-                    # Debug: Print the raw details string
-                    st.write("Raw details string:", row['details'])
-
-                    # Try to parse the details string into a dictionary
-                    details = {}
-                    try:
-                        # First try ast.literal_eval
-                        details = ast.literal_eval(row['details'])
-                    except (SyntaxError, ValueError) as e:
-                        st.warning(f"Could not parse details with ast: {e}")
-                        try:
-                            # Fall back to json.loads
-                            details = json.loads(row['details'])
-                        except json.JSONDecodeError as e:
-                            st.error(f"Could not parse details with json: {e}")
-                            # As a last resort, try to extract key information using string manipulation
-                            details_str = row['details']
-                            # Extract origin and destination using simple string parsing
-                            origin = "Unknown"
-                            destination = "Unknown"
-                            goods_type = "Unknown"
-                            qty = "Unknown"
-
-                            # Simple extraction from string (very basic)
-                            if "'origin':" in details_str:
-                                origin = details_str.split("'origin':")[1].split(",")[0].strip().strip("'\"")
-                            if "'destination':" in details_str:
-                                destination = details_str.split("'destination':")[1].split(",")[0].strip().strip("'\"")
-                            if "'goods_type':" in details_str:
-                                goods_type = details_str.split("'goods_type':")[1].split(",")[0].strip().strip("'\"")
-                            if "'qty':" in details_str:
-                                qty = details_str.split("'qty':")[1].split(",")[0].strip().strip("'\"")
-
-                            details = {
-                                'origin': origin,
-                                'destination': destination,
-                                'goods_type': goods_type,
-                                'qty': qty
-                            }
-
-                    # Parse tracking data if available
-                    tracking = []
-                    if 'tracking' in row:
-                        try:
-                            tracking = ast.literal_eval(row['tracking'])
-                        except:
-                            try:
-                                tracking = json.loads(row['tracking'])
-                            except:
-                                tracking = []
-
-                    return {
-                        'waybill_ref': row['waybill_ref'],
-                        'status': row.get('status', 'Unknown'),
-                        'details': details,
-                        'tracking': tracking,
-                        'eta': row.get('eta', 'Unknown'),
-                        'origin': details.get('origin', 'Unknown'),
-                        'destination': details.get('destination', 'Unknown'),
-                        'goods_type': details.get('goods_type', 'Unknown'),
-                        'qty': details.get('qty', 'Unknown')
-                    }
+        # In-memory rows keyed by reference first, then straight to the row in
+        # WAYBILLS_CSV through the waybill index instead of scanning the file
+        waybill = WAYBILLS.get(waybill_ref)
+        if waybill is None:
+            row = get_waybill_index().lookup(waybill_ref)
+            if row is not None:
+                # One decode per nested column (JSON, or legacy repr for unmigrated files)
+                waybill = decode_waybill_row(row)
+        if waybill is not None:
+            details = waybill.get('details')
+            if not isinstance(details, Mapping):
+                details = {}
+            if TRACKING.status(waybill_ref) is not None:
+                # Current status, ETA and timeline from the tracking events
+                status = TRACKING.status(waybill_ref)
+                eta = TRACKING.eta(waybill_ref)
+                tracking = TRACKING.timeline(waybill_ref)
+            else:
+                status = waybill.get('status', 'Unknown')
+                eta = waybill.get('eta', 'Unknown')
+                tracking = waybill.get('tracking') or []
+
+            return {
+                'waybill_ref': waybill_ref,
+                'status': status,
+                'details': details,
+                'tracking': tracking,
+                'eta': eta,
+                'origin': details.get('origin', 'Unknown'),
+                'destination': details.get('destination', 'Unknown'),
+                'goods_type': details.get('goods_type', 'Unknown'),
+                'qty': details.get('qty', 'Unknown')
+            }
     except Exception as e:
         st.error(f"Error finding shipment: {e}")
         import traceback
         st.error(traceback.format_exc())
     return None
 
+# Function to look up many waybill references at once: one row per ref with
+# status, ETA and last event, from the in-memory rows and tracking timeline
+# (and one pass over the waybill index for refs not in memory)
+def find_shipments(waybill_refs):
+    return track_many(TRACKING, WAYBILLS, waybill_refs, index=get_waybill_index())
+
 # 4. Track Shipment
 if menu == "Track Shipment (Waybill)":
     st.header("Track Shipment by Waybill Reference")
 
     # Display a few sample waybill references to help users
     if WAYBILLS:
-        # Get actual waybill references from the dictionary values
-        sample_refs = []
-        count = 0
-        for key, waybill in WAYBILLS.items():
-            if 'waybill_ref' in waybill:
-                sample_refs.append(waybill['waybill_ref'])
-                count += 1
-                if count >= 4:  # Limit to 3 samples
-                    break
+        # Prefer shipments that are still moving; any waybill otherwise
+        sample_refs = TRACKING.refs(["Booked", "In Transit"], limit=3) or list(WAYBILLS)[:3]
 
         if sample_refs:
             st.info(f"Sample waybill references for testing: {', '.join(sample_refs)}")
@@ -585,6 +930,9 @@ if menu == "Track Shipment (Waybill)":
         
     ref = st.text_input("Enter Waybill Reference")
     if st.button("Track Now"):
+        st.session_state['tracked_ref'] = ref
+    # Keep showing the tracked shipment across reruns (e.g. after "Simulate Delivery")
+    if ref and st.session_state.get('tracked_ref') == ref:
         # Use the find_shipment function to get shipment details
         waybill = find_shipment(ref)
 
@@ -622,34 +970,32 @@ if menu == "Track Shipment (Waybill)":
                             pass
                     st.write(f"- {time} — {status}")
 
-            # Update shipment status if not delivered
+            # Record a delivery event; status and ETA follow from the event stream
             if waybill['status'] != "Delivered" and st.button("Simulate Delivery"):
-                # Get the original waybill from WAYBILLS dictionary
-                original_waybill = WAYBILLS.get(ref)
-                if original_waybill:
-                    original_waybill['status'] = "Delivered"
-                    delivery_time = datetime.datetime.now()
-
-                    # Ensure tracking is a list
-                    if not isinstance(original_waybill.get('tracking'), list):
-                        original_waybill['tracking'] = []
-
-                    original_waybill['tracking'].append({"status": "Delivered", "time": delivery_time})
-
-                    # Also update the corresponding shipment
-                    if ref in SHIPMENTS:
-                        SHIPMENTS[ref]['status'] = "Delivered"
-
-                    # Save changes to CSV files
-                    save_data_to_csv(WAYBILLS, WAYBILLS_CSV)
-                    save_data_to_csv(SHIPMENTS, SHIPMENTS_CSV)
-
+                delivery_time = datetime.datetime.now()
+                try:
+                    TRACKING.record(ref, "Delivered", time=delivery_time, eta=delivery_time)
+                except UnknownWaybillError:
+                    st.error("Could not update waybill in database.")
+                else:
                     st.success("Delivery status updated and saved!")
                     st.balloons()
 
                     # Force refresh to show updated status
                     st.rerun()
-                else:
-                    st.error("Could not update waybill in database.")
         else:
-            st.error("Waybill not found!")
\ No newline at end of file
+            st.error("Waybill not found!")
+
+    # Bulk tracking: many references pasted at once
+    st.subheader("Track Many Shipments")
+    refs_text = st.text_area("Waybill References", placeholder="One per line, or separated by commas or spaces")
+    if st.button("Track All"):
+        bulk_refs = parse_refs(refs_text)
+        if not bulk_refs:
+            st.warning("Enter at least one waybill reference.")
+        else:
+            results = pd.DataFrame(find_shipments(bulk_refs))
+            found = int(results["found"].sum())
+            st.caption(f"{found} of {len(bulk_refs)} reference(s) found")
+            st.dataframe(results, hide_index=True)
+            st.download_button("Download Results", results.to_csv(index=False), "tracking.csv", "text/csv")
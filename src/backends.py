@@ -0,0 +1,439 @@
+import contextlib
+import os
+import sqlite3
+import threading
+import time
+
+from src.data_store import RELOAD, StaleRecordError, file_signature, load_data_from_csv, write_data_to_csv
+from src.journal import Journal, apply_record, read_records
+from src.locks import FileLock
+from src.records import record_version
+from src.schema import SCHEMAS
+from src.serialization import dumps_row, loads_row
+
+# Persistence modes for CsvBackend
+PERSIST_CSV = "csv"          # every change rewrites the dataset's CSV file
+PERSIST_JOURNAL = "journal"  # changes are appended to <csv>.journal, compacted in the background
+
+# CsvBackend file signature of a dataset whose in-memory copy is out of date
+_OUT_OF_DATE = "out of date"
+
+
+# Interface shared by the storage backends. DataStore keeps every dataset in
+# memory and uses a backend to load it, to notice changes made by other
+# processes, and to persist changes. `data` arguments are the live dataset
+# dict (already holding the change). Callers hold dataset_lock(name) for
+# load/save and write_lock(name) for put/delete.
+# put()/delete() get the row version the change was based on and raise
+# StaleRecordError when the stored row is at another version.
+class StorageBackend:
+    def __init__(self, datasets):
+        self.datasets = tuple(datasets)
+        self._dataset_locks = {name: threading.RLock() for name in self.datasets}
+
+    # Guards a dataset's in-memory dict and whole-dataset operations
+    def dataset_lock(self, name):
+        return self._dataset_locks[name]
+
+    # Held while one row is written. Backends that rewrite or append to one
+    # file per dataset serialize the dataset's writers.
+    def write_lock(self, name):
+        return self._dataset_locks[name]
+
+    # All rows of a dataset, keyed by primary key
+    def load(self, name):
+        raise NotImplementedError
+
+    # None when the dataset is unchanged since we last looked, RELOAD when it
+    # has to be re-read, or {key: row, or None if deleted} of changed rows
+    def poll(self, name):
+        raise NotImplementedError
+
+    def put(self, name, data, key, value, expected_version=None):
+        raise NotImplementedError
+
+    def delete(self, name, data, key, expected_version=None):
+        raise NotImplementedError
+
+    # Persist changes to several datasets at once:
+    # {name: (data, [(key, value or None to delete, expected_version)])}.
+    # Backends override this to check every version before writing anything
+    # and to write each dataset once.
+    def write_many(self, writes):
+        for name, (data, rows) in writes.items():
+            for key, value, expected_version in rows:
+                if value is None:
+                    self.delete(name, data, key, expected_version)
+                else:
+                    self.put(name, data, key, value, expected_version)
+
+    # Persist the whole dataset
+    def save(self, name, data):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+
+# CSV files, one per dataset.
+# In csv mode every change rewrites the dataset's file. In journal mode the CSV
+# file is a snapshot: put()/delete() append one record to the dataset's journal
+# instead, and once the journal holds `compact_every` records it is folded into
+# a new snapshot on a background thread. Loading reads the snapshot and replays
+# the journal tail.
+# Writes hold an inter-process lock on <csv>.lock. If another process changed
+# the files since we read them, the write is checked against and applied to
+# the current files (not our stale copy), and the dataset is reloaded on the
+# next poll().
+class CsvBackend(StorageBackend):
+    def __init__(self, paths, persistence=PERSIST_CSV, compact_every=1000, sync_interval=1.0):
+        # paths: dataset name -> CSV file path
+        super().__init__(paths)
+        self.paths = dict(paths)
+        self.persistence = persistence
+        self.compact_every = compact_every
+        self.sync_interval = sync_interval
+        self._signatures = {}
+        self._journals = {}
+        self._compacting = {}
+        self._file_locks = {name: FileLock(path + ".lock") for name, path in self.paths.items()}
+        if self.persistence == PERSIST_JOURNAL:
+            threading.Thread(target=self._sync_loop, daemon=True).start()
+
+    def load(self, name):
+        file_path = self.paths[name]
+        with self.dataset_lock(name):
+            signature = file_signature(file_path)
+            data = load_data_from_csv(file_path, schema=SCHEMAS.get(name))
+            if self.persistence == PERSIST_JOURNAL:
+                self._replay(name, data)
+            self._signatures[name] = signature
+            return data
+
+    # Apply a leftover compaction journal (if a compaction was interrupted) and
+    # the live journal on top of the snapshot
+    def _replay(self, name, data):
+        journal_path = self.paths[name] + ".journal"
+        for path in (journal_path + ".compacting", journal_path):
+            for record in read_records(path):
+                apply_record(data, record)
+        if name in self._journals:
+            self._journals[name].close()
+        self._journals[name] = Journal(journal_path, sync_interval=self.sync_interval)
+
+    # A dataset is re-read when its file signature changed behind our back
+    # (another process wrote it); our own writes keep the signature current.
+    def poll(self, name):
+        if self._signatures.get(name) != file_signature(self.paths[name]):
+            return RELOAD
+        journal = self._journals.get(name)
+        if journal is not None and journal.changed_externally():
+            return RELOAD
+        return None
+
+    def put(self, name, data, key, value, expected_version=None):
+        self.write_many({name: (data, [(key, value, expected_version)])})
+
+    def delete(self, name, data, key, expected_version=None):
+        self.write_many({name: (data, [(key, None, expected_version)])})
+
+    # Every dataset involved is locked and checked before any is written;
+    # each is then rewritten once (csv mode) or appended to (journal mode)
+    def write_many(self, writes):
+        with contextlib.ExitStack() as stack:
+            for name in sorted(writes):
+                stack.enter_context(self.dataset_lock(name))
+                stack.enter_context(self._file_locks[name])
+            targets = []
+            for name, (data, rows) in writes.items():
+                stale = self.poll(name) == RELOAD
+                if stale:
+                    # Someone else wrote the files: check and apply the
+                    # changes against what is on disk now
+                    data = self._read(name)
+                    for key, _, expected_version in rows:
+                        if expected_version is not None and record_version(data.get(key)) != expected_version:
+                            raise StaleRecordError(f"{name} {key} was changed by another process")
+                    for key, value, _ in rows:
+                        apply_record(data, _journal_record(key, value))
+                targets.append((name, data, rows, stale))
+            for name, data, rows, stale in targets:
+                self._write_changes(name, data, rows)
+                if stale:
+                    # Our in-memory copy misses the other writes: reload on the next poll
+                    self._signatures[name] = _OUT_OF_DATE
+
+    def _write_changes(self, name, data, rows):
+        if self.persistence != PERSIST_JOURNAL:
+            self._save(name, data)
+            return
+        journal = self._journals[name]
+        for key, value, _ in rows:
+            journal.append("delete" if value is None else "put", key, value)
+        if journal.records >= self.compact_every and not self._compacting.get(name):
+            self._compacting[name] = True
+            threading.Thread(target=self._compact, args=(name, data), daemon=True).start()
+
+    # Current contents of a dataset's files, without touching our state
+    # (apart from reopening a journal that was rotated underneath us)
+    def _read(self, name):
+        data = load_data_from_csv(self.paths[name], schema=SCHEMAS.get(name))
+        if self.persistence == PERSIST_JOURNAL:
+            self._replay(name, data)
+        return data
+
+    def save(self, name, data):
+        if self.persistence == PERSIST_JOURNAL:
+            self._compact(name, data)
+            return
+        with self.dataset_lock(name), self._file_locks[name]:
+            self._save(name, data)
+
+    def _save(self, name, data):
+        file_path = self.paths[name]
+        write_data_to_csv(data, file_path, SCHEMAS.get(name))
+        self._signatures[name] = file_signature(file_path)
+
+    # Fold the journal into a fresh snapshot. The rows are copied and the
+    # journal rotated under the dataset lock; the snapshot is written after
+    # releasing it. The file lock is held throughout, so writers (here and in
+    # other processes) wait until the new snapshot is in place.
+    def _compact(self, name, data):
+        file_path = self.paths[name]
+        rotated_path = file_path + ".journal.compacting"
+        file_lock = self._file_locks[name]
+        try:
+            with self.dataset_lock(name):
+                file_lock.acquire()
+                if self.poll(name) == RELOAD:
+                    # Another process wrote since we read: compact what is on disk
+                    data = self._read(name)
+                    self._signatures[name] = _OUT_OF_DATE
+                rows = {key: dict(row) for key, row in data.items()}
+                self._journals[name].rotate(rotated_path)
+            try:
+                # The rotated journal is only dropped once the new snapshot
+                # has replaced the file; if writing fails it stays and is
+                # replayed (or folded into the next compaction)
+                write_data_to_csv(rows, file_path, SCHEMAS.get(name))
+                os.remove(rotated_path)
+                if self._signatures[name] != _OUT_OF_DATE:
+                    self._signatures[name] = file_signature(file_path)
+            finally:
+                file_lock.release()
+        finally:
+            self._compacting[name] = False
+
+    # Background fsync of journal records that have not hit a batch boundary yet
+    def _sync_loop(self):
+        while True:
+            time.sleep(self.sync_interval)
+            for journal in list(self._journals.values()):
+                journal.sync()
+
+    def close(self):
+        for journal in self._journals.values():
+            journal.close()
+
+
+def _journal_record(key, value):
+    if value is None:
+        return {"op": "delete", "key": key}
+    return {"op": "put", "key": key, "value": value}
+
+
+# SQLite tables: dataset -> (primary key column, indexed columns)
+SQLITE_TABLES = {name: (schema.key, schema.indexed) for name, schema in SCHEMAS.items()}
+
+# Change log entries kept for other processes to catch up from; a reader that
+# falls further behind than this reloads the dataset
+_CHANGE_LOG_KEEP = 10000
+
+
+# Embedded SQLite database shared by every Streamlit worker on the host.
+# Each dataset is a table with an indexed primary key, a few indexed lookup
+# columns and the full row as tagged JSON. The database runs in WAL mode so
+# readers never block the writer. Every write also appends (dataset, key) to a
+# change_log table in the same transaction, so other processes pick up just
+# the changed rows on their next poll() instead of re-reading tables.
+# Statements are fixed parameterized SQL strings, compiled once per connection
+# by sqlite3's statement cache.
+# Row versions are checked inside the write transaction, so the database does
+# the compare-and-set; no dataset-wide lock is held in-process.
+class SqliteBackend(StorageBackend):
+    def __init__(self, db_path, csv_paths=None, tables=None):
+        self.tables = dict(tables or SQLITE_TABLES)
+        super().__init__(self.tables)
+        self.db_path = db_path
+        # CSV files to import a dataset from the first time its table is empty
+        self.csv_paths = dict(csv_paths or {})
+        self._local = threading.local()
+        self._last_seq = {}
+        self._writes = 0
+        self._sql = {name: self._statements(name) for name in self.tables}
+        self._create_schema()
+
+    def _connection(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute("PRAGMA synchronous=NORMAL")
+            self._local.connection = connection
+        return connection
+
+    def _statements(self, name):
+        key, indexed = self.tables[name]
+        columns = [key, *indexed, "data"]
+        updates = ", ".join(f"{column} = excluded.{column}" for column in columns[1:])
+        return {
+            "select_all": f"SELECT {key}, data FROM {name}",
+            "select_one": f"SELECT data FROM {name} WHERE {key} = ?",
+            "upsert": (
+                f"INSERT INTO {name} ({', '.join(columns)}) VALUES ({', '.join('?' * len(columns))}) "
+                f"ON CONFLICT({key}) DO UPDATE SET {updates}"
+            ),
+            "delete": f"DELETE FROM {name} WHERE {key} = ?",
+            "delete_all": f"DELETE FROM {name}",
+            "count": f"SELECT COUNT(*) FROM {name}",
+        }
+
+    def _create_schema(self):
+        connection = self._connection()
+        with connection:
+            for name, (key, indexed) in self.tables.items():
+                extra = "".join(f", {column} TEXT" for column in indexed)
+                connection.execute(f"CREATE TABLE IF NOT EXISTS {name} ({key} TEXT PRIMARY KEY{extra}, data TEXT NOT NULL)")
+                for column in indexed:
+                    connection.execute(f"CREATE INDEX IF NOT EXISTS {name}_{column} ON {name} ({column})")
+                # Columns no longer indexed (databases made by older versions)
+                # would go stale: drop them and their index
+                for _, column, *_ in connection.execute(f"PRAGMA table_info({name})").fetchall():
+                    if column not in (key, *indexed, "data"):
+                        connection.execute(f"DROP INDEX IF EXISTS {name}_{column}")
+                        connection.execute(f"ALTER TABLE {name} DROP COLUMN {column}")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS change_log "
+                "(seq INTEGER PRIMARY KEY AUTOINCREMENT, dataset TEXT NOT NULL, key TEXT)"
+            )
+            connection.execute("CREATE INDEX IF NOT EXISTS change_log_dataset ON change_log (dataset, seq)")
+            connection.execute("CREATE TABLE IF NOT EXISTS meta (name TEXT PRIMARY KEY, value INTEGER NOT NULL)")
+
+    def _row_params(self, name, key, value):
+        _, indexed = self.tables[name]
+        return (key, *(value.get(column) for column in indexed), dumps_row(value))
+
+    def _log_change(self, connection, name, key):
+        connection.execute("INSERT INTO change_log (dataset, key) VALUES (?, ?)", (name, key))
+
+    def _current_seq(self, connection):
+        row = connection.execute("SELECT MAX(seq) FROM change_log").fetchone()
+        return row[0] or 0
+
+    def load(self, name):
+        connection = self._connection()
+        sql = self._sql[name]
+        if connection.execute(sql["count"]).fetchone()[0] == 0 and os.path.exists(self.csv_paths.get(name, "")):
+            rows = load_data_from_csv(self.csv_paths[name], schema=SCHEMAS.get(name))
+            self.save(name, rows)
+        with connection:
+            # One read transaction, so the rows and the change log position match
+            connection.execute("BEGIN")
+            self._last_seq[name] = self._current_seq(connection)
+            return {key: loads_row(data) for key, data in connection.execute(sql["select_all"])}
+
+    def poll(self, name):
+        connection = self._connection()
+        last_seq = self._last_seq.get(name, 0)
+        pruned = connection.execute("SELECT value FROM meta WHERE name = 'pruned_through'").fetchone()
+        if pruned and last_seq < pruned[0]:
+            return RELOAD
+        changed = connection.execute(
+            "SELECT seq, key FROM change_log WHERE dataset = ? AND seq > ? ORDER BY seq", (name, last_seq)
+        ).fetchall()
+        if not changed:
+            return None
+        self._last_seq[name] = changed[-1][0]
+        if any(key is None for _, key in changed):
+            # A whole-dataset save
+            return RELOAD
+        select_one = self._sql[name]["select_one"]
+        changes = {}
+        for _, key in changed:
+            row = connection.execute(select_one, (key,)).fetchone()
+            changes[key] = loads_row(row[0]) if row else None
+        return changes
+
+    def write_lock(self, name):
+        return contextlib.nullcontext()
+
+    def _check_version(self, connection, name, key, expected_version):
+        if expected_version is None:
+            return
+        row = connection.execute(self._sql[name]["select_one"], (key,)).fetchone()
+        if record_version(loads_row(row[0]) if row else None) != expected_version:
+            raise StaleRecordError(f"{name} {key} was changed by another process")
+
+    def put(self, name, data, key, value, expected_version=None):
+        self.write_many({name: (data, [(key, value, expected_version)])})
+
+    def delete(self, name, data, key, expected_version=None):
+        self.write_many({name: (data, [(key, None, expected_version)])})
+
+    # All changes in one transaction: a stale version rolls back every one
+    def write_many(self, writes):
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            for name, (_, rows) in writes.items():
+                sql = self._sql[name]
+                for key, _, expected_version in rows:
+                    self._check_version(connection, name, key, expected_version)
+                for key, value, _ in rows:
+                    if value is None:
+                        connection.execute(sql["delete"], (key,))
+                    else:
+                        connection.execute(sql["upsert"], self._row_params(name, key, value))
+                    self._log_change(connection, name, key)
+        self._after_write()
+
+    def save(self, name, data):
+        connection = self._connection()
+        sql = self._sql[name]
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            connection.execute(sql["delete_all"])
+            connection.executemany(sql["upsert"], (self._row_params(name, key, value) for key, value in list(data.items())))
+            self._log_change(connection, name, None)
+        self._after_write()
+
+    # Keys of the rows whose indexed column equals a value (e.g. a user's shipments)
+    def find_keys(self, name, column, value):
+        key, indexed = self.tables[name]
+        if column not in indexed:
+            raise ValueError(f"{name}.{column} is not an indexed column")
+        rows = self._connection().execute(f"SELECT {key} FROM {name} WHERE {column} = ?", (value,))
+        return [row[0] for row in rows]
+
+    # Trim the change log now and then
+    def _after_write(self):
+        self._writes += 1
+        if self._writes % 1000:
+            return
+        connection = self._connection()
+        with connection:
+            connection.execute("BEGIN IMMEDIATE")
+            cutoff = self._current_seq(connection) - _CHANGE_LOG_KEEP
+            if cutoff > 0:
+                connection.execute("DELETE FROM change_log WHERE seq <= ?", (cutoff,))
+                connection.execute(
+                    "INSERT INTO meta (name, value) VALUES ('pruned_through', ?) "
+                    "ON CONFLICT(name) DO UPDATE SET value = MAX(value, excluded.value)",
+                    (cutoff,),
+                )
+
+    def close(self):
+        connection = getattr(self._local, "connection", None)
+        if connection is not None:
+            connection.close()
+            self._local.connection = None
@@ -0,0 +1,152 @@
+import ast
+import contextlib
+import hashlib
+import mmap
+import os
+import re
+import threading
+
+from src.records import record_version
+
+# Size of the pieces files are read and hashed in
+_CHUNK_SIZE = 1 << 20
+
+_DIGEST = re.compile(r"[0-9a-f]{64}")
+
+# Leading bytes of the document types the registration form accepts
+_SIGNATURES = [
+    (b"%PDF", "application/pdf"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+    (b"\xff\xd8\xff", "image/jpeg"),
+]
+
+
+# Raised for a digest that is malformed or not in the store
+class MissingBlobError(ValueError):
+    pass
+
+
+# Content-addressed store of uploaded documents on local disk. A document is
+# kept once under the hex SHA-256 of its bytes (<root>/ab/abcdef...), so rows
+# only hold the digest and identical uploads share one file. Files are written
+# to a temporary file while hashing, fsynced, then renamed into place, so
+# concurrent writers of the same document are harmless and readers never see
+# a partial file. Documents are read back as a stream (open()) or memory-mapped
+# (map()), never loaded along with the rows that refer to them.
+class BlobStore:
+    def __init__(self, root):
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    def path(self, digest):
+        if not isinstance(digest, str) or not _DIGEST.fullmatch(digest):
+            raise MissingBlobError(f"not a SHA-256 digest: {digest!r}")
+        return os.path.join(self.root, digest[:2], digest)
+
+    def __contains__(self, digest):
+        try:
+            return os.path.exists(self.path(digest))
+        except MissingBlobError:
+            return False
+
+    # Store bytes or the content of a binary file object (read in chunks) and
+    # return its digest
+    def put(self, data):
+        if isinstance(data, (bytes, bytearray, memoryview)):
+            digest = hashlib.sha256(data).hexdigest()
+            if digest in self:
+                return digest
+            chunks = [data]
+        else:
+            if hasattr(data, "seek"):
+                data.seek(0)
+            digest = None
+            chunks = iter(lambda: data.read(_CHUNK_SIZE), b"")
+        tmp_path = os.path.join(self.root, f".{os.getpid()}.{threading.get_ident()}.tmp")
+        try:
+            sha = hashlib.sha256()
+            with open(tmp_path, "wb") as file:
+                for chunk in chunks:
+                    sha.update(chunk)
+                    file.write(chunk)
+                file.flush()
+                os.fsync(file.fileno())
+            digest = digest or sha.hexdigest()
+            path = self.path(digest)
+            if os.path.exists(path):
+                return digest
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            os.replace(tmp_path, path)
+            return digest
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    # Binary file object reading the document (the caller closes it)
+    def open(self, digest):
+        try:
+            return open(self.path(digest), "rb")
+        except FileNotFoundError:
+            raise MissingBlobError(f"no document {digest}") from None
+
+    # Read-only memory map of the document, for use in a with statement
+    @contextlib.contextmanager
+    def map(self, digest):
+        with self.open(digest) as file:
+            if os.fstat(file.fileno()).st_size == 0:
+                yield b""
+                return
+            with mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+                yield mapped
+
+    def size(self, digest):
+        try:
+            return os.path.getsize(self.path(digest))
+        except FileNotFoundError:
+            raise MissingBlobError(f"no document {digest}") from None
+
+    # MIME type from the document's leading bytes (application/octet-stream
+    # when unrecognized)
+    def content_type(self, digest):
+        with self.open(digest) as file:
+            head = file.read(8)
+        for signature, content_type in _SIGNATURES:
+            if head.startswith(signature):
+                return content_type
+        return "application/octet-stream"
+
+
+# Bytes of a document stored inline by older versions, which wrote the Python
+# repr of the bytes ("b'...'") into the CSV cell
+def legacy_document_bytes(value):
+    if isinstance(value, (bytes, bytearray)):
+        return bytes(value)
+    if not isinstance(value, str) or not value:
+        return b""
+    if value[:2] in ("b'", 'b"'):
+        try:
+            decoded = ast.literal_eval(value)
+        except (ValueError, SyntaxError):
+            decoded = None
+        if isinstance(decoded, bytes):
+            return decoded
+    return value.encode("utf-8")
+
+
+# Move the documents that rows of the given datasets still hold inline ("doc")
+# into the blob store, leaving only their digest ("doc_sha256"). Returns the
+# number of rows changed.
+def move_inline_documents(store, blobs, names):
+    changes = []
+    for name in names:
+        for key, row in store.get(name).items():
+            if "doc" not in row:
+                continue
+            moved = row.copy()
+            document = legacy_document_bytes(moved.pop("doc"))
+            if document and not moved.get("doc_sha256"):
+                moved["doc_sha256"] = blobs.put(document)
+            changes.append((name, key, moved, record_version(row)))
+    if changes:
+        store.write_many(changes)
+    return len(changes)
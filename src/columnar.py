@@ -0,0 +1,137 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+# Column kinds for ColumnarTable
+CATEGORY = "category"    # low-cardinality text (owner, status, goods type, cities)
+NUMBER = "number"        # quantities and charges
+TIMESTAMP = "timestamp"  # ISO-8601 strings or datetimes
+TEXT = "text"            # anything else, kept as Python objects
+
+
+def _column(values, kind, categories=None):
+    if kind == CATEGORY:
+        return pd.Categorical(values, categories=categories)
+    if kind == NUMBER:
+        return pd.to_numeric(pd.Series(values, dtype=object), errors="coerce").to_numpy()
+    if kind == TIMESTAMP:
+        return pd.to_datetime(pd.Series(values, dtype=object).map(_timestamp_text), format="ISO8601", errors="coerce").to_numpy()
+    return np.array(values, dtype=object)
+
+
+def _timestamp_text(value):
+    return value.isoformat() if hasattr(value, "isoformat") else value
+
+
+# Columnar copy of a dataset (one pandas column per field, plus the primary
+# key in a "key" column) for vectorized filters and aggregates such as "all In Transit shipments
+# from Quebec" or "tons booked per goods type per day". It is registered with
+# DataStore.add_index() like any other secondary index, so it sees every
+# put/delete/reload. Changes are queued and applied in one batch the next time
+# the table is read: changed rows are appended and their old versions marked
+# dead, and the frame is compacted once half of it is dead.
+class ColumnarTable:
+    def __init__(self, columns):
+        # columns: field name -> CATEGORY, NUMBER, TIMESTAMP or TEXT
+        self.columns = dict(columns)
+        self._pending = {}  # key -> row, or None when deleted
+        self._lock = threading.Lock()
+        self._reset(self._build({}))
+
+    def _build(self, rows, categories=None):
+        values = list(rows.values())
+        data = {}
+        for column, kind in self.columns.items():
+            cells = [row.get(column) for row in values]
+            data[column] = _column(cells, kind, (categories or {}).get(column))
+        data["key"] = np.array(list(rows), dtype=object)
+        return pd.DataFrame(data)
+
+    def _reset(self, frame):
+        self._frame = frame
+        self._alive = np.ones(len(frame), dtype=bool)
+        self._positions = {key: position for position, key in enumerate(frame["key"].tolist())}
+        self._dead = 0
+        self._live = frame
+
+    def rebuild(self, data):
+        frame = self._build(data)
+        with self._lock:
+            self._reset(frame)
+            self._pending = {}
+
+    def add(self, key, row):
+        with self._lock:
+            self._pending[key] = row
+
+    def remove(self, key):
+        with self._lock:
+            self._pending[key] = None
+
+    # The live rows as a DataFrame (treat it as read-only)
+    def frame(self):
+        with self._lock:
+            if self._pending:
+                self._apply(self._pending)
+                self._pending = {}
+            return self._live
+
+    def _apply(self, changes):
+        for key in changes:
+            position = self._positions.pop(key, None)
+            if position is not None:
+                self._alive[position] = False
+                self._dead += 1
+        rows = {key: row for key, row in changes.items() if row is not None}
+        if rows:
+            self._append(rows)
+        if self._dead and self._dead * 2 >= len(self._frame):
+            self._reset(self._frame[self._alive].reset_index(drop=True))
+        else:
+            self._live = self._frame[self._alive] if self._dead else self._frame
+
+    def _append(self, rows):
+        # Give the new rows the table's categories (adding any new values) so
+        # the concatenated columns stay categorical
+        categories = {}
+        for column, kind in self.columns.items():
+            if kind != CATEGORY:
+                continue
+            known = self._frame[column].cat.categories
+            new = {row.get(column) for row in rows.values()} - set(known) - {None}
+            if new:
+                self._frame[column] = self._frame[column].cat.add_categories(sorted(new, key=str))
+            categories[column] = self._frame[column].cat.categories
+        start = len(self._frame)
+        self._frame = pd.concat([self._frame, self._build(rows, categories)], ignore_index=True)
+        self._alive = np.concatenate([self._alive, np.ones(len(rows), dtype=bool)])
+        self._positions.update((key, start + offset) for offset, key in enumerate(rows))
+
+    # Rows matching every condition: column=value, or column=[values] for any of them
+    def select(self, **conditions):
+        frame = self.frame()
+        mask = np.ones(len(frame), dtype=bool)
+        for column, value in conditions.items():
+            if isinstance(value, (list, tuple, set, frozenset)):
+                mask &= frame[column].isin(list(value)).to_numpy()
+            else:
+                mask &= (frame[column] == value).to_numpy()
+        return frame[mask]
+
+    # Keys of the matching rows
+    def keys(self, limit=None, **conditions):
+        keys = self.select(**conditions)["key"]
+        return keys[:limit].tolist() if limit is not None else keys.tolist()
+
+    def count(self, **conditions):
+        return len(self.select(**conditions))
+
+    # Sum of a numeric column per group, e.g. totals("qty", ["goods_type"], per_day="booked_on").
+    # per_day adds the calendar day of a timestamp column as the last group level.
+    def totals(self, value, by, per_day=None, **conditions):
+        frame = self.select(**conditions)
+        groups = [frame[column] for column in by]
+        if per_day:
+            groups.append(frame[per_day].dt.floor("D").rename("day"))
+        return frame[value].groupby(groups, observed=True).sum()
@@ -0,0 +1,150 @@
+import base64
+import hashlib
+import hmac
+import secrets
+
+from src.data_store import StaleRecordError
+from src.records import record_version
+from src.sessions import MemorySessionStore
+
+# Stored password format: pbkdf2_sha256$<iterations>$<salt>$<hash> (base64)
+ALGORITHM = "pbkdf2_sha256"
+# PBKDF2-SHA256 cost; raise it as hardware gets faster (stored hashes are
+# upgraded on their next successful login)
+DEFAULT_ITERATIONS = 600_000
+SALT_BYTES = 16
+
+
+def _b64(data):
+    return base64.b64encode(data).decode("ascii")
+
+
+# Salted PBKDF2 hash of a password, in the stored format
+def hash_password(password, iterations=DEFAULT_ITERATIONS, salt=None):
+    salt = salt if salt is not None else secrets.token_bytes(SALT_BYTES)
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations)
+    return f"{ALGORITHM}${iterations}${_b64(salt)}${_b64(digest)}"
+
+
+def _parse(stored):
+    parts = stored.split("$") if isinstance(stored, str) else []
+    if len(parts) != 4 or parts[0] != ALGORITHM:
+        return None
+    try:
+        return int(parts[1]), base64.b64decode(parts[2]), base64.b64decode(parts[3])
+    except ValueError:
+        return None
+
+
+# Whether a password matches its stored hash, in constant time. Anything
+# but a hash (such as a plain password) never matches.
+def verify_password(password, stored):
+    if not isinstance(password, str):
+        return False
+    parsed = _parse(stored)
+    if parsed is None:
+        return False
+    iterations, salt, expected = parsed
+    digest = hashlib.pbkdf2_hmac("sha256", password.encode("utf-8"), salt, iterations)
+    return hmac.compare_digest(digest, expected)
+
+
+# Whether a stored value should be hashed again: a plain password, or a hash
+# made with fewer iterations than `iterations`
+def needs_rehash(stored, iterations=DEFAULT_ITERATIONS):
+    parsed = _parse(stored)
+    return parsed is None or parsed[0] < iterations
+
+
+# Replace the plain passwords that older versions stored in the rows of the
+# `names` datasets by hashes, with one write_many; returns how many were
+# hashed. Raises StaleRecordError if a row changed meanwhile.
+def hash_plain_passwords(store, names, iterations=DEFAULT_ITERATIONS):
+    changes = []
+    for name in names:
+        for key, row in store.get(name).items():
+            password = row.get("password")
+            if not isinstance(password, str) or not password or _parse(password) is not None:
+                continue
+            hashed = row.copy()
+            hashed["password"] = hash_password(password, iterations)
+            changes.append((name, key, hashed, record_version(row)))
+    if changes:
+        store.write_many(changes)
+    return len(changes)
+
+
+# Short fingerprint of a stored password, kept with each session so that
+# changing the password ends the sessions opened with the old one
+def credential_stamp(stored):
+    return hashlib.sha256(str(stored).encode("utf-8")).hexdigest()[:16]
+
+
+# Password logins against a dataset of user rows (username -> row with
+# "password" and "approved"), with verified sessions kept in a SessionStore
+# (src/sessions.py; in memory unless given one).
+# Finding the user is one dict lookup; the slow hash runs once per login.
+# A successful login returns a random session token; user(token) then
+# resolves it with one session lookup and one row lookup, without hashing
+# again, for as long as the session lives, the account is approved and its
+# stored password is unchanged, so changing a password or revoking an
+# account ends its sessions.
+# Hashes made with fewer iterations are replaced by a fresh hash on login
+# (plain passwords from older versions must be hashed first, see
+# hash_plain_passwords).
+class Authenticator:
+    def __init__(self, store, name="users", iterations=DEFAULT_ITERATIONS, sessions=None):
+        self.store = store
+        self.name = name
+        self.iterations = iterations
+        self.sessions = sessions if sessions is not None else MemorySessionStore()
+        # Checked against for unknown users, so they take as long as known ones
+        self._dummy = hash_password("", iterations)
+
+    @property
+    def users(self):
+        return self.store.get(self.name)
+
+    # (user row, session token) for valid credentials of an approved user,
+    # else None
+    def login(self, username, password):
+        row = self.users.get(username)
+        if row is None or row.get("approved") != "yes":
+            verify_password(password or "", self._dummy)
+            return None
+        stored = row.get("password")
+        if not verify_password(password, stored):
+            return None
+        if needs_rehash(stored, self.iterations):
+            row = self._upgrade(username, row, password)
+            stored = row.get("password")
+        token = secrets.token_urlsafe(32)
+        self.sessions.put(token, username, credential_stamp(stored))
+        return row, token
+
+    def _upgrade(self, username, row, password):
+        upgraded = row.copy()
+        upgraded["password"] = hash_password(password, self.iterations)
+        try:
+            self.store.put(self.name, username, upgraded, expected_version=record_version(row))
+        except StaleRecordError:
+            # Changed elsewhere in the meantime; upgrade on a later login
+            return row
+        return self.users.get(username, row)
+
+    # User row of a verified session, or None (unknown, expired or revoked)
+    def user(self, token):
+        if not token:
+            return None
+        session = self.sessions.get(token)
+        if session is None:
+            return None
+        username, stamp = session
+        row = self.users.get(username)
+        if row is None or row.get("approved") != "yes" or credential_stamp(row.get("password")) != stamp:
+            self.sessions.delete(token)
+            return None
+        return row
+
+    def logout(self, token):
+        self.sessions.delete(token)
@@ -0,0 +1,354 @@
+import contextlib
+import datetime
+import os
+from collections.abc import Mapping
+
+import pandas as pd
+import streamlit as st
+
+from src.blobs import legacy_document_bytes
+from src.locks import StripedLocks, atomic_write
+from src.records import VERSION_COLUMN, record_version
+from src.schema import SCHEMAS, TEXT, MissingKeyColumnError, UnreadableDataError
+from src.serialization import decode_nested_column, encode_nested
+
+
+# Versions are read as float64 (older files have blank cells) but, like the
+# int64 columns, hold whole numbers
+def _is_integer(column, dtype):
+    return dtype == "int64" or column == VERSION_COLUMN
+
+
+# Function to load data from CSV or initialize if not exists.
+# With a schema (see src/schema.py) only the schema's columns are read, with
+# their dtypes fixed up front, rows are keyed by the schema's primary key and
+# built as the schema's compact record type. Numeric cells that are blank or
+# not numbers are read as missing (None in integer columns, NaN in float
+# columns) rather than failing the whole file. A file that exists but cannot
+# be read raises UnreadableDataError.
+def load_data_from_csv(file_path, default_dict=None, schema=None):
+    if default_dict is None:
+        default_dict = {}
+
+    if os.path.exists(file_path):
+        try:
+            if schema:
+                dtypes = schema.dtypes
+                # Numeric columns are read as text and converted below
+                read_dtypes = {column: TEXT if dtype != TEXT else dtype for column, dtype in dtypes.items()}
+                df = pd.read_csv(file_path, dtype=read_dtypes, usecols=lambda column: column in dtypes)
+                key_column = schema.key
+            else:
+                df = pd.read_csv(file_path)
+                key_column = 'username'
+            if key_column not in df.columns:
+                hint = " (add it with: python -m src.schema <shipments.csv> <waybills.csv>)" if key_column == 'waybill_ref' else ""
+                raise MissingKeyColumnError(f"no '{key_column}' column to key rows by{hint}")
+            # Rows without a key cannot be addressed; skip them
+            missing = df[key_column].isna()
+            if missing.any():
+                st.warning(f"{file_path}: skipped {int(missing.sum())} row(s) without a '{key_column}'")
+                df = df[~missing]
+            # Documents stored inline by older versions (the repr of their bytes)
+            if 'doc' in df.columns:
+                df['doc'] = df['doc'].fillna('').map(legacy_document_bytes)
+            for column, dtype in (schema.dtypes.items() if schema else ()):
+                if dtype == TEXT or column not in df.columns:
+                    continue
+                integer = _is_integer(column, dtype)
+                values = pd.to_numeric(df[column], errors="coerce")
+                if integer:
+                    values = values.where(values % 1 == 0)
+                bad = values.isna() & df[column].notna()
+                if bad.any():
+                    st.warning(f"{file_path}: {int(bad.sum())} invalid '{column}' value(s) read as missing")
+                if column == VERSION_COLUMN:
+                    values = values.fillna(0)
+                if integer:
+                    values = values.astype("Int64").astype(object).where(values.notna(), None)
+                df[column] = values
+            for column in (schema.nested_columns if schema else ()):
+                if column in df.columns:
+                    df[column], failed = decode_nested_column(df[column], column)
+                    if failed:
+                        st.warning(f"{file_path}: {failed} '{column}' value(s) cannot be decoded; kept as text")
+            # Duplicate keys would silently collapse into one row; report them (the last row wins)
+            duplicated = df[key_column][df[key_column].duplicated()]
+            if len(duplicated):
+                st.warning(
+                    f"{file_path}: {len(duplicated)} duplicate '{key_column}' value(s), "
+                    f"e.g. {', '.join(map(str, duplicated.unique()[:5]))}; keeping the last row for each"
+                )
+            # Convert DataFrame to dictionary keyed by the primary key.
+            # Build the rows from whole columns rather than row by row.
+            columns = list(df.columns)
+            row_type = schema.record_type if schema else dict
+            rows = [row_type(**dict(zip(columns, values))) for values in zip(*(df[c].tolist() for c in columns))]
+            return dict(zip(df[key_column].tolist(), rows))
+        except UnreadableDataError:
+            raise
+        except Exception as e:
+            raise UnreadableDataError(f"Error loading {file_path}: {e}") from e
+    else:
+        return default_dict
+
+
+# Function to write data to CSV. The file is replaced atomically (see
+# src/locks.py), so a reader never sees a half-written file; errors are
+# raised, and the old file is then left as it was.
+def write_data_to_csv(data_dict, file_path, schema=None):
+    # Convert dictionary to DataFrame
+    if data_dict:
+        # Create list of dictionaries for DataFrame
+        rows = []
+        for key, value in data_dict.items():
+            row = value.copy()
+            # Always write the primary key column, so the row can be keyed again on load
+            if schema and schema.key not in row:
+                row = {schema.key: key, **row}
+            # Handle document bytes (convert to string for CSV)
+            if 'doc' in row:
+                row['doc'] = str(row['doc'])
+            # Nested values (waybill details/tracking) and timestamps in canonical form
+            for column, cell in row.items():
+                if isinstance(cell, (Mapping, list)):
+                    row[column] = encode_nested(cell)
+                elif isinstance(cell, datetime.datetime):
+                    row[column] = cell.isoformat()
+            rows.append(row)
+
+        df = pd.DataFrame(rows)
+        # Whole-number columns with blanks would be written as floats (1.0)
+        for column, dtype in (schema.dtypes.items() if schema else ()):
+            if column in df.columns and _is_integer(column, dtype):
+                values = pd.to_numeric(df[column], errors="coerce")
+                if values.count() == df[column].count() and (values.dropna() % 1 == 0).all():
+                    df[column] = values.astype("Int64")
+        atomic_write(file_path, lambda path: df.to_csv(path, index=False))
+    elif schema:
+        # Keep an empty dataset as a header-only file instead of leaving stale rows behind
+        df = pd.DataFrame(columns=list(schema.dtypes))
+        atomic_write(file_path, lambda path: df.to_csv(path, index=False))
+
+
+# Function to save data to CSV, showing (not raising) errors
+def save_data_to_csv(data_dict, file_path, schema=None):
+    try:
+        write_data_to_csv(data_dict, file_path, schema)
+    except Exception as e:
+        st.error(f"Error saving to {file_path}: {e}")
+
+
+# Cheap fingerprint of a file (mtime + size), None when the file does not exist
+def file_signature(file_path):
+    try:
+        stat = os.stat(file_path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+# Returned by a storage backend's poll() when a dataset has to be loaded again
+RELOAD = "reload"
+
+
+# Raised when a write is based on an old version of a row (someone else
+# changed it first); re-read the row and try again
+class StaleRecordError(ValueError):
+    pass
+
+
+# Process-wide holder for the app's datasets.
+# Each dataset is loaded once and handed out as the same dict to every caller,
+# so all Streamlit sessions share one copy. Changes are written through a
+# storage backend (see src/backends.py); refresh() asks the backend what other
+# processes changed and applies just that.
+# Every row carries a version that put()/delete() check and bump, so a write
+# based on an old copy of a row is rejected with StaleRecordError instead of
+# overwriting a newer one. Writers of the same row queue on a per-key lock;
+# the backend decides what else a write has to wait for (see write_lock()).
+# A dataset whose file exists but cannot be read keeps its last good rows
+# (none at first) and refuses every write with UnreadableDataError, so the
+# file is never overwritten with a partial copy; it is read again on every
+# refresh() until it loads.
+class DataStore:
+    def __init__(self, backend):
+        self.backend = backend
+        self._key_locks = StripedLocks()
+        self._data = {name: {} for name in backend.datasets}
+        self._indexes = {name: {} for name in backend.datasets}
+        self._unreadable = {}  # dataset -> UnreadableDataError of its last load
+        for name in self._data:
+            self._reload(name)
+
+    # Rows are kept as the dataset's record type (see src/records.py)
+    def _as_record(self, name, row):
+        schema = SCHEMAS.get(name)
+        return schema.record_type.coerce(row) if schema else row
+
+    def _reload(self, name):
+        with self.backend.dataset_lock(name):
+            try:
+                loaded = self.backend.load(name)
+            except UnreadableDataError as e:
+                self._unreadable[name] = e
+                st.error(f"{e} ({name} cannot be changed until it loads)")
+                return
+            self._unreadable.pop(name, None)
+            loaded = {key: self._as_record(name, row) for key, row in loaded.items()}
+            # Update in place so references held elsewhere stay valid
+            current = self._data[name]
+            current.clear()
+            current.update(loaded)
+            for index in self._indexes[name].values():
+                index.rebuild(current)
+
+    # Register a secondary index (see src/indexes.py) that is kept up to date
+    # with every change to a dataset
+    def add_index(self, name, index_name, index):
+        with self.backend.dataset_lock(name):
+            index.rebuild(self._data[name])
+            self._indexes[name][index_name] = index
+        return index
+
+    def index(self, name, index_name):
+        return self._indexes[name][index_name]
+
+    def _index_put(self, name, key, row):
+        for index in self._indexes[name].values():
+            index.add(key, row)
+
+    def _index_delete(self, name, key):
+        for index in self._indexes[name].values():
+            index.remove(key)
+
+    # Whether a dataset loaded (and can be written)
+    def readable(self, name):
+        return name not in self._unreadable
+
+    def _check_readable(self, name):
+        error = self._unreadable.get(name)
+        if error is not None:
+            raise UnreadableDataError(f"{name} was not loaded, so it cannot be written: {error}")
+
+    # Pick up changes made to the backing storage by other processes
+    def refresh(self):
+        for name in self._data:
+            if name in self._unreadable:
+                self._reload(name)
+                continue
+            changes = self.backend.poll(name)
+            if changes is None:
+                continue
+            if changes == RELOAD:
+                self._reload(name)
+                continue
+            with self.backend.dataset_lock(name):
+                current = self._data[name]
+                for key, row in changes.items():
+                    if row is None:
+                        current.pop(key, None)
+                        self._index_delete(name, key)
+                    else:
+                        row = self._as_record(name, row)
+                        current[key] = row
+                        self._index_put(name, key, row)
+
+    # Shared dict for a dataset (mutate it through put()/delete(), or call save())
+    def get(self, name):
+        return self._data[name]
+
+    def _check_version(self, name, key, expected_version):
+        current = record_version(self._data[name].get(key))
+        if expected_version is not None and expected_version != current:
+            raise StaleRecordError(f"{name} {key} is at version {current}, not {expected_version}")
+        return current
+
+    # Insert or replace one row and persist the change. Plain dicts are stored
+    # as the dataset's record type. With expected_version (the version the
+    # change was based on; 0 for a new row) the write is rejected with
+    # StaleRecordError if the row has moved on, here or in another process.
+    def put(self, name, key, value, expected_version=None):
+        self._check_readable(name)
+        with self._key_locks.for_key(name, key):
+            current = self._check_version(name, key, expected_version)
+            schema = SCHEMAS.get(name)
+            value = self._as_record(name, value)
+            if schema and schema.key not in value:
+                value[schema.key] = key
+            if schema and VERSION_COLUMN in schema.dtypes:
+                value[VERSION_COLUMN] = current + 1
+            with self.backend.write_lock(name):
+                data = self._data[name]
+                data[key] = value
+                self._index_put(name, key, value)
+                self._persist(name, self.backend.put, data, key, value, expected_version=current)
+
+    # Remove one row (if present) and persist the change
+    def delete(self, name, key, expected_version=None):
+        self._check_readable(name)
+        with self._key_locks.for_key(name, key):
+            current = self._check_version(name, key, expected_version)
+            with self.backend.write_lock(name):
+                data = self._data[name]
+                data.pop(key, None)
+                self._index_delete(name, key)
+                self._persist(name, self.backend.delete, data, key, expected_version=current)
+
+    # Apply many changes at once: (dataset, key, value, expected_version)
+    # tuples, where a value of None deletes the row. Every expected version is
+    # checked before anything changes (StaleRecordError otherwise); then each
+    # dataset is persisted with one write (see StorageBackend.write_many()).
+    def write_many(self, changes):
+        changes = list(changes)
+        names = sorted({name for name, _, _, _ in changes})
+        for name in names:
+            self._check_readable(name)
+        with contextlib.ExitStack() as stack:
+            for lock in self._key_locks.for_keys((name, key) for name, key, _, _ in changes):
+                stack.enter_context(lock)
+            writes = {}
+            for name, key, value, expected_version in changes:
+                current = self._check_version(name, key, expected_version)
+                if value is not None:
+                    schema = SCHEMAS.get(name)
+                    value = self._as_record(name, value)
+                    if schema and schema.key not in value:
+                        value[schema.key] = key
+                    if schema and VERSION_COLUMN in schema.dtypes:
+                        value[VERSION_COLUMN] = current + 1
+                writes.setdefault(name, []).append((key, value, current))
+            for name in names:
+                stack.enter_context(self.backend.write_lock(name))
+            for name, rows in writes.items():
+                data = self._data[name]
+                for key, value, _ in rows:
+                    if value is None:
+                        data.pop(key, None)
+                        self._index_delete(name, key)
+                    else:
+                        data[key] = value
+                        self._index_put(name, key, value)
+            try:
+                self.backend.write_many({name: (self._data[name], rows) for name, rows in writes.items()})
+            except Exception:
+                for name in names:
+                    self._reload(name)
+                raise
+
+    def _persist(self, name, write, *args, **kwargs):
+        try:
+            write(name, *args, **kwargs)
+        except Exception:
+            # Another process changed the row first (or broke the file), or
+            # the write failed; our copy no longer matches what is stored
+            self._reload(name)
+            raise
+
+    # Persist a whole dataset after changing its dict directly
+    def save(self, name):
+        self._check_readable(name)
+        with self.backend.dataset_lock(name):
+            for index in self._indexes[name].values():
+                index.rebuild(self._data[name])
+            self.backend.save(name, self._data[name])
@@ -0,0 +1,193 @@
+import datetime
+import math
+import threading
+from collections.abc import Mapping
+
+import numpy as np
+import pandas as pd
+
+from src.rates import NoRouteError
+from src.stations import UnknownStationError
+
+# Tracking status that ends a shipment's transit
+DELIVERED = "Delivered"
+
+
+# Count, mean and variance of one lane's transit times in hours, updated one
+# delivery at a time (Welford's algorithm: no history kept, no drift)
+class LaneStats:
+    __slots__ = ("count", "mean", "_m2")
+
+    def __init__(self):
+        self.count = 0
+        self.mean = 0.0
+        self._m2 = 0.0
+
+    def add(self, hours):
+        self.count += 1
+        delta = hours - self.mean
+        self.mean += delta / self.count
+        self._m2 += delta * (hours - self.mean)
+
+    @property
+    def stdev(self):
+        return math.sqrt(self._m2 / (self.count - 1)) if self.count > 1 else 0.0
+
+
+def _departure_offset(train):
+    hours, minutes = train.departs.split(":")
+    return datetime.timedelta(hours=int(hours), minutes=int(minutes))
+
+
+# Arrival estimates from route distance, train schedule and transit history.
+# A shipment departs on its dispatch date at its train's departure time and
+# takes its lane's transit time. A lane (origin station, destination station)
+# with no deliveries yet takes the rail distance at `speed_kmh` plus
+# `handling_hours` at the terminals; as deliveries arrive, the lane's mean
+# observed transit time takes over (the distance-based figure counts as
+# `prior_weight` deliveries). Deliveries more than `outlier_factor` times
+# slower or faster than the distance-based figure (e.g. a shipment marked
+# delivered months late) are not learned from. Lane statistics are updated
+# incrementally with each delivery; predict() recomputes ETAs for many
+# shipments in one pass.
+class EtaEngine:
+    def __init__(self, network, trains, speed_kmh=40.0, handling_hours=8.0, prior_weight=3, outlier_factor=4.0):
+        self.network = network
+        self.speed_kmh = speed_kmh
+        self.handling_hours = handling_hours
+        self.prior_weight = prior_weight
+        self.outlier_factor = outlier_factor
+        # Booking option label -> departure time of day
+        self._departs = {train.label: _departure_offset(train) for train in trains}
+        self.lanes = {}  # (origin ID, destination ID) -> LaneStats
+        self._lock = threading.Lock()
+        # Bumped on every observed delivery, so callers can tell when to predict() again
+        self.version = 0
+        self._predicted_version = None
+
+    # (origin ID, destination ID) for station names or IDs; None if either is unknown
+    def lane(self, origin, destination):
+        try:
+            return self.network.station_id(origin), self.network.station_id(destination)
+        except UnknownStationError:
+            return None
+
+    # Scheduled departure of a shipment: its dispatch date at its train's
+    # departure time (midnight for an unknown train), else its booking time
+    def departure(self, shipment):
+        day = pd.to_datetime(shipment.get("dispatch_date"), errors="coerce")
+        if pd.isna(day):
+            booked = pd.to_datetime(shipment.get("booked_on"), errors="coerce")
+            return None if pd.isna(booked) else booked.to_pydatetime()
+        return (day + self._departs.get(shipment.get("option"), datetime.timedelta())).to_pydatetime()
+
+    # Distance-based transit time on a lane in hours (None without a route)
+    def baseline_hours(self, lane):
+        try:
+            return self.network.distance(*lane) / self.speed_kmh + self.handling_hours
+        except NoRouteError:
+            return None
+
+    # Expected transit time on a lane in hours (None when the lane has no
+    # route and no history)
+    def transit_hours(self, lane):
+        baseline = self.baseline_hours(lane)
+        stats = self.lanes.get(lane)
+        if stats is None or stats.count == 0:
+            return baseline
+        if baseline is None:
+            return stats.mean
+        return (stats.count * stats.mean + self.prior_weight * baseline) / (stats.count + self.prior_weight)
+
+    # (departure, ETA) of one shipment (origin, destination, option and
+    # dispatch_date); either may be None when it cannot be worked out
+    def estimate(self, shipment):
+        departure = self.departure(shipment)
+        lane = self.lane(shipment.get("origin"), shipment.get("destination"))
+        hours = self.transit_hours(lane) if lane else None
+        if departure is None or hours is None:
+            return departure, None
+        return departure, departure + datetime.timedelta(hours=hours)
+
+    # Learn from one delivery; returns its transit time in hours (None if it
+    # cannot be placed on a lane, is not after the departure or is an outlier)
+    def observe(self, shipment, delivered):
+        if not isinstance(shipment, Mapping):
+            return None
+        lane = self.lane(shipment.get("origin"), shipment.get("destination"))
+        departure = self.departure(shipment)
+        if lane is None or departure is None or not isinstance(delivered, datetime.datetime):
+            return None
+        try:
+            hours = (delivered - departure).total_seconds() / 3600
+        except TypeError:
+            # Time zone aware and naive times do not mix
+            return None
+        if hours <= 0:
+            return None
+        baseline = self.baseline_hours(lane)
+        if baseline is not None and not baseline / self.outlier_factor <= hours <= baseline * self.outlier_factor:
+            return None
+        with self._lock:
+            self.lanes.setdefault(lane, LaneStats()).add(hours)
+            self.version += 1
+        return hours
+
+    # Learn from the waybills already delivered on a TrackingTimeline, then
+    # from every delivery recorded on it from now on
+    def follow(self, timeline, waybills):
+        for ref in timeline.refs(DELIVERED):
+            waybill = waybills.get(ref)
+            delivered = [event.get("time") for event in timeline.timeline(ref) if event.get("status") == DELIVERED]
+            if waybill is not None and delivered:
+                self.observe(waybill.get("details"), delivered[-1])
+
+        def on_event(ref, event):
+            if event.status == DELIVERED:
+                waybill = waybills.get(ref)
+                if waybill is not None:
+                    self.observe(waybill.get("details"), event.time)
+
+        timeline.add_listener(on_event)
+
+    # Whether deliveries were observed since the last predict()
+    @property
+    def stale(self):
+        return self._predicted_version != self.version
+
+    # ETAs of many shipments at once. `shipments` is a DataFrame indexed by
+    # waybill ref with origin, destination, option and dispatch_date columns
+    # (and optionally booked_on). Transit times are worked out once per
+    # distinct lane and departure times once per distinct train; the ETAs are
+    # then computed column-wise. Returns a Series of ETAs (NaT where there is
+    # no route or no date).
+    def predict(self, shipments):
+        version = self.version
+        count = len(shipments)
+
+        # Transit hours per distinct (origin, destination) pair
+        origin_codes, origins = pd.factorize(shipments["origin"])
+        destination_codes, destinations = pd.factorize(shipments["destination"])
+        valid = (origin_codes >= 0) & (destination_codes >= 0)
+        pair_codes = np.where(valid, origin_codes * len(destinations) + destination_codes, -1)
+        pairs, pair_rows = np.unique(pair_codes, return_inverse=True)
+        pair_hours = np.full(len(pairs), np.nan)
+        for position, code in enumerate(pairs):
+            if code < 0:
+                continue
+            lane = self.lane(origins[code // len(destinations)], destinations[code % len(destinations)])
+            hours = self.transit_hours(lane) if lane else None
+            if hours is not None:
+                pair_hours[position] = hours
+        transit = pd.to_timedelta(pair_hours[pair_rows.reshape(count)] if count else [], unit="h")
+
+        # Departure: dispatch day plus the train's departure time, else the booking time
+        option_codes, options = pd.factorize(shipments["option"])
+        offsets = np.array([self._departs.get(option, datetime.timedelta()).total_seconds() for option in options] + [0.0])
+        days = pd.to_datetime(shipments["dispatch_date"].astype(object), errors="coerce")
+        departures = days + pd.to_timedelta(offsets[option_codes], unit="s")
+        if "booked_on" in shipments.columns:
+            departures = departures.fillna(pd.to_datetime(shipments["booked_on"], errors="coerce"))
+
+        self._predicted_version = version
+        return pd.Series(departures.to_numpy() + transit.to_numpy(), index=shipments.index)
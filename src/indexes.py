@@ -0,0 +1,71 @@
+import bisect
+import threading
+
+
+def _sort_value(value):
+    # Missing values (None/NaN) sort first instead of breaking comparisons
+    return value if isinstance(value, str) else ""
+
+
+# Secondary index over a dataset: rows grouped by one field (e.g. the owner's
+# username) and kept sorted by another (e.g. booked_on) inside each group.
+# DataStore keeps it current on every put/delete/reload, so reading one page of
+# a group costs O(page size) instead of a scan over every row.
+class SortedGroupIndex:
+    def __init__(self, group_field, sort_field):
+        self.group_field = group_field
+        self.sort_field = sort_field
+        self._groups = {}   # group value -> sorted list of (sort value, key)
+        self._entries = {}  # key -> (group value, (sort value, key))
+        self._lock = threading.Lock()
+
+    def rebuild(self, data):
+        groups = {}
+        entries = {}
+        for key, row in data.items():
+            group = row.get(self.group_field)
+            entry = (_sort_value(row.get(self.sort_field)), key)
+            groups.setdefault(group, []).append(entry)
+            entries[key] = (group, entry)
+        for group_entries in groups.values():
+            group_entries.sort()
+        with self._lock:
+            self._groups = groups
+            self._entries = entries
+
+    def add(self, key, row):
+        with self._lock:
+            self._remove(key)
+            group = row.get(self.group_field)
+            entry = (_sort_value(row.get(self.sort_field)), key)
+            bisect.insort(self._groups.setdefault(group, []), entry)
+            self._entries[key] = (group, entry)
+
+    def remove(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def _remove(self, key):
+        old = self._entries.pop(key, None)
+        if old is None:
+            return
+        group, entry = old
+        group_entries = self._groups[group]
+        del group_entries[bisect.bisect_left(group_entries, entry)]
+        if not group_entries:
+            del self._groups[group]
+
+    # Number of rows in a group
+    def count(self, group):
+        return len(self._groups.get(group, ()))
+
+    # Keys of one page of a group (page numbers start at 0)
+    def page(self, group, page, per_page, newest_first=True):
+        with self._lock:
+            group_entries = self._groups.get(group, [])
+            if newest_first:
+                end = len(group_entries) - page * per_page
+                selected = group_entries[max(0, end - per_page):max(0, end)][::-1]
+            else:
+                selected = group_entries[page * per_page:(page + 1) * per_page]
+        return [key for _, key in selected]
@@ -0,0 +1,289 @@
+import argparse
+import csv
+import datetime
+import itertools
+import json
+import os
+import queue
+import selectors
+import signal
+import socket
+import threading
+import time
+from dataclasses import dataclass
+
+from src.backends import SQLITE_TABLES, CsvBackend, SqliteBackend
+from src.data_store import DataStore
+from src.serialization import dumps_row
+from src.tracking import EventLog, TrackingTimeline
+
+
+# Raised for an input record that is not a usable tracking event
+class InvalidEventError(ValueError):
+    pass
+
+
+def _parse_time(value, field):
+    if value is None or value == "":
+        return None
+    if isinstance(value, datetime.datetime):
+        return value
+    try:
+        return datetime.datetime.fromisoformat(str(value))
+    except ValueError:
+        raise InvalidEventError(f"bad {field}: {value!r}") from None
+
+
+# Turn one input record into a tracking event. Records are JSON text (JSONL
+# files, socket lines) or dicts (CSV rows) with the fields
+#     ref (or waybill_ref), status, time (ISO-8601; default: when received),
+#     eta (ISO-8601, optional), location (free text, optional)
+def parse_event(record, received=None):
+    if isinstance(record, str):
+        try:
+            record = json.loads(record)
+        except json.JSONDecodeError as e:
+            raise InvalidEventError(f"not JSON: {e}") from None
+    if not isinstance(record, dict):
+        raise InvalidEventError("not a JSON object")
+    ref = record.get("ref") or record.get("waybill_ref")
+    status = record.get("status")
+    if not ref or not status:
+        raise InvalidEventError("ref and status are required")
+    event = {
+        "ref": str(ref),
+        "status": str(status),
+        "time": _parse_time(record.get("time"), "time") or received or datetime.datetime.now(),
+    }
+    eta = _parse_time(record.get("eta"), "eta")
+    if eta is not None:
+        event["eta"] = eta
+    if record.get("location"):
+        event["location"] = str(record["location"])
+    return event
+
+
+# Lines of a JSONL file, one event each
+def read_jsonl(file_path):
+    with open(file_path, "r", encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                yield line
+
+
+# Rows of a CSV file with ref, status, time, eta and location columns
+def read_csv(file_path):
+    with open(file_path, "r", encoding="utf-8", newline="") as file:
+        yield from csv.DictReader(file)
+
+
+# Lines (one JSON event each) sent by feeders connected to a local TCP
+# socket, until `stop` is set. Several feeders can be connected at once.
+# While the consumer is not taking lines, nothing is read from the sockets,
+# so a slow consumer pushes back on the feeders through TCP flow control.
+# `on_listen` gets the bound address (useful with port 0).
+def read_socket(host, port, stop, on_listen=None):
+    selector = selectors.DefaultSelector()
+    buffers = {}
+    with socket.create_server((host, port)) as server:
+        server.setblocking(False)
+        selector.register(server, selectors.EVENT_READ)
+        if on_listen is not None:
+            on_listen(server.getsockname())
+        try:
+            while not stop.is_set():
+                for key, _ in selector.select(timeout=0.2):
+                    connection = key.fileobj
+                    if connection is server:
+                        connection, _ = server.accept()
+                        connection.setblocking(False)
+                        selector.register(connection, selectors.EVENT_READ)
+                        buffers[connection] = b""
+                        continue
+                    data = connection.recv(65536)
+                    if not data:
+                        # Feeder closed the connection; a last line may lack its newline
+                        selector.unregister(connection)
+                        connection.close()
+                        lines = [buffers.pop(connection)]
+                    else:
+                        lines = (buffers[connection] + data).split(b"\n")
+                        buffers[connection] = lines.pop()
+                    for line in lines:
+                        if line.strip():
+                            yield line.decode("utf-8", errors="replace")
+        finally:
+            for connection in buffers:
+                connection.close()
+            selector.close()
+
+
+# Counters of one ingestion run
+@dataclass
+class IngestStats:
+    received: int = 0
+    applied: int = 0
+    dead_letters: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+    # Back-pressure: how often and how long the reader waited for room in
+    # the queue, and the longest the queue got
+    backpressure_waits: int = 0
+    backpressure_seconds: float = 0.0
+    peak_queue: int = 0
+
+    @property
+    def events_per_second(self):
+        return self.applied / self.seconds if self.seconds else 0.0
+
+    def summary(self):
+        return (
+            f"{self.applied} applied, {self.dead_letters} dead-lettered of {self.received} received "
+            f"in {self.batches} batch(es), {self.events_per_second:,.0f} events/s; "
+            f"back-pressure: {self.backpressure_waits} wait(s), {self.backpressure_seconds:.2f}s, "
+            f"peak queue {self.peak_queue}"
+        )
+
+
+# Streams tracking events from a source (any iterable of records, see
+# read_jsonl/read_csv/read_socket) into a TrackingTimeline.
+# A reader thread feeds a bounded queue; the caller's thread takes up to
+# `batch_size` records (or whatever arrived within `flush_interval` seconds),
+# parses them and records the batch with one event log write. Records that
+# cannot be parsed or name an unknown waybill go to the dead-letter file
+# (one JSON line each, with the reason), also written once per batch.
+# `refresh` (e.g. DataStore.refresh) is called before a batch that names
+# waybills the timeline does not know yet, to pick up new bookings.
+class EventIngestor:
+    def __init__(self, timeline, dead_letter_path=None, batch_size=500, flush_interval=0.5,
+                 queue_size=10000, refresh=None):
+        self.timeline = timeline
+        self.dead_letter_path = dead_letter_path
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.queue_size = queue_size
+        self.refresh = refresh
+
+    # Ingest everything the source yields; `report` gets the stats every
+    # `report_every` seconds while running. Returns the final stats.
+    def run(self, source, report=None, report_every=5.0):
+        stats = IngestStats()
+        started = time.monotonic()
+        records = queue.Queue(maxsize=self.queue_size)
+        done = object()
+        errors = []
+
+        def feed():
+            try:
+                for record in source:
+                    try:
+                        records.put_nowait(record)
+                    except queue.Full:
+                        stats.backpressure_waits += 1
+                        waited = time.monotonic()
+                        records.put(record)
+                        stats.backpressure_seconds += time.monotonic() - waited
+            except Exception as e:
+                errors.append(e)
+            finally:
+                records.put(done)
+
+        reader = threading.Thread(target=feed, daemon=True)
+        reader.start()
+        batch = []
+        finished = False
+        deadline = time.monotonic() + self.flush_interval
+        last_report = started
+        while not finished:
+            try:
+                record = records.get(timeout=max(0.0, deadline - time.monotonic()))
+            except queue.Empty:
+                record = None
+            if record is done:
+                finished = True
+            elif record is not None:
+                batch.append(record)
+                stats.received += 1
+                stats.peak_queue = max(stats.peak_queue, records.qsize())
+            now = time.monotonic()
+            if finished or len(batch) >= self.batch_size or now >= deadline:
+                if batch:
+                    self._flush(batch, stats)
+                    batch = []
+                deadline = now + self.flush_interval
+                stats.seconds = time.monotonic() - started
+                if report is not None and now - last_report >= report_every:
+                    report(stats)
+                    last_report = now
+        reader.join()
+        stats.seconds = time.monotonic() - started
+        if errors:
+            raise errors[0]
+        return stats
+
+    def _flush(self, batch, stats):
+        received = datetime.datetime.now()
+        events = []
+        dead = []
+        for record in batch:
+            try:
+                events.append(parse_event(record, received))
+            except InvalidEventError as e:
+                dead.append((record, str(e)))
+        if self.refresh is not None and any(event["ref"] not in self.timeline for event in events):
+            self.refresh()
+        rejected = self.timeline.record_many(events)
+        dead.extend(rejected)
+        stats.applied += len(events) - len(rejected)
+        stats.dead_letters += len(dead)
+        stats.batches += 1
+        self._dead_letter(dead, received)
+
+    def _dead_letter(self, dead, received):
+        if not dead or self.dead_letter_path is None:
+            return
+        lines = "".join(
+            dumps_row({"record": record, "error": reason, "received": received}) + "\n" for record, reason in dead
+        )
+        with open(self.dead_letter_path, "a", encoding="utf-8") as file:
+            file.write(lines)
+
+
+# Command line entry point, e.g.
+#     python -m src.ingest yard_scans.csv gps.jsonl
+#     python -m src.ingest --socket 9300      (until Ctrl+C)
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Apply tracking events from yard and GPS feeds to waybills.")
+    parser.add_argument("files", nargs="*", help="JSONL or CSV event file(s)")
+    parser.add_argument("--socket", type=int, metavar="PORT", help="also listen for JSONL events on 127.0.0.1:PORT")
+    parser.add_argument("--waybills", default=os.path.join("data", "waybills.csv"), help="waybills CSV file")
+    parser.add_argument("--sqlite", metavar="DB", help="read waybills from this SQLite database instead")
+    parser.add_argument("--events", default=os.path.join("data", "tracking_events.jsonl"), help="tracking event log")
+    parser.add_argument("--dead-letter", default=os.path.join("data", "tracking_dead_letter.jsonl"))
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--flush-interval", type=float, default=0.5, help="seconds")
+    args = parser.parse_args(argv)
+    if not args.files and args.socket is None:
+        parser.error("give event files and/or --socket")
+
+    if args.sqlite:
+        backend = SqliteBackend(args.sqlite, tables={"waybills": SQLITE_TABLES["waybills"]})
+    else:
+        backend = CsvBackend({"waybills": args.waybills})
+    store = DataStore(backend)
+    timeline = store.add_index("waybills", "tracking", TrackingTimeline(EventLog(args.events)))
+
+    sources = [read_csv(path) if path.lower().endswith(".csv") else read_jsonl(path) for path in args.files]
+    if args.socket is not None:
+        stop = threading.Event()
+        signal.signal(signal.SIGINT, lambda *_: stop.set())
+        sources.append(read_socket("127.0.0.1", args.socket, stop, on_listen=lambda address: print(f"listening on {address[0]}:{address[1]}")))
+    ingestor = EventIngestor(
+        timeline, args.dead_letter, batch_size=args.batch_size, flush_interval=args.flush_interval, refresh=store.refresh,
+    )
+    stats = ingestor.run(itertools.chain(*sources), report=lambda stats: print(stats.summary()))
+    print(stats.summary())
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,174 @@
+import datetime
+import math
+import os
+import threading
+from dataclasses import dataclass
+
+import pandas as pd
+
+
+# Raised when a train has too little capacity left on a day for a booking
+class CapacityError(ValueError):
+    pass
+
+
+# One scheduled train: how many wagons of which class it runs every day
+@dataclass(frozen=True)
+class TrainService:
+    train_id: str
+    name: str
+    wagon_class: str
+    wagons: int
+    tons_per_wagon: float
+    departs: str
+
+    # Option text shown at booking and stored on shipments, e.g.
+    # "Train A (Covered Hopper x25, departs 09:00)"
+    @property
+    def label(self):
+        return f"{self.name} ({self.wagon_class} x{self.wagons}, departs {self.departs})"
+
+    @property
+    def capacity_tons(self):
+        return self.wagons * self.tons_per_wagon
+
+    def wagons_for(self, tons):
+        return max(1, math.ceil(tons / self.tons_per_wagon))
+
+    # When the train leaves on a day (a date or "YYYY-MM-DD")
+    def departure_on(self, day):
+        hours, minutes = self.departs.split(":")
+        return datetime.datetime.combine(pd.Timestamp(day).date(), datetime.time(int(hours), int(minutes)))
+
+
+# Wagons and tons left on every train, per departure day.
+# Counters live in a dict keyed by (train ID, day) and are created on first
+# use from the train's capacity, so a capacity check is O(1). Updates take
+# one of `stripes` locks chosen by the train-day, so bookings on different
+# trains or days do not wait for each other.
+# The inventory is also a DataStore index on shipments (rebuild/add/remove):
+# it learns about bookings made elsewhere (other processes, reloads) from the
+# shipment rows, and a booking reserved here under its waybill reference is
+# not counted twice when its shipment row is stored.
+class CapacityInventory:
+    def __init__(self, trains, stripes=64):
+        self.trains = {train.train_id: train for train in trains}
+        self._ids_by_label = {train.label: train.train_id for train in self.trains.values()}
+        self._locks = [threading.Lock() for _ in range(stripes)]
+        self._counters = {}  # (train ID, day) -> [wagons left, tons left]
+        self._bookings = {}  # shipment key -> (train ID, day, wagons, tons)
+
+    def _lock(self, train_day):
+        return self._locks[hash(train_day) % len(self._locks)]
+
+    def _counter(self, train_day):
+        counter = self._counters.get(train_day)
+        if counter is None:
+            train = self.trains[train_day[0]]
+            counter = self._counters.setdefault(train_day, [train.wagons, train.capacity_tons])
+        return counter
+
+    def train_for_option(self, option):
+        return self._ids_by_label.get(option)
+
+    # (wagons left, tons left) on a train for a day (a date or "YYYY-MM-DD")
+    def remaining(self, train_id, day):
+        wagons, tons = self._counter((train_id, str(day)))
+        return wagons, tons
+
+    # Atomically take the wagons for `tons` on a train-day, recorded under the
+    # shipment key. Raises CapacityError (and changes nothing) when they do not fit.
+    def reserve(self, train_id, day, tons, key):
+        train = self.trains.get(train_id)
+        if train is None:
+            raise CapacityError(f"unknown train: {train_id}")
+        train_day = (train_id, str(day))
+        wagons = train.wagons_for(tons)
+        with self._lock(train_day):
+            counter = self._counter(train_day)
+            if counter[0] < wagons or counter[1] < tons:
+                raise CapacityError(
+                    f"{train.name} on {day} has {counter[0]} wagon(s) / {counter[1]:,.0f} t left, "
+                    f"{wagons} wagon(s) / {tons:,.0f} t needed"
+                )
+            counter[0] -= wagons
+            counter[1] -= tons
+            self._bookings[key] = (train_id, train_day[1], wagons, tons)
+
+    # Give back the capacity held by a shipment key (no-op if it holds none)
+    def release(self, key):
+        booking = self._bookings.get(key)
+        if booking is None:
+            return
+        train_id, day, wagons, tons = booking
+        with self._lock((train_id, day)):
+            if self._bookings.get(key) is booking:
+                del self._bookings[key]
+                counter = self._counter((train_id, day))
+                counter[0] += wagons
+                counter[1] += tons
+
+    def _booking_for(self, row):
+        train_id = self.train_for_option(row.get("option"))
+        tons = pd.to_numeric(row.get("qty"), errors="coerce")
+        if train_id is None or not isinstance(row.get("dispatch_date"), str) or pd.isna(tons):
+            return None
+        return train_id, row["dispatch_date"], self.trains[train_id].wagons_for(tons), float(tons)
+
+    # DataStore index interface
+
+    def rebuild(self, data):
+        counters = {}
+        bookings = {}
+        for key, row in data.items():
+            booking = self._booking_for(row)
+            if booking is None:
+                continue
+            train_id, day, wagons, tons = booking
+            train = self.trains[train_id]
+            counter = counters.setdefault((train_id, day), [train.wagons, train.capacity_tons])
+            counter[0] -= wagons
+            counter[1] -= tons
+            bookings[key] = booking
+        for lock in self._locks:
+            lock.acquire()
+        try:
+            self._counters = counters
+            self._bookings = bookings
+        finally:
+            for lock in self._locks:
+                lock.release()
+
+    def add(self, key, row):
+        booking = self._booking_for(row)
+        current = self._bookings.get(key)
+        if current is not None and booking is not None and current[:2] == booking[:2] and current[3] == booking[3]:
+            return
+        self.release(key)
+        if booking is None:
+            return
+        train_id, day, wagons, tons = booking
+        # Already booked (elsewhere): count it even if the train is now overbooked
+        with self._lock((train_id, day)):
+            counter = self._counter((train_id, day))
+            counter[0] -= wagons
+            counter[1] -= tons
+            self._bookings[key] = booking
+
+    def remove(self, key):
+        self.release(key)
+
+
+# Read the train services from a CSV file (train_id, name, wagon_class,
+# wagons, tons_per_wagon, departs); no trains when the file does not exist
+def load_trains(file_path):
+    if not os.path.exists(file_path):
+        return []
+    df = pd.read_csv(file_path, dtype={"train_id": "object", "name": "object", "wagon_class": "object", "departs": "object"})
+    return [
+        TrainService(train_id, name, wagon_class, int(wagons), float(tons_per_wagon), departs)
+        for train_id, name, wagon_class, wagons, tons_per_wagon, departs in zip(
+            df["train_id"].tolist(), df["name"].tolist(), df["wagon_class"].tolist(),
+            df["wagons"].tolist(), df["tons_per_wagon"].tolist(), df["departs"].tolist(),
+        )
+    ]
@@ -0,0 +1,101 @@
+import json
+import os
+import shutil
+import threading
+import time
+
+from src.serialization import dumps_row, loads_row
+
+
+# Apply one journal record to a dataset dict
+def apply_record(data, record):
+    if record["op"] == "put":
+        data[record["key"]] = record["value"]
+    elif record["op"] == "delete":
+        data.pop(record["key"], None)
+
+
+# Read the records of a journal file, stopping at a torn (half-written) last line
+def read_records(file_path):
+    if not os.path.exists(file_path):
+        return
+    with open(file_path, "r", encoding="utf-8") as file:
+        for line in file:
+            if not line.endswith("\n"):
+                break
+            try:
+                yield loads_row(line)
+            except json.JSONDecodeError:
+                break
+
+
+# Append-only log of changes to one dataset.
+# Each put/delete is written as one JSON line. Lines reach the OS immediately
+# but are only fsync'ed every `sync_every` records or `sync_interval` seconds,
+# so a burst of changes shares one disk sync.
+class Journal:
+    def __init__(self, file_path, sync_every=64, sync_interval=1.0):
+        self.file_path = file_path
+        self.sync_every = sync_every
+        self.sync_interval = sync_interval
+        self._lock = threading.Lock()
+        self._file = open(file_path, "a", encoding="utf-8")
+        self._pending = 0
+        self._last_sync = time.monotonic()
+        self.records = sum(1 for _ in read_records(file_path))
+        self.size = self._file.tell()
+
+    def append(self, op, key, value=None):
+        record = {"op": op, "key": key}
+        if op == "put":
+            record["value"] = value
+        line = dumps_row(record) + "\n"
+        with self._lock:
+            self._file.write(line)
+            self._file.flush()
+            self.size = self._file.tell()
+            self.records += 1
+            self._pending += 1
+            if self._pending >= self.sync_every or time.monotonic() - self._last_sync >= self.sync_interval:
+                self._sync()
+
+    # fsync whatever has been appended since the last sync
+    def sync(self):
+        with self._lock:
+            if self._pending:
+                self._sync()
+
+    def _sync(self):
+        os.fsync(self._file.fileno())
+        self._pending = 0
+        self._last_sync = time.monotonic()
+
+    # True when someone else appended to (or replaced) the journal file
+    def changed_externally(self):
+        try:
+            return os.path.getsize(self.file_path) != self.size
+        except OSError:
+            return True
+
+    # Move the current journal aside (for compaction) and start a fresh one.
+    # If an earlier rotated journal is still there (its compaction failed),
+    # the current records are appended to it so replay order is kept.
+    def rotate(self, rotated_path):
+        with self._lock:
+            self._sync()
+            self._file.close()
+            if os.path.exists(rotated_path):
+                with open(self.file_path, "rb") as src, open(rotated_path, "ab") as dst:
+                    shutil.copyfileobj(src, dst)
+                os.remove(self.file_path)
+            else:
+                os.replace(self.file_path, rotated_path)
+            self._file = open(self.file_path, "a", encoding="utf-8")
+            self.records = 0
+            self.size = 0
+
+    def close(self):
+        with self._lock:
+            if self._pending:
+                self._sync()
+            self._file.close()
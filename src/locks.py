@@ -0,0 +1,91 @@
+import os
+import threading
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+    import msvcrt
+
+
+# Exclusive lock shared between processes, held on a small lock file next to
+# the data file (flock on Unix, msvcrt.locking on Windows). Threads of one
+# process queue on an in-process lock first, since OS file locks do not
+# separate threads that share a file descriptor.
+class FileLock:
+    def __init__(self, lock_path):
+        self.lock_path = lock_path
+        self._thread_lock = threading.Lock()
+        self._file = None
+
+    def acquire(self):
+        self._thread_lock.acquire()
+        try:
+            self._file = open(self.lock_path, "a+b")
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+            else:
+                self._file.seek(0)
+                # LK_LOCK retries for about 10 seconds; keep waiting after that
+                while True:
+                    try:
+                        msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                        break
+                    except OSError:
+                        continue
+        except BaseException:
+            if self._file is not None:
+                self._file.close()
+                self._file = None
+            self._thread_lock.release()
+            raise
+
+    def release(self):
+        try:
+            if fcntl is not None:
+                fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+            else:
+                self._file.seek(0)
+                msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+        finally:
+            self._file.close()
+            self._file = None
+            self._thread_lock.release()
+
+    def __enter__(self):
+        self.acquire()
+        return self
+
+    def __exit__(self, *exc_info):
+        self.release()
+
+
+# A fixed set of locks shared out by key, so work on different keys rarely
+# waits on the same lock while work on one key is always serialized
+class StripedLocks:
+    def __init__(self, stripes=64):
+        self._locks = [threading.Lock() for _ in range(stripes)]
+
+    def for_key(self, *key):
+        return self._locks[hash(key) % len(self._locks)]
+
+    # The distinct locks for several keys (tuples), always in the same order,
+    # so threads taking them one after the other cannot deadlock
+    def for_keys(self, keys):
+        stripes = sorted({hash(key) % len(self._locks) for key in keys})
+        return [self._locks[stripe] for stripe in stripes]
+
+
+# Replace a file in one step: write to a temporary file next to it, fsync,
+# then os.replace(), so readers see either the old or the new content and a
+# crash never leaves a half-written file behind. `write` gets the temp path.
+def atomic_write(file_path, write):
+    tmp_path = f"{file_path}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        write(tmp_path)
+        with open(tmp_path, "rb") as file:
+            os.fsync(file.fileno())
+        os.replace(tmp_path, file_path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
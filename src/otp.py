@@ -0,0 +1,173 @@
+import datetime
+import hmac
+import queue
+import secrets
+import sys
+import threading
+import time
+from collections import OrderedDict
+
+
+# Raised when a contact asks for one-time passwords faster than allowed
+class OtpRateLimitError(ValueError):
+    def __init__(self, contact, retry_after):
+        super().__init__(f"too many codes requested for {contact}; try again in {retry_after:.0f}s")
+        self.retry_after = retry_after
+
+
+# Raised when the sender cannot take another code (its queue is full)
+class OtpDeliveryError(ValueError):
+    pass
+
+
+# Writes each code to a stream (the console by default), for local runs
+class ConsoleDelivery:
+    def __init__(self, stream=None):
+        self.stream = stream
+
+    def __call__(self, contact, code):
+        print(f"OTP for {contact}: {code}", file=self.stream or sys.stdout, flush=True)
+
+
+# Appends each code to a text file ("<time>\t<contact>\t<code>"), for tests
+# and demos without a mail or SMS gateway
+class FileDelivery:
+    def __init__(self, file_path):
+        self.file_path = file_path
+
+    def __call__(self, contact, code):
+        with open(self.file_path, "a", encoding="utf-8") as file:
+            file.write(f"{datetime.datetime.now().isoformat()}\t{contact}\t{code}\n")
+
+
+# Delivers codes on a background thread, so the caller never waits for a
+# mail or SMS gateway. `deliver(contact, code)` is the actual channel (see
+# ConsoleDelivery/FileDelivery). At most `queue_size` codes wait to be sent;
+# send() raises OtpDeliveryError beyond that. Failed deliveries are counted
+# and the last error kept.
+class AsyncSender:
+    def __init__(self, deliver, queue_size=1000):
+        self.deliver = deliver
+        self.sent = 0
+        self.failed = 0
+        self.last_error = None
+        self._queue = queue.Queue(maxsize=queue_size)
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+
+    def send(self, contact, code):
+        try:
+            self._queue.put_nowait((contact, code))
+        except queue.Full:
+            raise OtpDeliveryError("too many codes waiting to be sent; try again shortly") from None
+
+    def _run(self):
+        while True:
+            contact, code = self._queue.get()
+            try:
+                self.deliver(contact, code)
+                self.sent += 1
+            except Exception as e:
+                self.failed += 1
+                self.last_error = e
+            finally:
+                self._queue.task_done()
+
+    # Wait until every queued code has been handed to the channel
+    def flush(self):
+        self._queue.join()
+
+
+# Refill state of one contact's token bucket
+class _Bucket:
+    __slots__ = ("tokens", "updated")
+
+    def __init__(self, tokens, updated):
+        self.tokens = tokens
+        self.updated = updated
+
+
+# One-time passwords for verifying contacts (email or phone), shared by all
+# sessions of a process.
+# issue() creates a `digits`-digit code valid for `ttl` seconds (replacing
+# any earlier code of the contact) and hands it to the sender. Each contact
+# has a token bucket of `burst` codes that refills one code every
+# `refill_seconds`; asking for more raises OtpRateLimitError.
+# verify() compares in constant time and allows `max_attempts` guesses per
+# code; a code works once. Expired codes and idle buckets are evicted as
+# the service is used, so memory stays proportional to recent requests.
+class OtpService:
+    def __init__(self, sender, ttl=300, digits=6, max_attempts=5, burst=3, refill_seconds=60):
+        self.sender = sender
+        self.ttl = ttl
+        self.digits = digits
+        self.max_attempts = max_attempts
+        self.burst = burst
+        self.refill_seconds = refill_seconds
+        self._codes = OrderedDict()    # contact -> (code, expiry, attempts left), oldest first
+        self._buckets = OrderedDict()  # contact -> _Bucket, least recently used first
+        self._lock = threading.Lock()
+
+    def _evict(self, now):
+        while self._codes:
+            contact, (_, expiry, _) = next(iter(self._codes.items()))
+            if expiry > now:
+                break
+            del self._codes[contact]
+        idle = self.burst * self.refill_seconds
+        while self._buckets:
+            contact, bucket = next(iter(self._buckets.items()))
+            if now - bucket.updated < idle:
+                break
+            del self._buckets[contact]
+
+    def _take_token(self, contact, now):
+        bucket = self._buckets.pop(contact, None) or _Bucket(self.burst, now)
+        bucket.tokens = min(self.burst, bucket.tokens + (now - bucket.updated) / self.refill_seconds)
+        bucket.updated = now
+        self._buckets[contact] = bucket
+        if bucket.tokens < 1:
+            raise OtpRateLimitError(contact, (1 - bucket.tokens) * self.refill_seconds)
+        bucket.tokens -= 1
+
+    # Issue a code for a contact and queue it for delivery; returns the code
+    def issue(self, contact):
+        contact = _normalize(contact)
+        now = time.monotonic()
+        code = str(secrets.randbelow(10 ** self.digits)).zfill(self.digits)
+        with self._lock:
+            self._evict(now)
+            self._take_token(contact, now)
+            self._codes.pop(contact, None)
+            self._codes[contact] = (code, now + self.ttl, self.max_attempts)
+        try:
+            self.sender.send(contact, code)
+        except OtpDeliveryError:
+            with self._lock:
+                if self._codes.get(contact, (None,))[0] == code:
+                    del self._codes[contact]
+            raise
+        return code
+
+    # Whether `code` is the contact's current code (which is then used up)
+    def verify(self, contact, code):
+        contact = _normalize(contact)
+        now = time.monotonic()
+        with self._lock:
+            self._evict(now)
+            entry = self._codes.get(contact)
+            if entry is None:
+                return False
+            expected, expiry, attempts = entry
+            if hmac.compare_digest(expected.encode("utf-8"), str(code or "").strip().encode("utf-8")):
+                del self._codes[contact]
+                return True
+            if attempts <= 1:
+                del self._codes[contact]
+            else:
+                self._codes[contact] = (expected, expiry, attempts - 1)
+            return False
+
+
+def _normalize(contact):
+    return str(contact).strip().lower()
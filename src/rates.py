@@ -0,0 +1,233 @@
+import heapq
+import os
+import threading
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+from src.stations import StationCatalogue, UnknownStationError
+
+# Rate table entry that matches any goods type or wagon class
+ANY = "*"
+
+
+# Raised when two stations are not connected by track
+class NoRouteError(ValueError):
+    pass
+
+
+# Raised when the rate table has no rate for a goods type / wagon class
+class NoRateError(ValueError):
+    pass
+
+
+# Stations and track segments of the rail network (an undirected graph with
+# km weights). Shortest distances are computed with Dijkstra once per origin
+# and cached, so after the first quote from an origin every distance from it
+# is a dict lookup. precompute() fills the cache for all origins up front.
+# Station names are resolved through a StationCatalogue (src/stations.py).
+class RailNetwork:
+    def __init__(self, stations, segments):
+        # stations: station ID -> name; segments: iterable of (from ID, to ID, km)
+        self.stations = dict(stations)
+        self.catalogue = StationCatalogue(self.stations)
+        self._adjacency = {station_id: [] for station_id in self.stations}
+        for start, end, km in segments:
+            for station_id in (start, end):
+                if station_id not in self._adjacency:
+                    raise UnknownStationError(f"segment {start}-{end} refers to unknown station {station_id}")
+            self._adjacency[start].append((end, float(km)))
+            self._adjacency[end].append((start, float(km)))
+        self._distances = {}  # origin ID -> {station ID: km}
+        self._lock = threading.Lock()
+        # Position of each station in distance_row() arrays
+        self.station_ids = list(self.stations)
+        self.station_index = {station_id: position for position, station_id in enumerate(self.station_ids)}
+
+    # Station ID for a station ID or name ("Quebec, QC", "quebec qc", "QUE")
+    def station_id(self, station):
+        return self.catalogue.resolve(station)
+
+    def _shortest_from(self, origin):
+        distances = {origin: 0.0}
+        heap = [(0.0, origin)]
+        while heap:
+            km, station_id = heapq.heappop(heap)
+            if km > distances[station_id]:
+                continue
+            for neighbour, length in self._adjacency[station_id]:
+                candidate = km + length
+                if candidate < distances.get(neighbour, float("inf")):
+                    distances[neighbour] = candidate
+                    heapq.heappush(heap, (candidate, neighbour))
+        return distances
+
+    # Shortest distance in km between two stations (IDs or names)
+    def distance(self, origin, destination):
+        origin_id = self.station_id(origin)
+        destination_id = self.station_id(destination)
+        distances = self._distances.get(origin_id)
+        if distances is None:
+            with self._lock:
+                distances = self._distances.get(origin_id)
+                if distances is None:
+                    distances = self._shortest_from(origin_id)
+                    self._distances[origin_id] = distances
+        try:
+            return distances[destination_id]
+        except KeyError:
+            raise NoRouteError(f"no rail route from {origin} to {destination}") from None
+
+    # Distances from one station to every station, as an array ordered like
+    # station_index (inf where there is no route)
+    def distance_row(self, origin):
+        origin_id = self.station_id(origin)
+        self.distance(origin_id, origin_id)
+        row = np.full(len(self.station_index), np.inf)
+        for station_id, km in self._distances[origin_id].items():
+            row[self.station_index[station_id]] = km
+        return row
+
+    def precompute(self):
+        for station_id in self.stations:
+            self.distance(station_id, station_id)
+
+
+# Freight rates in $ per ton-km by goods type and wagon class. "*" in either
+# column is a fallback for goods types / wagon classes without their own rate.
+class RateTable:
+    def __init__(self, rates):
+        # rates: {(goods type, wagon class): rate per ton-km}
+        self.rates = dict(rates)
+
+    def rate(self, goods_type, wagon_class):
+        for key in ((goods_type, wagon_class), (goods_type, ANY), (ANY, wagon_class), (ANY, ANY)):
+            if key in self.rates:
+                return self.rates[key]
+        raise NoRateError(f"no rate for {goods_type} in {wagon_class}")
+
+
+@dataclass(frozen=True)
+class Quote:
+    origin_id: str
+    destination_id: str
+    dist_km: float
+    rate_per_ton_km: float
+    charge: float
+
+
+# Prices shipments: charge = qty * dist_km * rate_per_ton_km
+class RateEngine:
+    def __init__(self, network, rates):
+        self.network = network
+        self.rates = rates
+
+    def quote(self, origin, destination, goods_type, qty, wagon_class=ANY):
+        origin_id = self.network.station_id(origin)
+        destination_id = self.network.station_id(destination)
+        dist_km = self.network.distance(origin_id, destination_id)
+        rate_per_ton_km = self.rates.rate(goods_type, wagon_class)
+        return Quote(origin_id, destination_id, dist_km, rate_per_ton_km, qty * dist_km * rate_per_ton_km)
+
+
+# Quote many inquiries at once. `inquiries` is a DataFrame (or a CSV path or
+# file) with origin, destination, goods_type and qty columns and optionally
+# wagon_class. Station names and rates are resolved once per distinct value;
+# distances, rates and charges are then computed over NumPy arrays with the
+# same formula as RateEngine.quote(). Returns the inquiries with origin_id,
+# destination_id, dist_km, rate_per_ton_km, charge and error columns; rows
+# that cannot be priced get NaN charges and the reason in `error`.
+def quote_batch(engine, inquiries):
+    if not isinstance(inquiries, pd.DataFrame):
+        inquiries = pd.read_csv(inquiries, dtype={"origin": "object", "destination": "object", "goods_type": "object"})
+    missing = {"origin", "destination", "goods_type", "qty"} - set(inquiries.columns)
+    if missing:
+        raise ValueError(f"inquiries are missing column(s): {', '.join(sorted(missing))}")
+    result = inquiries.reset_index(drop=True).copy()
+    count = len(result)
+    network = engine.network
+    errors = np.full(count, None, dtype=object)
+
+    def note(mask, message):
+        # Keep the first error of each row
+        errors[mask & (errors == None)] = message  # noqa: E711
+
+    # Station IDs and distance_row() positions, resolved once per distinct name
+    def resolve(column):
+        codes, names = pd.factorize(result[column])
+        ids = np.full(len(names), None, dtype=object)
+        positions = np.full(len(names) + 1, -1, dtype=np.int64)
+        for code, name in enumerate(names):
+            try:
+                ids[code] = network.station_id(name)
+                positions[code] = network.station_index[ids[code]]
+            except UnknownStationError as e:
+                note(codes == code, str(e))
+        note(codes == -1, f"missing {column}")
+        return np.append(ids, None)[codes], positions[codes]
+
+    origin_ids, origin_positions = resolve("origin")
+    destination_ids, destination_positions = resolve("destination")
+
+    # One distance row per distinct origin, then a single fancy-index lookup
+    origins, origin_rows = np.unique(origin_positions[origin_positions >= 0], return_inverse=True)
+    matrix = np.empty((len(origins), len(network.station_ids)))
+    for row, position in enumerate(origins):
+        matrix[row] = network.distance_row(network.station_ids[position])
+    resolved = (origin_positions >= 0) & (destination_positions >= 0)
+    dist_km = np.full(count, np.nan)
+    rows = np.full(count, -1, dtype=np.int64)
+    rows[origin_positions >= 0] = origin_rows
+    dist_km[resolved] = matrix[rows[resolved], destination_positions[resolved]]
+    no_route = np.isinf(dist_km)
+    note(no_route, "no rail route")
+    dist_km[no_route] = np.nan
+
+    # One rate lookup per distinct (goods type, wagon class)
+    goods_codes, goods_types = pd.factorize(result["goods_type"])
+    if "wagon_class" in result.columns:
+        wagon_codes, wagon_classes = pd.factorize(result["wagon_class"].fillna(ANY))
+    else:
+        wagon_codes, wagon_classes = np.zeros(count, dtype=np.int64), [ANY]
+    rates = np.full(len(goods_types) * len(wagon_classes) + 1, np.nan)
+    pair_codes = np.where(goods_codes >= 0, goods_codes * len(wagon_classes) + wagon_codes, len(rates) - 1)
+    note(goods_codes == -1, "missing goods_type")
+    for code in np.unique(pair_codes[goods_codes >= 0]):
+        goods_type, wagon_class = goods_types[code // len(wagon_classes)], wagon_classes[code % len(wagon_classes)]
+        try:
+            rates[code] = engine.rates.rate(goods_type, wagon_class)
+        except NoRateError as e:
+            note(pair_codes == code, str(e))
+    rate_per_ton_km = rates[pair_codes]
+
+    qty = pd.to_numeric(result["qty"], errors="coerce").to_numpy(dtype=float)
+    note(np.isnan(qty), "invalid qty")
+    charge = qty * dist_km * rate_per_ton_km
+
+    result["origin_id"] = origin_ids
+    result["destination_id"] = destination_ids
+    result["dist_km"] = dist_km
+    result["rate_per_ton_km"] = rate_per_ton_km
+    result["charge"] = np.where(errors == None, charge, np.nan)  # noqa: E711
+    result["error"] = errors
+    return result
+
+
+# Build a RateEngine from the stations, rail segments and rates CSV files.
+# Missing files give an empty network / rate table (every quote then fails
+# with UnknownStationError / NoRateError).
+def load_rate_engine(stations_csv, segments_csv, rates_csv):
+    stations = {}
+    if os.path.exists(stations_csv):
+        df = pd.read_csv(stations_csv, dtype="object")
+        stations = dict(zip(df["station_id"].tolist(), df["name"].tolist()))
+    segments = []
+    if os.path.exists(segments_csv):
+        df = pd.read_csv(segments_csv, dtype={"from_station": "object", "to_station": "object", "km": "float64"})
+        segments = list(zip(df["from_station"].tolist(), df["to_station"].tolist(), df["km"].tolist()))
+    rates = {}
+    if os.path.exists(rates_csv):
+        df = pd.read_csv(rates_csv, dtype={"goods_type": "object", "wagon_class": "object", "rate_per_ton_km": "float64"})
+        rates = {(g, w): r for g, w, r in zip(df["goods_type"].tolist(), df["wagon_class"].tolist(), df["rate_per_ton_km"].tolist())}
+    return RateEngine(RailNetwork(stations, segments), RateTable(rates))
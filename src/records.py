@@ -0,0 +1,240 @@
+import datetime
+import sys
+import typing
+from collections.abc import Mapping, MutableMapping
+from dataclasses import dataclass, fields
+
+
+# Marks a field that is not set, so records behave like dicts that lack a key
+class _Missing:
+    __slots__ = ()
+
+    def __repr__(self):
+        return "MISSING"
+
+
+MISSING = _Missing()
+
+# Per-row counter that DataStore bumps on every write (optimistic concurrency)
+VERSION_COLUMN = "version"
+
+
+# Base class for the compact row types. Subclasses are slotted dataclasses
+# (see @record) that also behave as mutable mappings, so the app can keep
+# using row['field'], row.get(...), 'doc' in row and row.copy(). Values of
+# the fields listed in `_interned` are interned: the few distinct statuses,
+# goods types, cities and train options are then shared by all rows.
+# Keys that are not fields go to a per-row `_extra` dict, created on demand.
+class Record(MutableMapping):
+    __slots__ = ("_extra",)
+    _interned = ()
+    _nested = {}
+
+    def __post_init__(self):
+        self._extra = None
+        for name in self._interned:
+            value = getattr(self, name)
+            if type(value) is str:
+                setattr(self, name, sys.intern(value))
+        for name, convert in self._nested.items():
+            value = getattr(self, name)
+            if value is not MISSING:
+                setattr(self, name, convert(value))
+
+    # Build a record from any mapping (returns records of this type unchanged)
+    @classmethod
+    def coerce(cls, value):
+        if isinstance(value, cls):
+            return value
+        names = cls._field_names
+        known = {k: v for k, v in value.items() if k in names}
+        row = cls(**known)
+        for k, v in value.items():
+            if k not in names:
+                row[k] = v
+        return row
+
+    def __getitem__(self, key):
+        if key in self._field_names:
+            value = getattr(self, key)
+            if value is MISSING:
+                raise KeyError(key)
+            return value
+        if self._extra and key in self._extra:
+            return self._extra[key]
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key in self._field_names:
+            if key in self._interned and type(value) is str:
+                value = sys.intern(value)
+            elif key in self._nested:
+                value = self._nested[key](value)
+            setattr(self, key, value)
+        else:
+            if self._extra is None:
+                self._extra = {}
+            self._extra[key] = value
+
+    def __delitem__(self, key):
+        if key in self._field_names:
+            if getattr(self, key) is MISSING:
+                raise KeyError(key)
+            setattr(self, key, MISSING)
+        elif self._extra and key in self._extra:
+            del self._extra[key]
+        else:
+            raise KeyError(key)
+
+    def __iter__(self):
+        for name in self._field_order:
+            if getattr(self, name) is not MISSING:
+                yield name
+        if self._extra:
+            yield from self._extra
+
+    def __len__(self):
+        return sum(1 for _ in self)
+
+    # Plain dict copy, like dict.copy()
+    def copy(self):
+        return dict(self.items())
+
+    def __repr__(self):
+        return f"{type(self).__name__}({dict(self.items())!r})"
+
+
+# Turn an annotated Record subclass into a slotted dataclass whose fields all
+# default to MISSING
+def record(cls):
+    for name in cls.__dict__.get("__annotations__", {}):
+        if name not in cls.__dict__:
+            setattr(cls, name, MISSING)
+    cls = dataclass(slots=True, eq=False, repr=False)(cls)
+    # Declaration order for iteration (CSV columns, JSON keys); the set is for
+    # membership tests only, since its order changes with PYTHONHASHSEED
+    cls._field_order = tuple(f.name for f in fields(cls))
+    cls._field_names = frozenset(cls._field_order)
+    return cls
+
+
+_EPOCH = datetime.datetime(1970, 1, 1)
+_MICROSECOND = datetime.timedelta(microseconds=1)
+
+
+# One tracking event. The time is kept as integer microseconds since 1970
+# (naive, like the datetimes the app records) instead of a datetime object and
+# converted back when read; the status is interned.
+class TrackingEvent(Mapping):
+    __slots__ = ("status", "_time")
+
+    def __init__(self, status, time):
+        self.status = sys.intern(status) if type(status) is str else status
+        if isinstance(time, datetime.datetime) and time.tzinfo is None:
+            self._time = (time - _EPOCH) // _MICROSECOND
+        else:
+            self._time = time
+
+    @classmethod
+    def coerce(cls, value):
+        if isinstance(value, cls):
+            return value
+        return cls(value.get("status"), value.get("time"))
+
+    @property
+    def time(self):
+        if type(self._time) is int:
+            return _EPOCH + self._time * _MICROSECOND
+        return self._time
+
+    def __getitem__(self, key):
+        if key == "status":
+            return self.status
+        if key == "time":
+            return self.time
+        raise KeyError(key)
+
+    def __iter__(self):
+        return iter(("status", "time"))
+
+    def __len__(self):
+        return 2
+
+    def copy(self):
+        return {"status": self.status, "time": self.time}
+
+    def __repr__(self):
+        return f"TrackingEvent({self.status!r}, {self.time!r})"
+
+
+def _tracking_events(events):
+    if not isinstance(events, list):
+        return events
+    return [TrackingEvent.coerce(event) if isinstance(event, Mapping) else event for event in events]
+
+
+@record
+class UserRecord(Record):
+    _interned = ("approved", "business_type")
+
+    username: str
+    business_name: str
+    contact_person: str
+    email: str
+    mobile: str
+    pan_gst: str
+    approved: str
+    business_type: str
+    address: str
+    password: str
+    # Uploaded document: its digest in the document store (src/blobs.py);
+    # rows written by older versions hold the bytes inline in `doc`
+    doc: bytes
+    doc_sha256: str
+    version: int
+
+
+@record
+class ShipmentRecord(Record):
+    _interned = ("username", "goods_type", "origin", "destination", "dispatch_date", "option", "status")
+
+    waybill_ref: str
+    username: str
+    goods_type: str
+    qty: int
+    origin: str
+    destination: str
+    dispatch_date: str
+    option: str
+    charge: float
+    # Status at booking; the current one is on the tracking timeline
+    status: str
+    booked_on: str
+    version: int
+
+
+# Version of a row (0 for rows written before rows were versioned, or no row)
+def record_version(row):
+    if row is None:
+        return 0
+    version = row.get(VERSION_COLUMN)
+    return int(version) if isinstance(version, (int, float)) and version == version else 0
+
+
+def _shipment(value):
+    return ShipmentRecord.coerce(value) if isinstance(value, Mapping) else value
+
+
+@record
+class WaybillRecord(Record):
+    _interned = ("username", "status")
+    _nested = {"details": _shipment, "tracking": _tracking_events}
+
+    username: str
+    waybill_ref: str
+    details: ShipmentRecord
+    tracking: typing.List[TrackingEvent]
+    # Status at booking; the current one is on the tracking timeline
+    status: str
+    eta: datetime.datetime
+    version: int
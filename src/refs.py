@@ -0,0 +1,110 @@
+import datetime
+import os
+import threading
+import time
+
+# Crockford base32: no I, L, O or U, so refs are easy to read out and type
+ALPHABET = "0123456789ABCDEFGHJKMNPQRSTVWXYZ"
+_VALUES = {char: value for value, char in enumerate(ALPHABET)}
+
+TIME_CHARS = 10      # milliseconds since 1970 (48 bits, good until year 10889)
+SHARD_CHARS = 5      # generator shard (25 bits)
+SEQUENCE_CHARS = 4   # refs within one millisecond (20 bits)
+REF_LENGTH = TIME_CHARS + SHARD_CHARS + SEQUENCE_CHARS
+
+_MAX_SEQUENCE = 32 ** SEQUENCE_CHARS - 1
+_EPOCH = datetime.datetime(1970, 1, 1, tzinfo=datetime.timezone.utc)
+
+
+def _encode(value, width):
+    chars = []
+    for _ in range(width):
+        value, digit = divmod(value, 32)
+        chars.append(ALPHABET[digit])
+    return "".join(reversed(chars))
+
+
+def _decode(text):
+    value = 0
+    for char in text:
+        value = value * 32 + _VALUES[char]
+    return value
+
+
+def _millis(moment):
+    if moment.tzinfo is None:
+        moment = moment.astimezone()
+    return int((moment - _EPOCH).total_seconds() * 1000)
+
+
+# Default shard: FREIGHTFORGE_REF_SHARD when set (give every host its own
+# range when several hosts write to the same data), else the process ID,
+# which no two running processes on a host share
+def default_shard():
+    shard = os.getenv("FREIGHTFORGE_REF_SHARD")
+    return int(shard) if shard else os.getpid()
+
+
+# Time-ordered waybill references, in the spirit of ULIDs:
+#     <time: 10 chars><shard: 5 chars><sequence: 4 chars>
+# all in Crockford base32, so refs sort by creation time as plain strings
+# (good locality in sorted indexes, range scans by booking time with
+# ref_range()). The shard separates processes and the sequence separates
+# refs made in the same millisecond, so refs never collide. The clock is
+# never allowed to run backwards: if it does, refs continue from the last
+# millisecond used.
+class RefGenerator:
+    def __init__(self, shard=None):
+        self._fixed_shard = shard
+        self._lock = threading.Lock()
+        self._reset()
+        # A forked worker must not reuse its parent's shard
+        if shard is None and hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._reset)
+
+    def _reset(self):
+        shard = self._fixed_shard if self._fixed_shard is not None else default_shard()
+        self.shard = shard % 32 ** SHARD_CHARS
+        self._shard_text = _encode(self.shard, SHARD_CHARS)
+        self._last_ms = 0
+        self._sequence = 0
+        self._backdated_sequence = 0
+
+    # A new reference; `at` back-dates it (e.g. for imported bookings)
+    def new(self, at=None):
+        with self._lock:
+            if at is not None:
+                # Refs for past times share one rolling sequence
+                self._backdated_sequence = (self._backdated_sequence + 1) & _MAX_SEQUENCE
+                return self._format(_millis(at), self._backdated_sequence)
+            now_ms = time.time_ns() // 1_000_000
+            if now_ms > self._last_ms:
+                self._last_ms = now_ms
+                self._sequence = 0
+            elif self._sequence < _MAX_SEQUENCE:
+                self._sequence += 1
+            else:
+                # Sequence space for this millisecond is used up: move on to the next one
+                self._last_ms += 1
+                self._sequence = 0
+            return self._format(self._last_ms, self._sequence)
+
+    def _format(self, millis, sequence):
+        return _encode(millis, TIME_CHARS) + self._shard_text + _encode(sequence, SEQUENCE_CHARS)
+
+
+# Whether a string is a reference made by RefGenerator
+def is_time_ordered_ref(ref):
+    return isinstance(ref, str) and len(ref) == REF_LENGTH and all(char in _VALUES for char in ref)
+
+
+# Creation time of a reference (UTC)
+def ref_time(ref):
+    return _EPOCH + datetime.timedelta(milliseconds=_decode(ref[:TIME_CHARS]))
+
+
+# Smallest and largest possible refs made between two times, for range scans
+# over sorted refs: every ref made in [start, end] satisfies low <= ref <= high
+def ref_range(start, end):
+    tail = REF_LENGTH - TIME_CHARS
+    return _encode(_millis(start), TIME_CHARS) + "0" * tail, _encode(_millis(end), TIME_CHARS) + "Z" * tail
@@ -0,0 +1,115 @@
+import argparse
+import csv
+import os
+import typing
+from dataclasses import dataclass, field
+
+from src.records import VERSION_COLUMN, Record, ShipmentRecord, TrackingEvent, UserRecord, WaybillRecord
+from src.serialization import UndecodableValueError, decode_nested
+
+
+# Text columns stay "object" so rows hold plain Python strings
+TEXT = "object"
+
+_DTYPES = {int: "int64", float: "float64"}
+
+
+def _is_nested(annotation):
+    if typing.get_origin(annotation) in (list, dict):
+        return True
+    return isinstance(annotation, type) and issubclass(annotation, (Record, TrackingEvent))
+
+
+# How one dataset is stored: its primary key, its row type (see src/records.py),
+# the pandas dtype of every column (only these columns are read from CSV), which
+# columns hold JSON, and which columns the SQLite backend indexes
+@dataclass(frozen=True)
+class DatasetSchema:
+    name: str
+    key: str
+    record_type: type
+    indexed: tuple = ()
+    dtypes: dict = field(init=False)
+    nested_columns: tuple = field(init=False)
+
+    def __post_init__(self):
+        hints = typing.get_type_hints(self.record_type)
+        dtypes = {column: _DTYPES.get(annotation, TEXT) for column, annotation in hints.items()}
+        if VERSION_COLUMN in dtypes:
+            # Older files have no versions (blank cells); the loader turns them into 0
+            dtypes[VERSION_COLUMN] = "float64"
+        nested = tuple(column for column, annotation in hints.items() if _is_nested(annotation))
+        object.__setattr__(self, "dtypes", dtypes)
+        object.__setattr__(self, "nested_columns", nested)
+
+
+# The status stored on shipments and waybills is the one they were booked
+# with; the current status comes from the tracking timeline (src/tracking.py),
+# so it is not indexed
+SCHEMAS = {
+    "users": DatasetSchema("users", key="username", record_type=UserRecord),
+    "pending_users": DatasetSchema("pending_users", key="username", record_type=UserRecord),
+    "shipments": DatasetSchema("shipments", key="waybill_ref", record_type=ShipmentRecord, indexed=("username",)),
+    "waybills": DatasetSchema("waybills", key="waybill_ref", record_type=WaybillRecord, indexed=("username",)),
+}
+
+
+# Raised when an existing data file cannot be read; its dataset is not
+# written until it can be, so the rows in the file are never overwritten
+class UnreadableDataError(ValueError):
+    pass
+
+
+# Raised when a CSV file lacks its dataset's primary key column
+class MissingKeyColumnError(UnreadableDataError):
+    pass
+
+
+# Older versions wrote shipments.csv without the waybill reference, so its rows
+# could not be keyed. Recover each row's reference from the waybill holding the
+# same booking (same owner and booked_on) and add a waybill_ref column.
+# Returns the number of rows that got a reference.
+def backfill_shipment_refs(shipments_csv, waybills_csv):
+    with open(waybills_csv, "r", encoding="utf-8", newline="") as file:
+        refs = {}
+        for row in csv.DictReader(file):
+            try:
+                details = decode_nested(row.get("details"), {})
+            except UndecodableValueError:
+                continue
+            refs[(details.get("username"), str(details.get("booked_on")))] = row["waybill_ref"]
+
+    with open(shipments_csv, "r", encoding="utf-8", newline="") as file:
+        reader = csv.DictReader(file)
+        fieldnames = reader.fieldnames
+        rows = list(reader)
+    if "waybill_ref" in fieldnames:
+        return 0
+
+    filled = 0
+    for row in rows:
+        row["waybill_ref"] = refs.get((row.get("username"), row.get("booked_on")), "")
+        filled += bool(row["waybill_ref"])
+
+    tmp_path = shipments_csv + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=["waybill_ref", *fieldnames], lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, shipments_csv)
+    return filled
+
+
+# Command line entry point:
+#     python -m src.schema data/shipments.csv data/waybills.csv
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Add the waybill_ref key column to an old shipments CSV.")
+    parser.add_argument("shipments_csv")
+    parser.add_argument("waybills_csv")
+    args = parser.parse_args(argv)
+    filled = backfill_shipment_refs(args.shipments_csv, args.waybills_csv)
+    print(f"{args.shipments_csv}: {filled} row(s) keyed by waybill_ref")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+import argparse
+import ast
+import base64
+import csv
+import datetime
+import json
+import os
+from collections.abc import Mapping
+
+
+# Waybill columns that hold nested values (a dict and a list of tracking events)
+NESTED_COLUMNS = ("details", "tracking")
+
+# datetime constructors a legacy repr() cell may call
+LEGACY_CALLS = ("datetime", "date", "timedelta", "timezone")
+
+
+# Raised when a nested cell is neither JSON nor a legacy repr() we can evaluate
+class UndecodableValueError(ValueError):
+    pass
+
+
+# json.dumps hook: timestamps are written as ISO-8601 strings, record objects
+# (src/records.py) as plain objects
+def _json_default(value):
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    if isinstance(value, Mapping):
+        return dict(value.items())
+    if hasattr(value, "item"):
+        # numpy scalars coming out of pandas
+        return value.item()
+    raise TypeError(f"Cannot serialize value of type {type(value).__name__}")
+
+
+# Canonical CSV cell encoding for a nested value
+def encode_nested(value):
+    return json.dumps(value, default=_json_default, separators=(",", ":"))
+
+
+# Tagged JSON for whole rows (journal records, SQLite rows). Unlike the CSV
+# cell encoding it keeps value types: datetimes, dates and document bytes
+# come back as the same types.
+def _tagged_default(value):
+    if isinstance(value, datetime.datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, datetime.date):
+        return {"__date__": value.isoformat()}
+    if isinstance(value, bytes):
+        return {"__bytes__": base64.b64encode(value).decode("ascii")}
+    if isinstance(value, Mapping):
+        return dict(value.items())
+    if hasattr(value, "item"):
+        # numpy scalars coming out of pandas
+        return value.item()
+    raise TypeError(f"Cannot serialize value of type {type(value).__name__}")
+
+
+def _tagged_hook(obj):
+    if "__datetime__" in obj:
+        return datetime.datetime.fromisoformat(obj["__datetime__"])
+    if "__date__" in obj:
+        return datetime.date.fromisoformat(obj["__date__"])
+    if "__bytes__" in obj:
+        return base64.b64decode(obj["__bytes__"])
+    return obj
+
+
+def dumps_row(value):
+    return json.dumps(value, default=_tagged_default)
+
+
+def loads_row(text):
+    return json.loads(text, object_hook=_tagged_hook)
+
+
+# Evaluate a legacy repr() cell: literals plus calls of the datetime
+# constructors in LEGACY_CALLS (keyword arguments included, e.g.
+# tzinfo=datetime.timezone.utc). Anything else raises ValueError.
+def parse_legacy_literal(text):
+    def evaluate(node):
+        if isinstance(node, ast.Call):
+            func = node.func
+            if (isinstance(func, ast.Attribute) and isinstance(func.value, ast.Name)
+                    and func.value.id == "datetime" and func.attr in LEGACY_CALLS):
+                if any(keyword.arg is None for keyword in node.keywords):
+                    raise ValueError("Unsupported **arguments in legacy value")
+                args = [evaluate(arg) for arg in node.args]
+                kwargs = {keyword.arg: evaluate(keyword.value) for keyword in node.keywords}
+                return getattr(datetime, func.attr)(*args, **kwargs)
+            raise ValueError(f"Unsupported call in legacy value: {ast.unparse(func)}")
+        if isinstance(node, ast.Attribute):
+            if ast.unparse(node) == "datetime.timezone.utc":
+                return datetime.timezone.utc
+            raise ValueError(f"Unsupported name in legacy value: {ast.unparse(node)}")
+        if isinstance(node, ast.Dict):
+            return {evaluate(k): evaluate(v) for k, v in zip(node.keys, node.values)}
+        if isinstance(node, (ast.List, ast.Tuple)):
+            return [evaluate(item) for item in node.elts]
+        return ast.literal_eval(node)
+
+    return evaluate(ast.parse(text, mode="eval").body)
+
+
+# Decode one nested cell: JSON first, legacy repr() for files not yet migrated.
+# Empty cells give `default`; cells that are neither raise UndecodableValueError.
+def decode_nested(text, default=None):
+    if not isinstance(text, str) or not text:
+        return default
+    try:
+        return json.loads(text)
+    except json.JSONDecodeError:
+        pass
+    try:
+        return parse_legacy_literal(text)
+    except (SyntaxError, ValueError, TypeError) as e:
+        raise UndecodableValueError(f"cannot decode {text[:60]!r}: {e}") from None
+
+
+def _parse_time(value):
+    if isinstance(value, str):
+        try:
+            return datetime.datetime.fromisoformat(value)
+        except ValueError:
+            return value
+    return value
+
+
+# Decode a tracking cell into a list of events whose times are datetimes
+def decode_tracking(text):
+    return [
+        {**event, "time": _parse_time(event.get("time"))}
+        for event in decode_nested(text, [])
+        if isinstance(event, dict)
+    ]
+
+
+def _decode_cell(text, column):
+    if column == "tracking":
+        return decode_tracking(text)
+    return decode_nested(text, {})
+
+
+# Decode the nested columns of a raw waybill row (all strings, as read from the
+# CSV) with one parse per cell: details -> dict, tracking -> list of events.
+# For display only: cells that cannot be decoded read as empty.
+def decode_waybill_row(row):
+    waybill = dict(row)
+    for column, empty in (("details", {}), ("tracking", [])):
+        try:
+            waybill[column] = _decode_cell(row.get(column), column)
+        except UndecodableValueError:
+            waybill[column] = empty
+    return waybill
+
+
+# Decode a whole nested column at once (used by the CSV loader). Cells that
+# cannot be decoded keep their text, so saving the rows writes them back
+# unchanged. Returns (decoded series, number of such cells).
+def decode_nested_column(series, column):
+    failed = 0
+
+    def decode(text):
+        nonlocal failed
+        try:
+            return _decode_cell(text, column)
+        except UndecodableValueError:
+            failed += 1
+            return text
+
+    return series.map(decode), failed
+
+
+# Rewrite a waybills CSV so details/tracking hold JSON with ISO-8601 timestamps
+# (and eta an ISO-8601 timestamp). Cells that cannot be decoded are left as
+# they are. Returns (cells converted, cells that could not be decoded).
+def migrate_waybills_csv(file_path):
+    with open(file_path, "r", encoding="utf-8", newline="") as file:
+        reader = csv.DictReader(file)
+        fieldnames = reader.fieldnames
+        rows = list(reader)
+
+    converted = 0
+    failed = 0
+    for row in rows:
+        for column in NESTED_COLUMNS:
+            if column not in row:
+                continue
+            text = row[column]
+            try:
+                value = decode_nested(text, [] if column == "tracking" else {})
+            except UndecodableValueError:
+                failed += 1
+                continue
+            encoded = encode_nested(value)
+            if encoded != text:
+                row[column] = encoded
+                converted += 1
+        eta = _parse_time(row.get("eta"))
+        if isinstance(eta, datetime.datetime) and eta.isoformat() != row["eta"]:
+            row["eta"] = eta.isoformat()
+            converted += 1
+
+    tmp_path = file_path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8", newline="") as file:
+        writer = csv.DictWriter(file, fieldnames=fieldnames, lineterminator="\n")
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(tmp_path, file_path)
+    return converted, failed
+
+
+# Command line entry point for the migration:
+#     python -m src.serialization data/waybills.csv
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Convert waybill details/tracking columns to JSON.")
+    parser.add_argument("files", nargs="+", help="waybills CSV file(s) to migrate in place")
+    args = parser.parse_args(argv)
+    for file_path in args.files:
+        converted, failed = migrate_waybills_csv(file_path)
+        print(f"{file_path}: {converted} cell(s) converted, {failed} left unchanged (cannot be decoded)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,57 @@
+import threading
+import time
+from collections import OrderedDict
+
+
+# Where logged-in sessions live. A session is a random token mapped to just
+# a username, a stamp of the credentials it was opened with (see
+# Authenticator) and an expiry; sessions idle for longer than `ttl` seconds
+# expire. get() is a single keyed lookup and keeps a session alive.
+class SessionStore:
+    def __init__(self, ttl):
+        self.ttl = ttl
+
+    # (username, stamp) of a live session, or None
+    def get(self, token):
+        raise NotImplementedError
+
+    def put(self, token, username, stamp):
+        raise NotImplementedError
+
+    def delete(self, token):
+        raise NotImplementedError
+
+
+# Sessions of one process, in memory. At most `max_sessions` are kept; the
+# least recently used go first.
+class MemorySessionStore(SessionStore):
+    def __init__(self, ttl=8 * 3600, max_sessions=10000):
+        super().__init__(ttl)
+        self.max_sessions = max_sessions
+        self._sessions = OrderedDict()  # token -> (username, stamp, expiry)
+        self._lock = threading.Lock()
+
+    def get(self, token):
+        now = time.time()
+        with self._lock:
+            session = self._sessions.get(token)
+            if session is None:
+                return None
+            username, stamp, expiry = session
+            if now > expiry:
+                del self._sessions[token]
+                return None
+            self._sessions[token] = (username, stamp, now + self.ttl)
+            self._sessions.move_to_end(token)
+            return username, stamp
+
+    def put(self, token, username, stamp):
+        with self._lock:
+            self._sessions[token] = (username, stamp, time.time() + self.ttl)
+            self._sessions.move_to_end(token)
+            while len(self._sessions) > self.max_sessions:
+                self._sessions.popitem(last=False)
+
+    def delete(self, token):
+        with self._lock:
+            self._sessions.pop(token, None)
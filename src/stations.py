@@ -0,0 +1,67 @@
+import bisect
+
+
+# Raised when a station name or ID is not in the catalogue
+class UnknownStationError(ValueError):
+    pass
+
+
+# Lower-case, drop commas and collapse whitespace: "Quebec,  QC" -> "quebec qc"
+def normalize_station_name(name):
+    return " ".join(str(name).lower().replace(",", " ").split())
+
+
+# Station names and IDs with two lookups:
+# - resolve(): exact match on the station ID or the normalized name (a dict
+#   lookup), which is how quotes get from typed text to a station ID;
+# - suggest(): names matching a typed prefix, from a sorted array of
+#   normalized keys searched with bisect. Every word of a name starts a key
+#   ("thunder bay on", "bay on", "on"), so "bay" and "on" match as well as
+#   "thund", and so does the station ID.
+class StationCatalogue:
+    def __init__(self, stations):
+        # stations: station ID -> name
+        self.stations = dict(stations)
+        self._ids_by_name = {}
+        entries = []
+        for station_id, name in self.stations.items():
+            normalized = normalize_station_name(name)
+            self._ids_by_name[normalized] = station_id
+            words = normalized.split()
+            for start in range(len(words)):
+                entries.append((" ".join(words[start:]), start, station_id))
+            entries.append((station_id.lower(), 0, station_id))
+        entries.sort()
+        self._keys = [key for key, _, _ in entries]
+        self._key_ids = [station_id for _, _, station_id in entries]
+
+    def __len__(self):
+        return len(self.stations)
+
+    def name(self, station_id):
+        return self.stations[station_id]
+
+    # Station ID for a station ID or name ("QUE", "Quebec, QC", "quebec qc")
+    def resolve(self, station):
+        if station in self.stations:
+            return station
+        station_id = self._ids_by_name.get(normalize_station_name(station))
+        if station_id is None:
+            raise UnknownStationError(f"unknown station: {station}")
+        return station_id
+
+    # Up to `limit` station IDs whose name (or ID) has a word starting with the prefix
+    def suggest(self, prefix, limit=10):
+        prefix = normalize_station_name(prefix)
+        if not prefix:
+            return []
+        found = []
+        position = bisect.bisect_left(self._keys, prefix)
+        while position < len(self._keys) and self._keys[position].startswith(prefix):
+            station_id = self._key_ids[position]
+            if station_id not in found:
+                found.append(station_id)
+                if len(found) == limit:
+                    break
+            position += 1
+        return found
@@ -0,0 +1,323 @@
+import datetime
+import os
+import re
+import threading
+from collections import Counter
+from collections.abc import Mapping
+
+import pandas as pd
+
+from src.locks import FileLock
+from src.records import TrackingEvent
+from src.serialization import decode_waybill_row, dumps_row, loads_row
+
+
+# Raised when recording an event for a waybill the timeline does not know
+class UnknownWaybillError(ValueError):
+    pass
+
+
+# Append-only file of tracking events, one tagged JSON line each:
+#     {"ref": ..., "status": ..., "time": ..., "eta": ... (optional)}
+# Appends hold an inter-process lock, so lines written by several processes
+# never interleave; a batch of events is one write and one fsync. read_new()
+# returns the events appended (by anyone) since its last call, reading only
+# the new tail of the file.
+class EventLog:
+    def __init__(self, file_path):
+        self.file_path = file_path
+        self._file_lock = FileLock(file_path + ".lock")
+        self._read_lock = threading.Lock()
+        self._offset = 0
+
+    def append(self, event):
+        self.append_many([event])
+
+    def append_many(self, events):
+        if not events:
+            return
+        lines = "".join(dumps_row(event) + "\n" for event in events).encode("utf-8")
+        with self._file_lock:
+            with open(self.file_path, "ab") as file:
+                file.write(lines)
+                file.flush()
+                os.fsync(file.fileno())
+
+    def read_new(self):
+        with self._read_lock:
+            try:
+                with open(self.file_path, "rb") as file:
+                    file.seek(self._offset)
+                    tail = file.read()
+            except FileNotFoundError:
+                return []
+            events = []
+            for line in tail.splitlines(keepends=True):
+                # A torn last line is still being written; pick it up next time
+                if not line.endswith(b"\n"):
+                    break
+                events.append(loads_row(line.decode("utf-8")))
+                self._offset += len(line)
+            return events
+
+
+# Tracking timeline of every waybill as an event stream, with projections
+# kept up to date incrementally: current status and ETA per waybill, and
+# waybill counts per status (overall and per customer).
+# A waybill row is the starting point (its status, ETA and the tracking
+# history written at booking); events from the EventLog are applied on top
+# in log order. Recording an event appends one line to the log and updates
+# the projections in O(1); no table is rewritten, and status is not copied
+# into the waybill or shipment rows.
+# A waybill's ETA is the last one revised by an event, else the predicted
+# one (see predict()), else the ETA on its row.
+# Listeners (add_listener) are called with (ref, TrackingEvent) for every new
+# event applied to a known waybill.
+# The timeline is also a DataStore index on waybills (rebuild/add/remove),
+# so it follows waybills added, changed or reloaded anywhere.
+class TrackingTimeline:
+    def __init__(self, log):
+        self.log = log
+        self._lock = threading.RLock()
+        self._rows = {}          # ref -> (username, status, ETA, history) from the waybill row
+        self._events = {}        # ref -> [(TrackingEvent, ETA or None)] from the log
+        self._status = {}        # ref -> current status
+        self._eta = {}           # ref -> ETA revised by the latest event that had one
+        self._predicted = {}     # ref -> predicted ETA
+        self._by_status = {}     # status -> {ref: None}, in the order refs reached it
+        self._counts = Counter()  # (username, status) -> waybills
+        self._listeners = []
+
+    def add_listener(self, callback):
+        self._listeners.append(callback)
+
+    def _set(self, ref, status):
+        self._unset(ref)
+        self._status[ref] = status
+        self._by_status.setdefault(status, {})[ref] = None
+        self._counts[(self._rows[ref][0], status)] += 1
+
+    def _unset(self, ref):
+        status = self._status.pop(ref, None)
+        if status is not None:
+            del self._by_status[status][ref]
+            self._counts[(self._rows[ref][0], status)] -= 1
+
+    # Status and revised ETA of a waybill from its row and all of its events
+    def _project(self, ref):
+        status = self._rows[ref][1]
+        eta = None
+        for event, event_eta in self._events.get(ref, ()):
+            status = event.status
+            if event_eta is not None:
+                eta = event_eta
+        self._set(ref, status)
+        if eta is None:
+            self._eta.pop(ref, None)
+        else:
+            self._eta[ref] = eta
+
+    def _store(self, event):
+        entry = (TrackingEvent(event["status"], event["time"]), event.get("eta"))
+        self._events.setdefault(event["ref"], []).append(entry)
+        return entry
+
+    def _notify(self, ref, event):
+        for callback in self._listeners:
+            callback(ref, event)
+
+    # Apply the events other processes (and we) appended since the last look
+    def refresh(self):
+        with self._lock:
+            for event in self.log.read_new():
+                tracking_event, eta = self._store(event)
+                ref = event["ref"]
+                if ref in self._rows:
+                    self._set(ref, tracking_event.status)
+                    if eta is not None:
+                        self._eta[ref] = eta
+                    self._notify(ref, tracking_event)
+
+    # Append an event to a waybill's timeline (`time` defaults to now; `eta`
+    # revises the ETA) and return the waybill's new status
+    def record(self, ref, status, time=None, eta=None):
+        event = {"ref": ref, "status": status, "time": time or datetime.datetime.now()}
+        if eta is not None:
+            event["eta"] = eta
+        rejected = self.record_many([event])
+        if rejected:
+            raise UnknownWaybillError(rejected[0][1])
+        return self._status[ref]
+
+    # Append a batch of events (dicts with ref, status, time and optionally
+    # eta) with one log write. Events for unknown waybills are not recorded;
+    # they are returned as (event, reason) pairs.
+    def record_many(self, events):
+        accepted = []
+        rejected = []
+        for event in events:
+            if event["ref"] in self:
+                accepted.append(event)
+            else:
+                rejected.append((event, f"unknown waybill: {event['ref']}"))
+        self.log.append_many(accepted)
+        self.refresh()
+        return rejected
+
+    # Whether the timeline knows a waybill (has its row)
+    def __contains__(self, ref):
+        return ref in self._rows
+
+    def status(self, ref, default=None):
+        return self._status.get(ref, default)
+
+    def eta(self, ref, default=None):
+        row = self._rows.get(ref)
+        if row is None:
+            return default
+        eta = self._eta.get(ref)
+        if eta is None:
+            eta = self._predicted.get(ref, row[2])
+        return eta
+
+    # Replace the predicted ETAs (ref -> ETA) of open waybills
+    def predict(self, etas):
+        self._predicted = dict(etas)
+
+    # Booking-time history followed by the recorded events, oldest first
+    def timeline(self, ref):
+        with self._lock:
+            row = self._rows.get(ref)
+            history = list(row[3]) if row and isinstance(row[3], list) else []
+            return history + [event for event, _ in self._events.get(ref, ())]
+
+    # Latest event that has happened by `now` (the booking-time history also
+    # lists planned steps), or None
+    def last_event(self, ref, now=None):
+        now = now or datetime.datetime.now()
+        with self._lock:
+            row = self._rows.get(ref)
+            history = row[3] if row and isinstance(row[3], list) else []
+            recorded = [event for event, _ in self._events.get(ref, ())]
+            for event in reversed(list(history) + recorded):
+                if _happened(event.get("time"), now):
+                    return event
+        return None
+
+    # Waybills per status, for everyone or for one customer
+    def counts(self, username=None):
+        with self._lock:
+            if username is None:
+                return {status: len(refs) for status, refs in self._by_status.items() if refs}
+            return {status: count for (owner, status), count in self._counts.items() if owner == username and count}
+
+    # Waybills currently in a status (or any of a list of statuses)
+    def refs(self, status, limit=None):
+        statuses = [status] if isinstance(status, str) else status
+        found = []
+        with self._lock:
+            for status in statuses:
+                for ref in self._by_status.get(status, ()):
+                    if limit is not None and len(found) >= limit:
+                        return found
+                    found.append(ref)
+        return found
+
+    # DataStore index interface
+
+    def rebuild(self, data):
+        with self._lock:
+            new_events = [(event["ref"], self._store(event)[0]) for event in self.log.read_new()]
+            self._status.clear()
+            self._eta.clear()
+            self._by_status.clear()
+            self._counts.clear()
+            self._rows = {ref: _row_state(row) for ref, row in data.items()}
+            for ref in self._rows:
+                self._project(ref)
+            for ref, event in new_events:
+                if ref in self._rows:
+                    self._notify(ref, event)
+
+    def add(self, key, row):
+        with self._lock:
+            self._unset(key)
+            self._rows[key] = _row_state(row)
+            self._project(key)
+
+    def remove(self, key):
+        with self._lock:
+            if key in self._rows:
+                self._unset(key)
+                self._eta.pop(key, None)
+                del self._rows[key]
+
+
+def _row_state(row):
+    return (row.get("username"), row.get("status"), row.get("eta"), row.get("tracking"))
+
+
+def _happened(time, now):
+    try:
+        return time <= now
+    except TypeError:
+        # Not a time, or time zone aware: keep it
+        return True
+
+
+# Waybill refs from pasted text: separated by commas, semicolons or
+# whitespace, duplicates dropped, first-seen order kept
+def parse_refs(text):
+    return list(dict.fromkeys(ref for ref in re.split(r"[\s,;]+", text or "") if ref))
+
+
+# A time read from a row or event as a (time zone naive) Timestamp: rows read
+# back from CSV hold strings, new ones datetimes. Unparseable values are NaT.
+def _as_time(value):
+    if value is None:
+        return None
+    time = pd.to_datetime(value, errors="coerce")
+    if isinstance(time, pd.Timestamp) and time.tzinfo is not None:
+        time = time.tz_convert(None)
+    return time
+
+
+# Status, ETA and last event of many waybills, one row (dict) per ref in the
+# order given; `eta` and `last_event_time` are Timestamps (see _as_time), so
+# the rows make a dataframe with proper datetime columns. Waybills are looked up in `waybills` (the in-memory rows) and
+# the timeline; refs missing there are read in one pass through `index` (a
+# CsvOffsetIndex), if given. The work is proportional to the number of refs.
+def track_many(timeline, waybills, refs, index=None):
+    now = datetime.datetime.now()
+    missing = [ref for ref in refs if ref not in waybills]
+    stored = {}
+    if index is not None and missing:
+        stored = {ref: decode_waybill_row(row) for ref, row in index.lookup_many(missing).items()}
+    results = []
+    for ref in refs:
+        waybill = waybills.get(ref) or stored.get(ref)
+        if waybill is None:
+            results.append({"waybill_ref": ref, "found": False, "status": None, "eta": None,
+                            "last_event": None, "last_event_time": None, "origin": None, "destination": None})
+            continue
+        details = waybill.get("details")
+        if not isinstance(details, Mapping):
+            # Empty, or a cell the loader could not decode
+            details = {}
+        if ref in timeline:
+            status, eta, last = timeline.status(ref), timeline.eta(ref), timeline.last_event(ref, now)
+        else:
+            tracking = waybill.get("tracking") or []
+            happened = [event for event in tracking if _happened(event.get("time"), now)]
+            status, eta, last = waybill.get("status"), waybill.get("eta"), happened[-1] if happened else None
+        results.append({
+            "waybill_ref": ref,
+            "found": True,
+            "status": status,
+            "eta": _as_time(eta),
+            "last_event": last.get("status") if last else None,
+            "last_event_time": _as_time(last.get("time")) if last else None,
+            "origin": details.get("origin"),
+            "destination": details.get("destination"),
+        })
+    return results
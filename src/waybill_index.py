@@ -0,0 +1,155 @@
+import base64
+import csv
+import json
+import os
+import threading
+
+
+# Number of bytes before the indexed end of the CSV that are remembered to
+# tell "rows were appended" apart from "the file was rewritten"
+_CHECK_BYTES = 64
+
+
+# Read one CSV record (which may span several lines inside quotes) starting at
+# the current position of a binary file
+def _read_record(file):
+    record = file.readline()
+    while record and record.count(b'"') % 2:
+        line = file.readline()
+        if not line:
+            break
+        record += line
+    return record
+
+
+def _parse_record(record):
+    return next(csv.reader([record.decode("utf-8")]), [])
+
+
+# Persistent key -> byte offset index over a CSV file (the waybills table).
+# Offsets live in memory as a dict and on disk next to the CSV:
+#   <csv>.idx       one "key,offset" line per record, append-only
+#   <csv>.idx.meta  JSON with the CSV size/mtime/inode the index covers
+# The index is checked against the CSV on every lookup. The app's writes
+# replace the file (see atomic_write() in src/locks.py), so the first lookup
+# after a write rebuilds the index with one scan. Only rows appended to the
+# same file in place (e.g. by an import script) are indexed incrementally,
+# by scanning just the new tail. A file without the key column (or empty)
+# indexes no rows.
+class CsvOffsetIndex:
+    def __init__(self, csv_path, key_column="waybill_ref"):
+        self.csv_path = csv_path
+        self.key_column = key_column
+        self.index_path = csv_path + ".idx"
+        self.meta_path = csv_path + ".idx.meta"
+        self.offsets = {}
+        self.header = None
+        self._meta = None
+        self._lock = threading.Lock()
+        self._load()
+
+    # Row (as a dict of strings) for a key, or None
+    def lookup(self, key):
+        self.update()
+        offset = self.offsets.get(key)
+        if offset is None:
+            return None
+        with open(self.csv_path, "rb") as file:
+            file.seek(offset)
+            values = _parse_record(_read_record(file))
+        return dict(zip(self.header, values))
+
+    # Rows for many keys ({key: row}, unknown keys left out): one index update
+    # and one pass over the file, reading the rows in file order
+    def lookup_many(self, keys):
+        self.update()
+        found = ((self.offsets.get(key), key) for key in set(keys))
+        offsets = sorted(item for item in found if item[0] is not None)
+        rows = {}
+        if not offsets:
+            return rows
+        with open(self.csv_path, "rb") as file:
+            for offset, key in offsets:
+                file.seek(offset)
+                rows[key] = dict(zip(self.header, _parse_record(_read_record(file))))
+        return rows
+
+    # Bring the index up to date with the CSV file
+    def update(self):
+        with self._lock:
+            try:
+                stat = os.stat(self.csv_path)
+            except OSError:
+                self._reset()
+                return
+            meta = self._meta
+            if meta and meta["size"] == stat.st_size and meta["mtime_ns"] == stat.st_mtime_ns:
+                return
+            replaced = not meta or meta.get("ino") != stat.st_ino
+            if (not replaced and self.key_column in (self.header or ()) and stat.st_size > meta["size"]
+                    and self._check_bytes(meta["size"]) == meta["check"]):
+                self._scan(meta["size"], append=True)
+            else:
+                self._scan(0, append=False)
+
+    def _reset(self):
+        self.offsets = {}
+        self.header = None
+        self._meta = None
+
+    def _check_bytes(self, end):
+        with open(self.csv_path, "rb") as file:
+            file.seek(max(0, end - _CHECK_BYTES))
+            return base64.b64encode(file.read(min(end, _CHECK_BYTES))).decode("ascii")
+
+    # Index the records from `start` to the end of the CSV
+    def _scan(self, start, append):
+        if not append:
+            self._reset()
+        entries = []
+        with open(self.csv_path, "rb") as file:
+            file.seek(start)
+            if self.header is None:
+                self.header = _parse_record(_read_record(file))
+            key_pos = self.header.index(self.key_column) if self.key_column in self.header else None
+            while key_pos is not None:
+                offset = file.tell()
+                record = _read_record(file)
+                if not record:
+                    break
+                values = _parse_record(record)
+                if len(values) > key_pos:
+                    entries.append((values[key_pos], offset))
+            if key_pos is None:
+                # Nothing to index: the index covers the whole file
+                file.seek(0, os.SEEK_END)
+            end = file.tell()
+            stat = os.fstat(file.fileno())
+
+        # Later rows for the same key win, like a dict update
+        self.offsets.update(entries)
+        with open(self.index_path, "a" if append else "w", encoding="utf-8", newline="") as index_file:
+            writer = csv.writer(index_file)
+            writer.writerows(entries)
+        self._meta = {
+            "size": end,
+            "mtime_ns": stat.st_mtime_ns,
+            "ino": stat.st_ino,
+            "check": self._check_bytes(end),
+            "header": self.header,
+        }
+        with open(self.meta_path, "w", encoding="utf-8") as meta_file:
+            json.dump(self._meta, meta_file)
+
+    # Load a previously saved index (it is validated against the CSV on update)
+    def _load(self):
+        try:
+            with open(self.meta_path, "r", encoding="utf-8") as meta_file:
+                meta = json.load(meta_file)
+            with open(self.index_path, "r", encoding="utf-8", newline="") as index_file:
+                self.offsets = {key: int(offset) for key, offset in csv.reader(index_file)}
+        except (OSError, ValueError):
+            self._reset()
+            return
+        self.header = meta["header"]
+        self._meta = meta
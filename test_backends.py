@@ -0,0 +1,97 @@
+import datetime
+import sqlite3
+
+import pytest
+
+from src.backends import SqliteBackend
+from src.data_store import DataStore, StaleRecordError
+
+
+def test_sqlite_store_round_trips_rows(tmp_path):
+    store = DataStore(SqliteBackend(str(tmp_path / "ff.db")))
+    when = datetime.datetime(2025, 7, 14, 15, 46, 8)
+    store.put("waybills", "REF1", {"username": "Customer1", "status": "In Transit", "eta": when, "tracking": []})
+    store.put("users", "admin", {"username": "admin", "doc": b"admin_document"})
+
+    reopened = DataStore(SqliteBackend(str(tmp_path / "ff.db")))
+    assert reopened.get("waybills")["REF1"]["eta"] == when
+    assert reopened.get("users")["admin"]["doc"] == b"admin_document"
+
+
+def test_sqlite_workers_see_each_others_changes(tmp_path):
+    db_path = str(tmp_path / "ff.db")
+    worker_a = DataStore(SqliteBackend(db_path))
+    worker_b = DataStore(SqliteBackend(db_path))
+
+    worker_a.put("shipments", "REF1", {"username": "Customer1", "status": "Booked"})
+    worker_a.put("shipments", "REF2", {"username": "Customer2", "status": "Booked"})
+    worker_b.refresh()
+    assert set(worker_b.get("shipments")) == {"REF1", "REF2"}
+
+    worker_b.delete("shipments", "REF1")
+    worker_a.refresh()
+    assert set(worker_a.get("shipments")) == {"REF2"}
+
+
+def test_sqlite_imports_csv_once_and_indexes_owner(tmp_path):
+    users_csv = tmp_path / "users.csv"
+    users_csv.write_text("username,business_name,approved\nadmin,HQ,yes\n")
+    backend = SqliteBackend(str(tmp_path / "ff.db"), csv_paths={"users": str(users_csv)})
+    store = DataStore(backend)
+    assert store.get("users")["admin"]["business_name"] == "HQ"
+
+    store.put("waybills", "REF1", {"username": "Customer1", "status": "Delivered"})
+    store.put("waybills", "REF2", {"username": "Customer1", "status": "In Transit"})
+    assert sorted(backend.find_keys("waybills", "username", "Customer1")) == ["REF1", "REF2"]
+    with pytest.raises(ValueError):
+        # Current statuses live in the tracking timeline, not in the rows
+        backend.find_keys("waybills", "status", "Delivered")
+
+
+def test_sqlite_drops_columns_that_are_no_longer_indexed(tmp_path):
+    db_path = str(tmp_path / "ff.db")
+    connection = sqlite3.connect(db_path)
+    connection.execute("CREATE TABLE waybills (waybill_ref TEXT PRIMARY KEY, username TEXT, status TEXT, data TEXT NOT NULL)")
+    connection.execute("CREATE INDEX waybills_status ON waybills (status)")
+    connection.execute("""INSERT INTO waybills VALUES ('REF1', 'Customer1', 'In Transit', '{"username": "Customer1"}')""")
+    connection.commit()
+    connection.close()
+
+    backend = SqliteBackend(db_path)
+    assert DataStore(backend).get("waybills")["REF1"]["username"] == "Customer1"
+    columns = [row[1] for row in sqlite3.connect(db_path).execute("PRAGMA table_info(waybills)")]
+    assert columns == ["waybill_ref", "username", "data"]
+
+
+def test_sqlite_rejects_write_based_on_old_version(tmp_path):
+    db_path = str(tmp_path / "ff.db")
+    worker_a = DataStore(SqliteBackend(db_path))
+    worker_b = DataStore(SqliteBackend(db_path))
+    worker_a.put("shipments", "REF1", {"username": "Customer1", "status": "Booked"})
+    worker_b.refresh()
+
+    worker_a.put("shipments", "REF1", {"username": "Customer1", "status": "In Transit"}, expected_version=1)
+    with pytest.raises(StaleRecordError):
+        worker_b.put("shipments", "REF1", {"username": "Customer1", "status": "Delivered"}, expected_version=1)
+    assert worker_b.get("shipments")["REF1"]["status"] == "In Transit"
+
+
+def test_sqlite_write_many_is_one_transaction(tmp_path):
+    db_path = str(tmp_path / "ff.db")
+    worker_a = DataStore(SqliteBackend(db_path))
+    worker_b = DataStore(SqliteBackend(db_path))
+    worker_a.put("pending_users", "ann", {"approved": "no"})
+    worker_a.put("pending_users", "bob", {"approved": "no"})
+    worker_b.refresh()
+    worker_a.delete("pending_users", "bob", expected_version=1)
+
+    changes = [("users", "ann", {"approved": "yes"}, 0), ("pending_users", "ann", None, 1),
+               ("users", "bob", {"approved": "yes"}, 0), ("pending_users", "bob", None, 1)]
+    with pytest.raises(StaleRecordError):
+        worker_b.write_many(changes)
+    worker_a.refresh()
+    assert worker_a.get("users") == {} and set(worker_a.get("pending_users")) == {"ann"}
+
+    worker_b.write_many(changes[:2])
+    worker_a.refresh()
+    assert set(worker_a.get("users")) == {"ann"} and worker_a.get("pending_users") == {}
@@ -0,0 +1,57 @@
+import hashlib
+import io
+
+import pytest
+
+from src.backends import CsvBackend
+from src.blobs import BlobStore, MissingBlobError, move_inline_documents
+from src.data_store import DataStore
+
+
+def test_documents_are_stored_once_by_content(tmp_path):
+    blobs = BlobStore(str(tmp_path / "documents"))
+    pdf = b"%PDF-1.7\n" + bytes(range(256)) * 5000
+
+    digest = blobs.put(io.BytesIO(pdf))
+    assert digest == hashlib.sha256(pdf).hexdigest()
+    assert blobs.put(pdf) == digest
+    stored = [path.relative_to(tmp_path / "documents") for path in (tmp_path / "documents").rglob("*") if path.is_file()]
+    assert [str(path) for path in stored] == [f"{digest[:2]}/{digest}"]
+
+    with blobs.map(digest) as mapped:
+        assert mapped[:4] == b"%PDF" and len(mapped) == len(pdf)
+    with blobs.open(digest) as file:
+        assert file.read() == pdf
+    assert blobs.content_type(digest) == "application/pdf"
+
+
+def test_unknown_or_malformed_digests_are_rejected(tmp_path):
+    blobs = BlobStore(str(tmp_path))
+    with pytest.raises(MissingBlobError):
+        blobs.open("0" * 64)
+    with pytest.raises(MissingBlobError):
+        blobs.open("../users.csv")
+    assert "../users.csv" not in blobs
+
+
+def test_inline_documents_move_to_the_store(tmp_path):
+    users_csv = tmp_path / "users.csv"
+    users_csv.write_text(
+        "username,business_name,approved,doc\n"
+        "admin,HQ,yes,b'admin_document'\n"
+        "bob,Bob Co,yes,b'\\x89PNG\\r\\n\\x1a\\n'\n"
+    )
+    store = DataStore(CsvBackend({"users": str(users_csv)}))
+    blobs = BlobStore(str(tmp_path / "documents"))
+
+    assert move_inline_documents(store, blobs, ["users"]) == 2
+    assert move_inline_documents(store, blobs, ["users"]) == 0
+    users = store.get("users")
+    assert "doc" not in users["admin"]
+    with blobs.open(users["admin"]["doc_sha256"]) as file:
+        assert file.read() == b"admin_document"
+    assert blobs.content_type(users["bob"]["doc_sha256"]) == "image/png"
+    assert "doc" not in users_csv.read_text().splitlines()[0].split(",")
+
+    reloaded = DataStore(CsvBackend({"users": str(users_csv)})).get("users")
+    assert reloaded["bob"]["doc_sha256"] == users["bob"]["doc_sha256"]
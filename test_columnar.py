@@ -0,0 +1,54 @@
+import datetime
+
+from src.backends import SqliteBackend
+from src.columnar import CATEGORY, NUMBER, TIMESTAMP, ColumnarTable
+from src.data_store import DataStore
+
+COLUMNS = {"username": CATEGORY, "status": CATEGORY, "goods_type": CATEGORY, "qty": NUMBER, "booked_on": TIMESTAMP}
+
+
+def shipment(username, goods_type, qty, booked_on, status="Booked"):
+    return {"username": username, "goods_type": goods_type, "qty": qty, "booked_on": booked_on, "status": status}
+
+
+def test_filters_and_totals():
+    table = ColumnarTable(COLUMNS)
+    table.rebuild({
+        "A": shipment("Customer1", "Wheat", 100, "2025-07-14 09:00:00"),
+        "B": shipment("Customer1", "Wheat", 50, "2025-07-14 18:00:00", status="In Transit"),
+        "C": shipment("Customer2", "Corn", 70, "2025-07-15 09:00:00", status="In Transit"),
+    })
+
+    assert table.keys(status="In Transit") == ["B", "C"]
+    assert table.keys(username="Customer1", status=["Booked", "In Transit"]) == ["A", "B"]
+    assert table.count(username="Customer3") == 0
+    totals = table.totals("qty", ["goods_type"], per_day="booked_on")
+    assert totals[("Wheat", datetime.datetime(2025, 7, 14))] == 150
+    assert totals[("Corn", datetime.datetime(2025, 7, 15))] == 70
+
+
+def test_changes_are_applied_in_batches():
+    table = ColumnarTable(COLUMNS)
+    table.rebuild({key: shipment("Customer1", "Wheat", 10, "2025-07-14 09:00:00") for key in "ABCD"})
+
+    table.add("A", shipment("Customer1", "Rye", 5, datetime.datetime(2025, 7, 16, 9, 0), status="Delivered"))
+    table.add("E", shipment("Customer2", "Corn", 20, "2025-07-16 09:00:00"))
+    table.remove("B")
+    assert sorted(table.keys()) == ["A", "C", "D", "E"]
+    assert table.keys(goods_type="Rye") == ["A"]
+    assert str(table.frame()["goods_type"].dtype) == "category"
+
+    # Compacts once half of the frame holds dead row versions
+    for key in "CDE":
+        table.remove(key)
+    assert table.keys() == ["A"] and len(table._frame) == 1
+
+
+def test_store_keeps_table_current(tmp_path):
+    store = DataStore(SqliteBackend(str(tmp_path / "ff.db")))
+    table = store.add_index("shipments", "table", ColumnarTable(COLUMNS))
+
+    store.put("shipments", "A", shipment("Customer1", "Wheat", 100, "2025-07-14 09:00:00"))
+    store.put("shipments", "B", shipment("Customer1", "Corn", 50, "2025-07-14 10:00:00"))
+    store.delete("shipments", "A")
+    assert table.keys(username="Customer1") == ["B"]
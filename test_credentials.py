@@ -0,0 +1,70 @@
+from src.backends import CsvBackend
+from src.credentials import Authenticator, hash_password, hash_plain_passwords, needs_rehash, verify_password
+from src.data_store import DataStore
+
+
+def make_store(tmp_path, password="secret"):
+    users_csv = tmp_path / "users.csv"
+    users_csv.write_text(f"username,business_name,approved,password\nbob,Bob Co,yes,{password}\ncarol,Carol Ltd,no,secret\n")
+    return DataStore(CsvBackend({"users": str(users_csv)}))
+
+
+def test_password_hashes_are_salted_and_verified():
+    first, second = hash_password("secret", 1000), hash_password("secret", 1000)
+    assert first != second and "secret" not in first
+    assert verify_password("secret", first) and verify_password("secret", second)
+    assert not verify_password("Secret", first)
+    assert needs_rehash(first, 2000) and not needs_rehash(first, 1000)
+    # Plain passwords from older versions no longer verify
+    assert not verify_password("secret", "secret") and needs_rehash("secret")
+    assert not verify_password("secret", None)
+
+
+def test_plain_passwords_are_hashed_in_one_write(tmp_path, monkeypatch):
+    store = make_store(tmp_path)
+    auth = Authenticator(store, iterations=1000)
+    assert auth.login("bob", "secret") is None
+
+    writes = []
+    write_many = store.write_many
+    monkeypatch.setattr(store, "write_many", lambda changes: writes.append(changes) or write_many(changes))
+    assert hash_plain_passwords(store, ["users"], iterations=1000) == 2
+    assert hash_plain_passwords(store, ["users"], iterations=1000) == 0
+    assert len(writes) == 1
+    assert "secret" not in (tmp_path / "users.csv").read_text()
+    # Pending (unapproved) users are hashed as well
+    assert store.get("users")["carol"]["password"].startswith("pbkdf2_sha256$1000$")
+
+    assert auth.login("bob", "wrong") is None
+    assert auth.login("carol", "secret") is None
+    assert auth.login("nobody", "secret") is None
+    row, token = auth.login("bob", "secret")
+    assert auth.user(token) is row
+
+
+def test_login_upgrades_weaker_hashes(tmp_path):
+    store = make_store(tmp_path, hash_password("secret", 500))
+    auth = Authenticator(store, iterations=1000)
+
+    row, token = auth.login("bob", "secret")
+    assert row["password"].startswith("pbkdf2_sha256$1000$")
+    assert auth.user(token) is row
+    assert auth.login("bob", "secret") is not None
+
+
+def test_sessions_skip_hashing_and_end_on_password_change(tmp_path, monkeypatch):
+    store = make_store(tmp_path, hash_password("secret", 1000))
+    auth = Authenticator(store, iterations=1000)
+    _, token = auth.login("bob", "secret")
+    changed = store.get("users")["bob"].copy()
+    changed["password"] = hash_password("new", 1000)
+
+    calls = []
+    monkeypatch.setattr("src.credentials.hashlib.pbkdf2_hmac", lambda *args: calls.append(args))
+    assert auth.user(token)["username"] == "bob"
+    assert calls == []
+    assert auth.user("forged") is None
+
+    store.put("users", "bob", changed)
+    assert auth.user(token) is None
+
@@ -0,0 +1,225 @@
+import os
+
+import pytest
+
+from src.backends import PERSIST_JOURNAL, CsvBackend
+from src.data_store import DataStore, StaleRecordError, load_data_from_csv
+from src.schema import SCHEMAS, MissingKeyColumnError, UnreadableDataError
+
+
+def write_users(path, rows):
+    lines = ["username,business_name,approved"]
+    lines += [f"{u},{b},{a}" for u, b, a in rows]
+    path.write_text("\n".join(lines) + "\n")
+
+
+def test_store_shares_one_dict_per_dataset(tmp_path):
+    users_csv = tmp_path / "users.csv"
+    write_users(users_csv, [("admin", "HQ", "yes")])
+    store = DataStore(CsvBackend({"users": str(users_csv)}))
+
+    assert store.get("users") is store.get("users")
+    assert store.get("users")["admin"]["business_name"] == "HQ"
+
+
+def test_refresh_reloads_only_when_file_changes(tmp_path):
+    users_csv = tmp_path / "users.csv"
+    write_users(users_csv, [("admin", "HQ", "yes")])
+    store = DataStore(CsvBackend({"users": str(users_csv)}))
+    users = store.get("users")
+
+    # Our own save must not trigger a reload
+    users["bob"] = {"username": "bob", "business_name": "Bob Co", "approved": "no"}
+    store.save("users")
+    users["bob"]["approved"] = "yes"
+    store.refresh()
+    assert users["bob"]["approved"] == "yes"
+
+    # A write from somewhere else is picked up, in the same dict object
+    write_users(users_csv, [("admin", "HQ", "yes"), ("carol", "Carol Ltd", "yes")])
+    stat = os.stat(users_csv)
+    os.utime(users_csv, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000))
+    store.refresh()
+    assert store.get("users") is users
+    assert set(users) == {"admin", "carol"}
+
+
+def test_loader_applies_dataset_dtypes(tmp_path):
+    shipments_csv = tmp_path / "shipments.csv"
+    shipments_csv.write_text(
+        "waybill_ref,username,goods_type,qty,charge,extra\n"
+        "REF1,Customer1,Wheat,450,4455.0,ignored\n"
+    )
+    rows = load_data_from_csv(str(shipments_csv), schema=SCHEMAS["shipments"])
+
+    assert rows["REF1"] == {
+        "waybill_ref": "REF1", "username": "Customer1", "goods_type": "Wheat", "qty": 450, "charge": 4455.0,
+    }
+    assert type(rows["REF1"]["qty"]) is int
+
+
+def test_shipments_are_keyed_by_ref_and_survive_a_reload(tmp_path):
+    paths = {"shipments": str(tmp_path / "shipments.csv")}
+    store = DataStore(CsvBackend(paths))
+    store.put("shipments", "REF1", {"username": "Customer1", "booked_on": "2025-07-14 09:00:00"})
+    store.put("shipments", "REF2", {"username": "Customer1", "booked_on": "2025-07-15 09:00:00"})
+
+    reloaded = DataStore(CsvBackend(paths)).get("shipments")
+    assert set(reloaded) == {"REF1", "REF2"}
+    assert reloaded["REF2"]["waybill_ref"] == "REF2"
+
+
+def test_versions_and_whole_numbers_are_written_as_integers(tmp_path):
+    shipments_csv = tmp_path / "shipments.csv"
+    shipments_csv.write_text("waybill_ref,username,qty,charge\nOLD,Customer1,450,4455.0\nBLANK,Customer1,,\n")
+    store = DataStore(CsvBackend({"shipments": str(shipments_csv)}))
+    store.put("shipments", "NEW", {"username": "Customer2", "qty": 300, "charge": 2970.0})
+
+    lines = shipments_csv.read_text().splitlines()
+    assert lines == [
+        "waybill_ref,username,qty,charge,version",
+        "OLD,Customer1,450,4455.0,",
+        "BLANK,Customer1,,,",
+        "NEW,Customer2,300,2970.0,1",
+    ]
+
+
+def test_loader_keeps_last_row_for_duplicate_keys(tmp_path):
+    users_csv = tmp_path / "users.csv"
+    users_csv.write_text("username,approved\nbob,no\nbob,yes\n")
+    assert load_data_from_csv(str(users_csv), schema=SCHEMAS["users"]) == {"bob": {"username": "bob", "approved": "yes"}}
+
+
+def test_loader_rejects_file_without_key_column(tmp_path):
+    shipments_csv = tmp_path / "shipments.csv"
+    shipments_csv.write_text("username,qty\nCustomer1,450\n")
+    with pytest.raises(MissingKeyColumnError):
+        load_data_from_csv(str(shipments_csv), schema=SCHEMAS["shipments"])
+
+
+def test_loader_reads_bad_numbers_as_missing(tmp_path):
+    shipments_csv = tmp_path / "shipments.csv"
+    shipments_csv.write_text(
+        "waybill_ref,qty,charge,version\n"
+        "REF1,450,4455.0,2\n"
+        "REF2,,n/a,\n"
+        "REF3,12.5,10,\n"
+    )
+    rows = load_data_from_csv(str(shipments_csv), schema=SCHEMAS["shipments"])
+
+    assert rows["REF1"]["qty"] == 450 and type(rows["REF1"]["qty"]) is int and rows["REF1"]["version"] == 2
+    assert rows["REF2"]["qty"] is None and rows["REF2"]["charge"] != rows["REF2"]["charge"]
+    assert rows["REF3"]["qty"] is None and rows["REF3"]["version"] == 0
+
+
+def test_unreadable_file_is_never_overwritten(tmp_path):
+    shipments_csv = tmp_path / "shipments.csv"
+    shipments_csv.write_text("username,qty\nCustomer1,450\nCustomer2,550\n")
+    store = DataStore(CsvBackend({"shipments": str(shipments_csv)}))
+
+    assert not store.readable("shipments")
+    with pytest.raises(UnreadableDataError):
+        store.put("shipments", "REF1", {"username": "Customer1", "qty": 10})
+    with pytest.raises(UnreadableDataError):
+        store.save("shipments")
+    assert shipments_csv.read_text() == "username,qty\nCustomer1,450\nCustomer2,550\n"
+
+    # Once the file is fixed it loads again on refresh and can be written
+    shipments_csv.write_text("waybill_ref,username,qty\nREF1,Customer1,450\nREF2,Customer2,550\n")
+    store.refresh()
+    store.put("shipments", "REF3", {"username": "Customer1", "qty": 10})
+    assert set(DataStore(CsvBackend({"shipments": str(shipments_csv)})).get("shipments")) == {"REF1", "REF2", "REF3"}
+
+
+def test_loader_encodes_doc_column(tmp_path):
+    users_csv = tmp_path / "users.csv"
+    users_csv.write_text("username,doc\nadmin,admin_document\nbob,\n")
+    users = load_data_from_csv(str(users_csv), schema=SCHEMAS["users"])
+
+    assert users["admin"]["doc"] == b"admin_document"
+    assert users["bob"]["doc"] == b""
+
+
+def test_put_rejects_stale_version(tmp_path):
+    store = DataStore(CsvBackend({"users": str(tmp_path / "users.csv")}))
+    store.put("users", "bob", {"approved": "no"}, expected_version=0)
+    assert store.get("users")["bob"]["version"] == 1
+
+    store.put("users", "bob", {"approved": "yes"}, expected_version=1)
+    with pytest.raises(StaleRecordError):
+        store.put("users", "bob", {"approved": "no"}, expected_version=1)
+    with pytest.raises(StaleRecordError):
+        store.delete("users", "bob", expected_version=1)
+    assert store.get("users")["bob"]["approved"] == "yes"
+
+
+
+def test_failed_write_raises_and_keeps_memory_and_file_in_step(tmp_path, monkeypatch):
+    users_csv = tmp_path / "users.csv"
+    write_users(users_csv, [("bob", "Bob Co", "yes")])
+    store = DataStore(CsvBackend({"users": str(users_csv)}))
+    before = users_csv.read_bytes()
+
+    def fail(file_path, write):
+        raise OSError("disk full")
+    monkeypatch.setattr("src.data_store.atomic_write", fail)
+    with pytest.raises(OSError):
+        store.put("users", "carol", {"approved": "yes"})
+    with pytest.raises(OSError):
+        store.write_many([("users", "bob", None, None)])
+
+    assert users_csv.read_bytes() == before
+    assert set(store.get("users")) == {"bob"}
+    monkeypatch.undo()
+    store.put("users", "carol", {"approved": "yes"})
+    assert set(load_data_from_csv(str(users_csv), schema=SCHEMAS["users"])) == {"bob", "carol"}
+
+@pytest.mark.parametrize("persistence", ["csv", PERSIST_JOURNAL])
+def test_processes_sharing_files_reject_stale_writes(tmp_path, persistence):
+    paths = {"users": str(tmp_path / "users.csv")}
+    first = DataStore(CsvBackend(paths, persistence=persistence))
+    second = DataStore(CsvBackend(paths, persistence=persistence))
+    first.put("users", "bob", {"approved": "no"})
+    second.refresh()
+
+    first.put("users", "bob", {"approved": "yes"}, expected_version=1)
+    # second still holds version 1, but the files are at version 2
+    with pytest.raises(StaleRecordError):
+        second.put("users", "bob", {"approved": "rejected"}, expected_version=1)
+    assert second.get("users")["bob"]["approved"] == "yes"
+
+    # Writes to other rows are applied on top of the other process's changes
+    first.put("users", "carol", {"approved": "no"})
+    second.put("users", "dave", {"approved": "no"}, expected_version=0)
+    second.refresh()
+    assert set(second.get("users")) == {"bob", "carol", "dave"}
+    assert second.get("users")["bob"]["approved"] == "yes"
+
+
+@pytest.mark.parametrize("persistence", ["csv", PERSIST_JOURNAL])
+def test_write_many_checks_every_version_before_writing(tmp_path, persistence):
+    paths = {"users": str(tmp_path / "users.csv"), "pending_users": str(tmp_path / "pending.csv")}
+    store = DataStore(CsvBackend(paths, persistence=persistence))
+    for name in ["ann", "bob", "cid"]:
+        store.put("pending_users", name, {"approved": "no"})
+    other = DataStore(CsvBackend(paths, persistence=persistence))
+    other.put("pending_users", "cid", {"approved": "no", "email": "changed"}, expected_version=1)
+
+    def approve(names):
+        return [
+            change
+            for name in names
+            for change in [("users", name, {"approved": "yes"}, 0), ("pending_users", name, None, 1)]
+        ]
+
+    # cid was changed in the other store: nothing is written
+    with pytest.raises(StaleRecordError):
+        store.write_many(approve(["ann", "bob", "cid"]))
+    assert set(store.get("pending_users")) == {"ann", "bob", "cid"}
+    assert store.get("users") == {}
+
+    store.write_many(approve(["ann", "bob"]))
+    other.refresh()
+    assert set(other.get("users")) == {"ann", "bob"}
+    assert set(other.get("pending_users")) == {"cid"}
+    assert other.get("users")["ann"]["version"] == 1
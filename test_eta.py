@@ -0,0 +1,81 @@
+import datetime
+
+import pandas as pd
+import pytest
+
+from src.backends import CsvBackend
+from src.data_store import DataStore
+from src.eta import EtaEngine, LaneStats
+from src.inventory import TrainService
+from src.rates import RailNetwork
+from src.tracking import EventLog, TrackingTimeline
+
+TRAIN = TrainService("A", "Train A", "Covered Hopper", 10, 100.0, "09:00")
+NETWORK = RailNetwork({"QUE": "Quebec, QC", "MTL": "Montreal, QC", "VAN": "Vancouver, BC"}, [("QUE", "MTL", 400)])
+SHIPMENT = {"origin": "Quebec, QC", "destination": "Montreal, QC", "option": TRAIN.label, "dispatch_date": "2025-07-14"}
+
+
+def test_lane_stats_match_batch_mean_and_stdev():
+    stats = LaneStats()
+    for hours in [10, 12, 17, 21]:
+        stats.add(hours)
+    assert stats.count == 4
+    assert stats.mean == pytest.approx(15.0)
+    assert stats.stdev == pytest.approx(pd.Series([10, 12, 17, 21]).std())
+
+
+def test_estimate_moves_from_distance_to_observed_transit_times():
+    engine = EtaEngine(NETWORK, [TRAIN], speed_kmh=50, handling_hours=4, prior_weight=1)
+    departure = datetime.datetime(2025, 7, 14, 9, 0)
+    assert engine.estimate(SHIPMENT) == (departure, departure + datetime.timedelta(hours=12))
+
+    engine.observe(SHIPMENT, departure + datetime.timedelta(hours=20))
+    assert engine.estimate(SHIPMENT)[1] == departure + datetime.timedelta(hours=16)
+    assert engine.estimate({**SHIPMENT, "destination": "Vancouver, BC"}) == (departure, None)
+
+
+def test_implausible_transit_times_are_not_learned():
+    engine = EtaEngine(NETWORK, [TRAIN], speed_kmh=50, handling_hours=4)
+    departure = datetime.datetime(2025, 7, 14, 9, 0)
+    # Marked delivered more than a year after departure, or an hour after it
+    assert engine.observe(SHIPMENT, departure + datetime.timedelta(hours=11000)) is None
+    assert engine.observe(SHIPMENT, departure + datetime.timedelta(hours=1)) is None
+    assert engine.estimate(SHIPMENT)[1] == departure + datetime.timedelta(hours=12)
+    assert engine.observe(SHIPMENT, departure + datetime.timedelta(hours=30)) == 30
+
+
+def test_predict_matches_estimate_for_every_shipment():
+    engine = EtaEngine(NETWORK, [TRAIN], speed_kmh=50, handling_hours=4)
+    engine.observe(SHIPMENT, datetime.datetime(2025, 7, 15, 9, 0))
+    shipments = pd.DataFrame(
+        [
+            SHIPMENT,
+            {**SHIPMENT, "option": "Unknown train", "dispatch_date": "2025-07-20"},
+            {**SHIPMENT, "destination": "Vancouver, BC"},
+            {**SHIPMENT, "dispatch_date": None, "booked_on": pd.Timestamp("2025-07-01 12:00")},
+        ],
+        index=["R1", "R2", "R3", "R4"],
+    )
+    assert engine.stale
+    etas = engine.predict(shipments)
+    assert not engine.stale
+    for ref, row in shipments.iterrows():
+        expected = engine.estimate(row.to_dict())[1]
+        assert (pd.isna(etas[ref]) and expected is None) or etas[ref] == expected
+
+
+def test_follow_learns_from_delivered_waybills_and_new_deliveries(tmp_path):
+    store = DataStore(CsvBackend({"waybills": str(tmp_path / "waybills.csv")}))
+    delivered = datetime.datetime(2025, 7, 15, 9, 0)
+    store.put("waybills", "R1", {"username": "C1", "status": "Delivered", "details": SHIPMENT,
+                                 "tracking": [{"status": "Delivered", "time": delivered}]})
+    store.put("waybills", "R2", {"username": "C1", "status": "In Transit", "details": SHIPMENT, "tracking": []})
+    timeline = store.add_index("waybills", "tracking", TrackingTimeline(EventLog(str(tmp_path / "events.jsonl"))))
+    engine = EtaEngine(NETWORK, [TRAIN])
+
+    engine.follow(timeline, store.get("waybills"))
+    lane = engine.lanes[("QUE", "MTL")]
+    assert (lane.count, lane.mean) == (1, 24.0)
+
+    timeline.record("R2", "Delivered", time=delivered + datetime.timedelta(hours=12))
+    assert (lane.count, lane.mean) == (2, 30.0)
@@ -0,0 +1,32 @@
+from src.backends import SqliteBackend
+from src.data_store import DataStore
+from src.indexes import SortedGroupIndex
+
+
+def shipment(username, booked_on):
+    return {"username": username, "booked_on": booked_on, "status": "Booked"}
+
+
+def test_pages_are_sorted_newest_first():
+    index = SortedGroupIndex("username", "booked_on")
+    index.rebuild({f"REF{i}": shipment("Customer1", f"2025-07-{10 + i:02d} 09:00:00") for i in range(5)})
+    index.add("OTHER", shipment("Customer2", "2025-07-30 09:00:00"))
+
+    assert index.count("Customer1") == 5
+    assert index.page("Customer1", 0, 2) == ["REF4", "REF3"]
+    assert index.page("Customer1", 2, 2) == ["REF0"]
+    assert index.page("Customer1", 0, 2, newest_first=False) == ["REF0", "REF1"]
+    assert index.page("Customer3", 0, 2) == []
+
+
+def test_store_keeps_index_current(tmp_path):
+    store = DataStore(SqliteBackend(str(tmp_path / "ff.db")))
+    by_user = store.add_index("shipments", "by_user", SortedGroupIndex("username", "booked_on"))
+
+    store.put("shipments", "A", shipment("Customer1", "2025-07-14 09:00:00"))
+    store.put("shipments", "B", shipment("Customer1", "2025-07-15 09:00:00"))
+    store.put("shipments", "A", dict(shipment("Customer1", "2025-07-14 09:00:00"), status="Delivered"))
+    assert by_user.page("Customer1", 0, 10) == ["B", "A"]
+
+    store.delete("shipments", "B")
+    assert by_user.page("Customer1", 0, 10) == ["A"]
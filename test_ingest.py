@@ -0,0 +1,90 @@
+import datetime
+import json
+import socket
+import threading
+
+from src.backends import CsvBackend
+from src.data_store import DataStore
+from src.ingest import EventIngestor, main, read_csv, read_jsonl, read_socket
+from src.serialization import loads_row
+from src.tracking import EventLog, TrackingTimeline
+
+
+def make_timeline(tmp_path, refs=("REF1", "REF2")):
+    store = DataStore(CsvBackend({"waybills": str(tmp_path / "waybills.csv")}))
+    for ref in refs:
+        store.put("waybills", ref, {"username": "Customer1", "status": "In Transit", "tracking": []})
+    return store, store.add_index("waybills", "tracking", TrackingTimeline(EventLog(str(tmp_path / "events.jsonl"))))
+
+
+def test_files_are_applied_in_batches_and_bad_records_dead_lettered(tmp_path):
+    store, timeline = make_timeline(tmp_path)
+    jsonl = tmp_path / "gps.jsonl"
+    jsonl.write_text(
+        json.dumps({"ref": "REF1", "status": "At Yard", "time": "2025-07-14T09:00:00", "location": "Windsor"}) + "\n"
+        + "not json\n"
+        + json.dumps({"ref": "REF9", "status": "At Yard"}) + "\n"
+    )
+    scans = tmp_path / "scans.csv"
+    scans.write_text(
+        "waybill_ref,status,time,eta\n"
+        "REF1,Delivered,2025-07-14T18:00:00,2025-07-14T18:00:00\n"
+        "REF2,In Transit,yesterday,\n"
+        "REF2,Departed,,2025-07-15T06:00:00\n"
+    )
+    dead_letter = tmp_path / "dead.jsonl"
+    ingestor = EventIngestor(timeline, str(dead_letter), batch_size=2, flush_interval=10)
+    stats = ingestor.run(iter([*read_jsonl(str(jsonl)), *read_csv(str(scans))]))
+
+    assert (stats.received, stats.applied, stats.dead_letters, stats.batches) == (6, 3, 3, 3)
+    assert timeline.status("REF1") == "Delivered"
+    assert timeline.eta("REF1") == datetime.datetime(2025, 7, 14, 18, 0)
+    assert timeline.status("REF2") == "Departed"
+    assert timeline.eta("REF2") == datetime.datetime(2025, 7, 15, 6, 0)
+    errors = [loads_row(line)["error"] for line in dead_letter.read_text().splitlines()]
+    assert errors[0].startswith("not JSON") and errors[1] == "unknown waybill: REF9" and errors[2].startswith("bad time")
+
+
+def test_slow_consumer_pushes_back_on_reader(tmp_path):
+    store, timeline = make_timeline(tmp_path)
+    events = (json.dumps({"ref": "REF1", "status": f"Scan {n}"}) for n in range(200))
+    stats = EventIngestor(timeline, batch_size=10, queue_size=5).run(events)
+    assert stats.applied == 200
+    assert stats.backpressure_waits > 0
+    assert timeline.status("REF1") == "Scan 199"
+
+
+def test_socket_feed(tmp_path):
+    store, timeline = make_timeline(tmp_path)
+    stop = threading.Event()
+    listening = threading.Event()
+    address = []
+
+    def on_listen(bound):
+        address.append(bound)
+        listening.set()
+
+    def feed():
+        listening.wait()
+        with socket.create_connection(address[0]) as connection:
+            connection.sendall(b'{"ref": "REF1", "status": "At Yard"}\n{"ref": "REF2", ')
+            connection.sendall(b'"status": "Delivered"}')
+        while timeline.status("REF2") != "Delivered":
+            threading.Event().wait(0.05)
+        stop.set()
+
+    threading.Thread(target=feed, daemon=True).start()
+    source = read_socket("127.0.0.1", 0, stop, on_listen=on_listen)
+    stats = EventIngestor(timeline, flush_interval=0.05).run(source)
+    assert stats.applied == 2
+    assert timeline.status("REF1") == "At Yard"
+
+
+def test_command_line_ingests_files(tmp_path, capsys):
+    make_timeline(tmp_path)
+    events = tmp_path / "gps.jsonl"
+    events.write_text(json.dumps({"ref": "REF1", "status": "Delivered"}) + "\n")
+    main([str(events), "--waybills", str(tmp_path / "waybills.csv"), "--events", str(tmp_path / "events.jsonl"),
+          "--dead-letter", str(tmp_path / "dead.jsonl")])
+    assert "1 applied, 0 dead-lettered of 1 received" in capsys.readouterr().out
+    assert loads_row((tmp_path / "events.jsonl").read_text())["status"] == "Delivered"
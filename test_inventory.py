@@ -0,0 +1,76 @@
+import datetime
+import threading
+
+import pytest
+
+from src.backends import SqliteBackend
+from src.data_store import DataStore
+from src.inventory import CapacityError, CapacityInventory, TrainService, load_trains
+
+TRAIN = TrainService("A", "Train A", "Covered Hopper", 10, 100.0, "09:00")
+
+
+def test_departure_on_a_day():
+    assert TRAIN.departure_on("2025-07-14") == datetime.datetime(2025, 7, 14, 9, 0)
+    assert TRAIN.departure_on(datetime.date(2025, 7, 14)) == datetime.datetime(2025, 7, 14, 9, 0)
+
+
+def test_reserve_and_release():
+    inventory = CapacityInventory([TRAIN])
+
+    inventory.reserve("A", "2025-07-14", 250, key="REF1")
+    assert inventory.remaining("A", "2025-07-14") == (7, 750)
+    assert inventory.remaining("A", "2025-07-15") == (10, 1000)
+    with pytest.raises(CapacityError):
+        inventory.reserve("A", "2025-07-14", 800, key="REF2")
+    assert inventory.remaining("A", "2025-07-14") == (7, 750)
+
+    inventory.release("REF1")
+    inventory.release("REF1")
+    assert inventory.remaining("A", "2025-07-14") == (10, 1000)
+
+
+def test_concurrent_reservations_never_overbook():
+    inventory = CapacityInventory([TRAIN], stripes=4)
+    booked = []
+
+    def book(worker):
+        for i in range(20):
+            try:
+                inventory.reserve("A", "2025-07-14", 100, key=f"{worker}-{i}")
+                booked.append(1)
+            except CapacityError:
+                pass
+
+    threads = [threading.Thread(target=book, args=(worker,)) for worker in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(booked) == 10
+    assert inventory.remaining("A", "2025-07-14") == (0, 0)
+
+
+def test_store_bookings_count_once(tmp_path):
+    store = DataStore(SqliteBackend(str(tmp_path / "ff.db")))
+    inventory = store.add_index("shipments", "capacity", CapacityInventory([TRAIN]))
+    shipment = {"option": TRAIN.label, "dispatch_date": "2025-07-14", "qty": 150, "status": "Booked"}
+
+    # Reserved at booking, then stored: counted once
+    inventory.reserve("A", "2025-07-14", 150, key="REF1")
+    store.put("shipments", "REF1", dict(shipment))
+    # Stored without a reservation (e.g. by another process): counted as well
+    store.put("shipments", "REF2", dict(shipment, qty=50))
+    assert inventory.remaining("A", "2025-07-14") == (7, 800)
+
+    store.put("shipments", "REF1", dict(shipment, status="Delivered"))
+    store.delete("shipments", "REF2")
+    assert inventory.remaining("A", "2025-07-14") == (8, 850)
+
+    inventory.rebuild(store.get("shipments"))
+    assert inventory.remaining("A", "2025-07-14") == (8, 850)
+
+
+def test_shipped_trains_match_booking_labels():
+    labels = [train.label for train in load_trains("data/trains.csv")]
+    assert "Train A (Covered Hopper x25, departs 09:00)" in labels
@@ -0,0 +1,60 @@
+import datetime
+
+import pytest
+
+from src.backends import PERSIST_JOURNAL, CsvBackend
+from src.data_store import DataStore
+from src.journal import Journal, read_records
+
+
+def test_journal_round_trips_datetimes_and_bytes(tmp_path):
+    journal = Journal(str(tmp_path / "w.journal"))
+    when = datetime.datetime(2025, 7, 14, 15, 46, 8)
+    journal.append("put", "REF1", {"tracking": [{"status": "Booked", "time": when}], "doc": b"\x00pdf"})
+    journal.append("delete", "REF0")
+    journal.close()
+
+    records = list(read_records(str(tmp_path / "w.journal")))
+    assert records[0]["value"] == {"tracking": [{"status": "Booked", "time": when}], "doc": b"\x00pdf"}
+    assert records[1] == {"op": "delete", "key": "REF0"}
+
+
+def test_read_records_stops_at_torn_line(tmp_path):
+    path = tmp_path / "w.journal"
+    path.write_text('{"op": "delete", "key": "A"}\n{"op": "put", "key": "B", "val')
+    assert [r["key"] for r in read_records(str(path))] == ["A"]
+
+
+def test_journal_mode_replays_snapshot_and_tail(tmp_path):
+    users_csv = str(tmp_path / "users.csv")
+    store = DataStore(CsvBackend({"users": users_csv}, persistence=PERSIST_JOURNAL))
+    store.put("users", "admin", {"username": "admin", "approved": "yes"})
+    store.put("users", "bob", {"username": "bob", "approved": "no"})
+    store.save("users")  # compacts into the snapshot
+    store.delete("users", "bob")
+    store.put("users", "carol", {"username": "carol", "approved": "yes"})
+
+    reloaded = DataStore(CsvBackend({"users": users_csv}, persistence=PERSIST_JOURNAL))
+    assert set(reloaded.get("users")) == {"admin", "carol"}
+    assert len(list(read_records(users_csv + ".journal"))) == 2
+
+
+def test_failed_compaction_keeps_the_journal(tmp_path, monkeypatch):
+    users_csv = str(tmp_path / "users.csv")
+    store = DataStore(CsvBackend({"users": users_csv}, persistence=PERSIST_JOURNAL))
+    store.put("users", "admin", {"username": "admin", "approved": "yes"})
+    store.put("users", "bob", {"username": "bob", "approved": "no"})
+
+    def fail(file_path, write):
+        raise OSError("disk full")
+    monkeypatch.setattr("src.data_store.atomic_write", fail)
+    with pytest.raises(OSError):
+        store.save("users")
+    store.put("users", "carol", {"username": "carol", "approved": "yes"})
+
+    reloaded = DataStore(CsvBackend({"users": users_csv}, persistence=PERSIST_JOURNAL))
+    assert set(reloaded.get("users")) == {"admin", "bob", "carol"}
+    monkeypatch.undo()
+    store.save("users")
+    reloaded = DataStore(CsvBackend({"users": users_csv}, persistence=PERSIST_JOURNAL))
+    assert set(reloaded.get("users")) == {"admin", "bob", "carol"}
@@ -0,0 +1,31 @@
+import os
+import threading
+import time
+
+from src.locks import FileLock, atomic_write
+
+
+def test_atomic_write_replaces_file_and_leaves_no_temp_file(tmp_path):
+    path = tmp_path / "users.csv"
+    path.write_text("old\n")
+    atomic_write(str(path), lambda tmp: open(tmp, "w").write("new\n"))
+    assert path.read_text() == "new\n"
+    assert os.listdir(tmp_path) == ["users.csv"]
+
+
+def test_file_lock_is_exclusive(tmp_path):
+    lock_path = str(tmp_path / "users.csv.lock")
+    first, second = FileLock(lock_path), FileLock(lock_path)
+    events = []
+
+    def hold():
+        with second:
+            events.append("second")
+
+    with first:
+        thread = threading.Thread(target=hold)
+        thread.start()
+        time.sleep(0.1)
+        events.append("first")
+    thread.join()
+    assert events == ["first", "second"]
@@ -0,0 +1,77 @@
+import time
+
+import pytest
+
+from src.otp import AsyncSender, FileDelivery, OtpDeliveryError, OtpRateLimitError, OtpService
+
+
+class Outbox:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, contact, code):
+        self.sent.append((contact, code))
+
+
+def test_codes_verify_once_with_limited_attempts():
+    outbox = Outbox()
+    otp = OtpService(outbox, max_attempts=2)
+    code = otp.issue(" Bob@Example.com ")
+    assert outbox.sent == [("bob@example.com", code)] and len(code) == 6
+
+    assert not otp.verify("bob@example.com", "x")
+    assert otp.verify("BOB@example.com", code)
+    assert not otp.verify("bob@example.com", code)
+
+    code = otp.issue("carol@example.com")
+    assert not otp.verify("carol@example.com", "wrong")
+    assert not otp.verify("carol@example.com", "wrong")
+    # Out of attempts: even the right code no longer works
+    assert not otp.verify("carol@example.com", code)
+
+
+def test_codes_expire_and_requests_are_rate_limited(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr("src.otp.time.monotonic", lambda: now[0])
+    otp = OtpService(Outbox(), ttl=300, burst=2, refill_seconds=60)
+
+    otp.issue("bob")
+    code = otp.issue("bob")
+    with pytest.raises(OtpRateLimitError) as raised:
+        otp.issue("bob")
+    assert raised.value.retry_after == pytest.approx(60)
+    # Other contacts have their own bucket
+    otp.issue("carol")
+
+    now[0] += 60
+    otp.issue("bob")
+    assert not otp.verify("bob", code)
+
+    code = otp.issue("carol")
+    now[0] += 301
+    assert not otp.verify("carol", code)
+    assert not otp._codes and not otp._buckets
+
+
+def test_async_sender_delivers_in_the_background(tmp_path):
+    outbox = tmp_path / "outbox.log"
+    sender = AsyncSender(FileDelivery(str(outbox)))
+    otp = OtpService(sender)
+    codes = [otp.issue(f"user{i}@example.com") for i in range(3)]
+    sender.flush()
+    lines = [line.split("\t")[1:] for line in outbox.read_text().splitlines()]
+    assert lines == [[f"user{i}@example.com", code] for i, code in enumerate(codes)]
+
+    def slow(contact, code):
+        time.sleep(0.2)
+
+    sender = AsyncSender(slow, queue_size=2)
+    otp = OtpService(sender)
+    started = time.monotonic()
+    otp.issue("a")
+    otp.issue("b")
+    assert time.monotonic() - started < 0.1
+    with pytest.raises(OtpDeliveryError):
+        for contact in "cdef":
+            otp.issue(contact)
+    sender.flush()
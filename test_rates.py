@@ -0,0 +1,85 @@
+import io
+
+import pandas as pd
+import pytest
+
+from src.rates import (
+    NoRateError,
+    NoRouteError,
+    RailNetwork,
+    RateEngine,
+    RateTable,
+    UnknownStationError,
+    load_rate_engine,
+    quote_batch,
+)
+
+STATIONS = {"QUE": "Quebec, QC", "MTL": "Montreal, QC", "TOR": "Toronto, ON", "WDR": "Windsor, ON", "HFX": "Halifax, NS"}
+SEGMENTS = [("QUE", "MTL", 250), ("MTL", "TOR", 540), ("TOR", "WDR", 370), ("QUE", "WDR", 1500)]
+
+
+def test_shortest_distance_and_name_lookup():
+    network = RailNetwork(STATIONS, SEGMENTS)
+
+    assert network.distance("QUE", "WDR") == 1160
+    assert network.distance("windsor on", "Quebec, QC") == 1160
+    assert network.distance("MTL", "MTL") == 0
+    with pytest.raises(NoRouteError):
+        network.distance("QUE", "HFX")
+    with pytest.raises(UnknownStationError):
+        network.distance("QUE", "Atlantis")
+
+
+def test_rate_table_fallbacks():
+    rates = RateTable({("Wheat", "Boxcar"): 0.13, ("Wheat", "*"): 0.12, ("*", "*"): 0.11})
+
+    assert rates.rate("Wheat", "Boxcar") == 0.13
+    assert rates.rate("Wheat", "Covered Hopper") == 0.12
+    assert rates.rate("Corn", "Boxcar") == 0.11
+    with pytest.raises(NoRateError):
+        RateTable({}).rate("Wheat", "Boxcar")
+
+
+def test_quote_charge():
+    engine = RateEngine(RailNetwork(STATIONS, SEGMENTS), RateTable({("Wheat", "Boxcar"): 0.1}))
+    quote = engine.quote("Quebec, QC", "Windsor, ON", "Wheat", 500, "Boxcar")
+
+    assert (quote.origin_id, quote.destination_id, quote.dist_km) == ("QUE", "WDR", 1160)
+    assert quote.charge == pytest.approx(500 * 1160 * 0.1)
+
+
+def test_shipped_network_quotes_the_default_route():
+    engine = load_rate_engine("data/stations.csv", "data/rail_segments.csv", "data/rates.csv")
+    engine.network.precompute()
+
+    quote = engine.quote("Quebec, QC", "Windsor, ON", "Wheat", 450, "Covered Hopper")
+    assert 1000 < quote.dist_km < 1300
+    assert quote.charge == pytest.approx(450 * quote.dist_km * quote.rate_per_ton_km)
+
+
+def test_batch_quotes_match_single_quotes():
+    engine = RateEngine(RailNetwork(STATIONS, SEGMENTS), RateTable({("Wheat", "Boxcar"): 0.1, ("*", "*"): 0.2}))
+    inquiries = pd.DataFrame({
+        "origin": ["Quebec, QC", "MTL", "Atlantis", "QUE", None],
+        "destination": ["Windsor, ON", "TOR", "WDR", "HFX", "WDR"],
+        "goods_type": ["Wheat", "Corn", "Wheat", "Wheat", "Wheat"],
+        "qty": [500, 20, 1, 1, 1],
+        "wagon_class": ["Boxcar", "Boxcar", "Boxcar", None, "Boxcar"],
+    })
+    quotes = quote_batch(engine, inquiries)
+
+    assert quotes["charge"][0] == pytest.approx(engine.quote("QUE", "WDR", "Wheat", 500, "Boxcar").charge)
+    assert quotes["charge"][1] == pytest.approx(20 * 540 * 0.2)
+    assert quotes["error"][:2].isna().all()
+    assert quotes["error"][2] == "unknown station: Atlantis"
+    assert quotes["error"][3] == "no rail route"
+    assert quotes["error"][4] == "missing origin"
+    assert quotes["charge"][2:].isna().all()
+
+
+def test_batch_quotes_from_csv():
+    engine = RateEngine(RailNetwork(STATIONS, SEGMENTS), RateTable({("*", "*"): 0.1}))
+    quotes = quote_batch(engine, io.StringIO("origin,destination,goods_type,qty\nQUE,MTL,Wheat,10\n"))
+    assert quotes["dist_km"].tolist() == [250]
+    with pytest.raises(ValueError):
+        quote_batch(engine, io.StringIO("origin,qty\nQUE,10\n"))
@@ -0,0 +1,75 @@
+import datetime
+import os
+import subprocess
+import sys
+
+from src.data_store import load_data_from_csv, save_data_to_csv
+from src.records import ShipmentRecord, TrackingEvent, WaybillRecord
+from src.schema import SCHEMAS
+from src.serialization import dumps_row, loads_row
+
+
+def test_records_behave_like_dicts():
+    row = ShipmentRecord.coerce({"waybill_ref": "REF1", "username": "Customer1", "qty": 450, "note": "fragile"})
+
+    assert row["qty"] == 450 and row.get("status") is None and "status" not in row
+    assert row["note"] == "fragile"
+    row["status"] = "Booked"
+    del row["note"]
+    assert row == {"waybill_ref": "REF1", "username": "Customer1", "qty": 450, "status": "Booked"}
+    assert row.copy() == dict(row) and type(row.copy()) is dict
+    assert not hasattr(row, "__dict__")
+
+
+def test_fields_iterate_in_declaration_order_whatever_the_hash_seed():
+    script = "from src.records import UserRecord; print(list(UserRecord.coerce({'version': 1, 'password': 'x', 'username': 'bob', 'approved': 'no'})))"
+    outputs = {
+        subprocess.run(
+            [sys.executable, "-c", script], capture_output=True, text=True, check=True,
+            env={**os.environ, "PYTHONHASHSEED": seed}, cwd=os.path.dirname(os.path.abspath(__file__)),
+        ).stdout
+        for seed in ["1", "2", "3"]
+    }
+    assert outputs == {"['username', 'approved', 'password', 'version']\n"}
+
+
+def test_strings_are_interned():
+    a = ShipmentRecord.coerce({"status": "".join(["In ", "Transit"])})
+    b = ShipmentRecord.coerce({"status": "".join(["In T", "ransit"])})
+    assert a["status"] is b["status"]
+
+
+def test_waybill_nests_records_and_compact_events():
+    time = datetime.datetime(2025, 7, 14, 15, 46, 8, 618321)
+    waybill = WaybillRecord.coerce({
+        "waybill_ref": "REF1",
+        "details": {"goods_type": "Wheat"},
+        "tracking": [{"status": "Booking Confirmed", "time": time}],
+    })
+
+    assert isinstance(waybill["details"], ShipmentRecord)
+    event = waybill["tracking"][0]
+    assert isinstance(event, TrackingEvent)
+    assert event["time"] == time and event.get("status") == "Booking Confirmed"
+    assert loads_row(dumps_row(waybill)) == {
+        "waybill_ref": "REF1",
+        "details": {"goods_type": "Wheat"},
+        "tracking": [{"status": "Booking Confirmed", "time": time}],
+    }
+
+
+def test_csv_round_trip_keeps_record_types(tmp_path):
+    path = str(tmp_path / "waybills.csv")
+    time = datetime.datetime(2025, 7, 14, 9, 0)
+    waybills = {"REF1": WaybillRecord.coerce({
+        "waybill_ref": "REF1",
+        "details": {"goods_type": "Wheat", "qty": 450},
+        "tracking": [{"status": "Booking Confirmed", "time": time}],
+        "status": "In Transit",
+    })}
+    save_data_to_csv(waybills, path, SCHEMAS["waybills"])
+
+    loaded = load_data_from_csv(path, schema=SCHEMAS["waybills"])
+    assert isinstance(loaded["REF1"], WaybillRecord)
+    assert loaded["REF1"]["details"]["qty"] == 450
+    assert loaded["REF1"]["tracking"][0]["time"] == time
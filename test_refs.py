@@ -0,0 +1,30 @@
+import datetime
+
+from src.refs import REF_LENGTH, RefGenerator, is_time_ordered_ref, ref_range, ref_time
+
+
+def test_refs_are_unique_and_time_ordered():
+    generator = RefGenerator(shard=7)
+    refs = [generator.new() for _ in range(20000)]
+
+    assert len(set(refs)) == len(refs)
+    assert refs == sorted(refs)
+    assert all(len(ref) == REF_LENGTH and is_time_ordered_ref(ref) for ref in refs)
+    assert not is_time_ordered_ref("QVJYBJ29X1")
+
+
+def test_shards_keep_processes_apart():
+    a, b = RefGenerator(shard=1), RefGenerator(shard=2)
+    assert not {a.new() for _ in range(1000)} & {b.new() for _ in range(1000)}
+
+
+def test_time_decoding_and_range_scans():
+    generator = RefGenerator(shard=1)
+    booked = datetime.datetime(2025, 7, 14, 9, 30, tzinfo=datetime.timezone.utc)
+    ref = generator.new(at=booked)
+
+    assert ref_time(ref) == booked
+    low, high = ref_range(booked - datetime.timedelta(minutes=1), booked + datetime.timedelta(minutes=1))
+    assert low <= ref <= high
+    low, high = ref_range(booked + datetime.timedelta(seconds=1), booked + datetime.timedelta(days=1))
+    assert not low <= ref <= high
@@ -0,0 +1,28 @@
+from src.schema import SCHEMAS, TEXT, backfill_shipment_refs
+
+
+def test_schema_dtypes_follow_record_types():
+    shipments = SCHEMAS["shipments"]
+    assert shipments.key == "waybill_ref"
+    assert shipments.dtypes["qty"] == "int64"
+    assert shipments.dtypes["charge"] == "float64"
+    assert shipments.dtypes["origin"] == TEXT
+    assert SCHEMAS["waybills"].nested_columns == ("details", "tracking")
+
+
+def test_backfill_shipment_refs_matches_waybills(tmp_path):
+    shipments_csv = tmp_path / "shipments.csv"
+    waybills_csv = tmp_path / "waybills.csv"
+    shipments_csv.write_text("username,qty,booked_on\nCustomer1,450,2025-07-14 15:46:08\nCustomer9,1,2025-01-01\n")
+    waybills_csv.write_text(
+        "username,waybill_ref,details\n"
+        "Customer1,AAA,\"{'username': 'Customer1', 'booked_on': '2025-07-14 15:46:08'}\"\n"
+    )
+
+    assert backfill_shipment_refs(str(shipments_csv), str(waybills_csv)) == 1
+    assert shipments_csv.read_text().splitlines() == [
+        "waybill_ref,username,qty,booked_on",
+        "AAA,Customer1,450,2025-07-14 15:46:08",
+        ",Customer9,1,2025-01-01",
+    ]
+    assert backfill_shipment_refs(str(shipments_csv), str(waybills_csv)) == 0
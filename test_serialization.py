@@ -0,0 +1,74 @@
+import datetime
+
+import pytest
+
+from src.backends import CsvBackend
+from src.data_store import DataStore
+from src.serialization import UndecodableValueError, decode_nested, decode_waybill_row, encode_nested, migrate_waybills_csv
+
+LEGACY_TRACKING = (
+    "[{'status': 'Booking Confirmed', 'time': datetime.datetime(2025, 7, 14, 15, 46, 8, 618321)}, "
+    "{'status': 'In Transit', 'time': datetime.datetime(2025, 7, 14, 19, 46, 8, 618321)}]"
+)
+
+
+def test_legacy_repr_tracking_is_decoded_with_datetimes():
+    waybill = decode_waybill_row({"details": "{'origin': 'Quebec, QC', 'qty': 450}", "tracking": LEGACY_TRACKING})
+
+    assert waybill["details"] == {"origin": "Quebec, QC", "qty": 450}
+    assert waybill["tracking"][0] == {
+        "status": "Booking Confirmed",
+        "time": datetime.datetime(2025, 7, 14, 15, 46, 8, 618321),
+    }
+
+
+def test_json_encoding_round_trips():
+    when = datetime.datetime(2025, 7, 14, 15, 46, 8)
+    tracking = [{"status": "Booked", "time": when}]
+    encoded = encode_nested(tracking)
+
+    assert encoded == '[{"status":"Booked","time":"2025-07-14T15:46:08"}]'
+    assert decode_waybill_row({"details": encode_nested({"qty": 1}), "tracking": encoded})["tracking"] == tracking
+
+
+def test_migration_rewrites_legacy_cells(tmp_path):
+    path = tmp_path / "waybills.csv"
+    path.write_text(
+        "username,waybill_ref,details,tracking,status,eta\n"
+        f"Customer1,AAA,\"{{'qty': 450}}\",\"{LEGACY_TRACKING}\",In Transit,2025-07-15 11:46:08.618321\n"
+    )
+    assert migrate_waybills_csv(str(path)) == (3, 0)
+    assert migrate_waybills_csv(str(path)) == (0, 0)
+
+    lines = path.read_text().splitlines()
+    assert lines[1].startswith('Customer1,AAA,"{""qty"":450}","[{""status"":""Booking Confirmed""')
+    assert lines[1].endswith(",In Transit,2025-07-15T11:46:08.618321")
+
+
+def test_legacy_keyword_arguments_are_kept_or_rejected():
+    aware = decode_nested("[datetime.datetime(2025, 7, 14, 15, 46, tzinfo=datetime.timezone.utc)]")
+    assert aware == [datetime.datetime(2025, 7, 14, 15, 46, tzinfo=datetime.timezone.utc)]
+    offset = decode_nested("[datetime.datetime(2025, 7, 14, tzinfo=datetime.timezone(datetime.timedelta(hours=-5)))]")
+    assert offset[0].utcoffset() == datetime.timedelta(hours=-5)
+    with pytest.raises(UndecodableValueError):
+        decode_nested("{'qty': np.float64(450.0)}")
+    with pytest.raises(UndecodableValueError):
+        decode_nested("[datetime.datetime(2025, 7, 14, tzinfo=ZoneInfo('UTC'))]")
+
+
+def test_undecodable_cells_are_never_replaced(tmp_path):
+    path = tmp_path / "waybills.csv"
+    path.write_text(
+        "username,waybill_ref,details,tracking,status,eta\n"
+        "Customer1,AAA,\"{'qty': np.float64(450.0)}\",[],In Transit,\n"
+        "Customer1,BBB,\"{'qty': 450}\",[],In Transit,\n"
+    )
+    assert migrate_waybills_csv(str(path)) == (1, 1)
+    assert "np.float64(450.0)" in path.read_text()
+
+    store = DataStore(CsvBackend({"waybills": str(path)}))
+    waybills = store.get("waybills")
+    assert waybills["AAA"]["details"] == "{'qty': np.float64(450.0)}"
+    assert decode_waybill_row({"details": "{'qty': np.float64(450.0)}"})["details"] == {}
+    store.put("waybills", "BBB", {**waybills["BBB"], "status": "Delivered"})
+    assert "np.float64(450.0)" in path.read_text()
@@ -0,0 +1,32 @@
+import time
+
+from src.sessions import MemorySessionStore
+
+
+def test_sessions_hold_username_and_stamp_until_they_expire(monkeypatch):
+    sessions = MemorySessionStore(ttl=60)
+    sessions.put("token-1", "bob", "stamp")
+    assert sessions.get("token-1") == ("bob", "stamp")
+    assert sessions.get("token-2") is None
+
+    now = time.time()
+    monkeypatch.setattr("src.sessions.time.time", lambda: now + 50)
+    # Using a session keeps it alive
+    assert sessions.get("token-1") == ("bob", "stamp")
+    monkeypatch.setattr("src.sessions.time.time", lambda: now + 100)
+    assert sessions.get("token-1") == ("bob", "stamp")
+    monkeypatch.setattr("src.sessions.time.time", lambda: now + 200)
+    assert sessions.get("token-1") is None
+
+    sessions.put("token-3", "bob", "stamp")
+    sessions.delete("token-3")
+    assert sessions.get("token-3") is None
+
+
+def test_memory_sessions_drop_the_least_recently_used():
+    sessions = MemorySessionStore(max_sessions=2)
+    for token in ["a", "b", "c"]:
+        sessions.put(token, "bob", None)
+    assert sessions.get("a") is None
+    assert sessions.get("b") and sessions.get("c")
+
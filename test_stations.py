@@ -0,0 +1,27 @@
+import pytest
+
+from src.stations import StationCatalogue, UnknownStationError, normalize_station_name
+
+STATIONS = {"TBY": "Thunder Bay, ON", "TOR": "Toronto, ON", "QUE": "Quebec, QC", "SJB": "Saint John, NB"}
+
+
+def test_resolve_by_id_or_normalized_name():
+    catalogue = StationCatalogue(STATIONS)
+
+    assert normalize_station_name("  Quebec,QC ") == "quebec qc"
+    assert catalogue.resolve("QUE") == "QUE"
+    assert catalogue.resolve("thunder bay  on") == "TBY"
+    with pytest.raises(UnknownStationError):
+        catalogue.resolve("Thunder")
+
+
+def test_suggest_by_prefix_of_any_word():
+    catalogue = StationCatalogue(STATIONS)
+
+    assert catalogue.suggest("thu") == ["TBY"]
+    assert catalogue.suggest("bay") == ["TBY"]
+    assert catalogue.suggest("T") == ["TBY", "TOR"]
+    assert sorted(catalogue.suggest("on")) == ["TBY", "TOR"]
+    assert catalogue.suggest("sj") == ["SJB"]
+    assert catalogue.suggest("on", limit=1) in (["TBY"], ["TOR"])
+    assert catalogue.suggest("") == [] and catalogue.suggest("zzz") == []
@@ -0,0 +1,117 @@
+import datetime
+
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from src.backends import CsvBackend
+from src.data_store import DataStore
+from src.tracking import EventLog, TrackingTimeline, UnknownWaybillError, parse_refs, track_many
+from src.waybill_index import CsvOffsetIndex
+
+BOOKED = datetime.datetime(2025, 7, 14, 9, 0)
+
+
+def waybill(username, status="In Transit"):
+    return {
+        "username": username,
+        "status": status,
+        "eta": BOOKED + datetime.timedelta(hours=20),
+        "tracking": [{"status": "Booking Confirmed", "time": BOOKED}],
+    }
+
+
+def make_store(tmp_path):
+    store = DataStore(CsvBackend({"waybills": str(tmp_path / "waybills.csv")}))
+    timeline = store.add_index("waybills", "tracking", TrackingTimeline(EventLog(str(tmp_path / "events.jsonl"))))
+    return store, timeline
+
+
+def test_recorded_events_update_projections_without_rewriting_rows(tmp_path):
+    store, timeline = make_store(tmp_path)
+    store.put("waybills", "REF1", waybill("Customer1"))
+    store.put("waybills", "REF2", waybill("Customer2"))
+    rows_before = (tmp_path / "waybills.csv").read_bytes()
+
+    delivered = BOOKED + datetime.timedelta(hours=18)
+    assert timeline.record("REF1", "Delivered", time=delivered, eta=delivered) == "Delivered"
+
+    assert (tmp_path / "waybills.csv").read_bytes() == rows_before
+    assert store.get("waybills")["REF1"]["status"] == "In Transit"
+    assert timeline.status("REF1") == "Delivered"
+    assert timeline.eta("REF1") == delivered
+    assert [event["status"] for event in timeline.timeline("REF1")] == ["Booking Confirmed", "Delivered"]
+    assert timeline.counts() == {"In Transit": 1, "Delivered": 1}
+    assert timeline.counts("Customer1") == {"Delivered": 1}
+    assert timeline.refs(["Booked", "In Transit"]) == ["REF2"]
+
+    with pytest.raises(UnknownWaybillError):
+        timeline.record("NOPE", "Delivered")
+
+
+def test_events_from_other_processes_are_applied_on_refresh(tmp_path):
+    store, timeline = make_store(tmp_path)
+    store.put("waybills", "REF1", waybill("Customer1"))
+    other_store, other_timeline = make_store(tmp_path)
+
+    other_timeline.record("REF1", "Delivered")
+    assert timeline.status("REF1") == "In Transit"
+    timeline.refresh()
+    assert timeline.status("REF1") == "Delivered"
+
+    # A reload of the rows keeps the events on top
+    store._reload("waybills")
+    assert timeline.status("REF1") == "Delivered"
+    assert timeline.counts() == {"Delivered": 1}
+
+
+def test_event_log_skips_torn_last_line(tmp_path):
+    path = tmp_path / "events.jsonl"
+    log = EventLog(str(path))
+    log.append({"ref": "REF1", "status": "Delivered", "time": BOOKED})
+    with open(path, "a") as file:
+        file.write('{"ref": "REF2", "sta')
+    assert [event["ref"] for event in log.read_new()] == ["REF1"]
+    with open(path, "a") as file:
+        file.write('tus": "Delivered", "time": null}\n')
+    assert [event["ref"] for event in log.read_new()] == ["REF2"]
+
+
+def test_track_many_reports_status_eta_and_last_event(tmp_path):
+    store, timeline = make_store(tmp_path)
+    store.put("waybills", "REF1", waybill("Customer1"))
+    store.put("waybills", "REF2", {**waybill("Customer1"), "details": {"origin": "Quebec, QC"}})
+    store.put("waybills", "OLD", waybill("Customer2", status="Delivered"))
+    delivered = BOOKED + datetime.timedelta(hours=18)
+    timeline.record("REF1", "Delivered", time=delivered, eta=delivered)
+    # A waybill only in the CSV file (e.g. written by another process) is read through the index
+    index = CsvOffsetIndex(str(tmp_path / "waybills.csv"))
+    waybills = dict(store.get("waybills"))
+    del waybills["OLD"]
+
+    refs = parse_refs("REF1, REF2\nNOPE;REF1 OLD")
+    assert refs == ["REF1", "REF2", "NOPE", "OLD"]
+    rows = {row["waybill_ref"]: row for row in track_many(timeline, waybills, refs, index=index)}
+    assert list(rows) == refs
+    assert (rows["REF1"]["status"], rows["REF1"]["eta"], rows["REF1"]["last_event"]) == ("Delivered", delivered, "Delivered")
+    assert (rows["REF2"]["status"], rows["REF2"]["last_event"], rows["REF2"]["origin"]) == ("In Transit", "Booking Confirmed", "Quebec, QC")
+    assert not rows["NOPE"]["found"]
+    assert rows["OLD"]["found"] and rows["OLD"]["status"] == "Delivered"
+
+
+def test_track_many_times_are_timestamps(tmp_path):
+    store, timeline = make_store(tmp_path)
+    store.put("waybills", "NEW", waybill("Customer1"))
+    store.put("waybills", "BAD", {**waybill("Customer1"), "eta": "soon"})
+    # Rows read back from the CSV file hold the times as text
+    index = CsvOffsetIndex(str(tmp_path / "waybills.csv"))
+    old = {**waybill("Customer2"), "eta": "2025-07-15 05:00:00", "tracking": [{"status": "Booked", "time": "2025-07-14T09:00:00"}]}
+    waybills = {"NEW": store.get("waybills")["NEW"], "OLD": old}
+
+    rows = track_many(timeline, waybills, ["NEW", "OLD", "BAD", "NOPE"], index=index)
+    frame = pd.DataFrame(rows)
+    assert str(frame["eta"].dtype).startswith("datetime64") and str(frame["last_event_time"].dtype).startswith("datetime64")
+    assert list(frame["eta"][:2]) == [BOOKED + datetime.timedelta(hours=20)] * 2
+    assert frame["last_event_time"][1] == BOOKED
+    assert pd.isna(frame["eta"][2]) and pd.isna(frame["eta"][3])
+    pa.Table.from_pandas(frame)
@@ -0,0 +1,96 @@
+import csv
+import shutil
+
+from src.locks import atomic_write
+from src.waybill_index import CsvOffsetIndex
+
+
+def write_rows(path, rows, mode="w"):
+    with open(path, mode, newline="", encoding="utf-8") as file:
+        writer = csv.writer(file)
+        if mode == "w":
+            writer.writerow(["username", "waybill_ref", "details", "status"])
+        writer.writerows(rows)
+
+
+def test_lookup_reads_row_at_offset(tmp_path):
+    path = str(tmp_path / "waybills.csv")
+    write_rows(path, [
+        ["Customer1", "AAA", "{'origin': 'Quebec, QC'}", "In Transit"],
+        ["Customer2", "BBB", "line one\nline two", "Delivered"],
+        ["Customer2", "CCC", "{}", "Booked"],
+    ])
+    index = CsvOffsetIndex(path)
+
+    assert index.lookup("AAA")["details"] == "{'origin': 'Quebec, QC'}"
+    assert index.lookup("BBB")["details"] == "line one\nline two"
+    assert index.lookup("CCC")["status"] == "Booked"
+    assert index.lookup("ZZZ") is None
+
+
+def test_appended_rows_are_indexed_incrementally(tmp_path):
+    path = str(tmp_path / "waybills.csv")
+    write_rows(path, [["Customer1", "AAA", "{}", "In Transit"]])
+    index = CsvOffsetIndex(path)
+    index.update()
+
+    write_rows(path, [["Customer1", "AAA", "{}", "Delivered"], ["Customer3", "DDD", "{}", "Booked"]], mode="a")
+    assert index.lookup("DDD")["username"] == "Customer3"
+    assert index.lookup("AAA")["status"] == "Delivered"
+    with open(path + ".idx", encoding="utf-8") as index_file:
+        assert len(index_file.readlines()) == 3
+
+
+def test_index_is_reused_across_instances_and_rebuilt_on_rewrite(tmp_path):
+    path = str(tmp_path / "waybills.csv")
+    write_rows(path, [["Customer1", "AAA", "{}", "In Transit"]])
+    CsvOffsetIndex(path).update()
+
+    reopened = CsvOffsetIndex(path)
+    assert reopened.offsets == {"AAA": reopened.offsets["AAA"]}
+
+    write_rows(path, [["Customer9", "XYZ", "{}", "Booked"]])
+    assert reopened.lookup("AAA") is None
+    assert reopened.lookup("XYZ")["username"] == "Customer9"
+
+
+def test_lookup_many_reads_requested_rows_in_one_pass(tmp_path):
+    path = str(tmp_path / "waybills.csv")
+    write_rows(path, [
+        ["Customer1", "AAA", "{}", "In Transit"],
+        ["Customer2", "BBB", "line one\nline two", "Delivered"],
+        ["Customer2", "CCC", "{}", "Booked"],
+    ])
+    rows = CsvOffsetIndex(path).lookup_many(["CCC", "ZZZ", "BBB", "CCC"])
+    assert {key: row["status"] for key, row in rows.items()} == {"BBB": "Delivered", "CCC": "Booked"}
+
+
+def test_replaced_file_is_rebuilt_not_appended(tmp_path):
+    path = str(tmp_path / "waybills.csv")
+    write_rows(path, [["Customer1", "AAA", "{}", "In Transit"]])
+    index = CsvOffsetIndex(path)
+    index.update()
+
+    # The app's writes replace the file, even when they only add a row
+    def write(tmp_path):
+        shutil.copyfile(path, tmp_path)
+        write_rows(tmp_path, [["Customer3", "DDD", "{}", "Booked"]], mode="a")
+    atomic_write(path, write)
+
+    assert index.lookup("DDD")["username"] == "Customer3"
+    assert index.lookup("AAA")["status"] == "In Transit"
+    with open(path + ".idx", encoding="utf-8") as index_file:
+        assert len(index_file.readlines()) == 2
+
+
+def test_file_without_key_column_indexes_nothing(tmp_path):
+    path = tmp_path / "waybills.csv"
+    path.write_text("username,status\nCustomer1,Booked\n")
+    index = CsvOffsetIndex(str(path))
+    assert index.lookup("AAA") is None
+    assert index.lookup_many(["AAA"]) == {}
+
+    path.write_text("")
+    assert index.lookup_many(["AAA"]) == {}
+    write_rows(str(path), [["Customer1", "AAA", "{}", "Booked"]])
+    assert index.lookup("AAA")["status"] == "Booked"